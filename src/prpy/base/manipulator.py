@@ -30,14 +30,18 @@
 
 import copy, functools, numpy, openravepy
 from .. import bind, clone, planning
+from ..ik_cache import IKCache
 
 
 class Manipulator(openravepy.Robot.Manipulator):
     def __init__(self):
-        pass
+        self.ik_cache = IKCache()
+        self.reachability_map = None
 
     def CloneBindings(self, parent):
-        pass
+        # Share IK solutions with the parent; they do not depend on the scene.
+        self.ik_cache = parent.ik_cache
+        self.reachability_map = parent.reachability_map
 
     def __dir__(self):
         robot = self.GetRobot()
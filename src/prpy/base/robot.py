@@ -28,7 +28,7 @@
 # ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
 # POSSIBILITY OF SUCH DAMAGE.
 import collections
-import functools, logging, openravepy, numpy
+import functools, logging, openravepy, numpy, threading
 from .. import bind, named_config, exceptions, util
 from ..clone import Clone, Cloned
 from ..tsr.tsrlibrary import TSRLibrary
@@ -36,7 +36,7 @@ from ..planning.base import Sequence, Tags
 from ..planning.ompl import OMPLSimplifier
 from ..planning.retimer import OpenRAVEAffineRetimer, ParabolicRetimer
 from ..planning.mac_smoother import MacSmoother
-from ..util import SetTrajectoryTags
+from ..util import GetTrajectoryTags, SetTrajectoryTags
 
 logger = logging.getLogger(__name__)
 
@@ -48,6 +48,20 @@ class Robot(openravepy.Robot):
     Mapping from robot environments to plan postprocessing environments.
     """
 
+    _speculative_postprocess_envs = collections.defaultdict(list)
+    """
+    Mapping from robot environments to pools of environments that are free
+    for speculative postprocessing.
+    """
+
+    _speculative_planners = collections.defaultdict(list)
+    """
+    Mapping from post-processing planners to pools of their copies that are
+    free for speculative postprocessing.
+    """
+
+    _speculative_postprocess_lock = threading.Lock()
+
     def __init__(self, robot_name=None):
         self.actions = None
         self.planner = None
@@ -62,6 +76,8 @@ class Robot(openravepy.Robot):
                 self.GetName(), e.message
             )
 
+        self._RegisterKinematicLimitsCache()
+
         self.controllers = list()
         self.manipulators = list()
         self.configurations = named_config.ConfigurationLibrary()
@@ -161,6 +177,7 @@ class Robot(openravepy.Robot):
         self.tsrlibrary = parent.tsrlibrary
         self.configurations = parent.configurations
 
+        self._RegisterKinematicLimitsCache()
         self.controllers = []
         self.SetController(None)
 
@@ -172,6 +189,70 @@ class Robot(openravepy.Robot):
         self.task_manipulation = openravepy.interfaces.TaskManipulation(self)
 
 
+    def _RegisterKinematicLimitsCache(self):
+        """
+        Create the table returned by GetKinematicLimits and invalidate it
+        whenever OpenRAVE reports a change to this robot's joints.
+        """
+        self._kinematic_limits = util.KinematicLimitsCache()
+
+        # The callback is bound to the cache, not to the robot, so the
+        # handle does not keep the robot alive.
+        try:
+            properties = openravepy.KinBody.KinBodyProperty
+            flags = int(properties.Joints) | int(properties.JointProperties)
+            if hasattr(properties, 'JointAccelerationVelocityTorqueLimits'):
+                flags |= int(properties.JointAccelerationVelocityTorqueLimits)
+
+            self._kinematic_limits_handle = self.RegisterChangeCallback(
+                flags, self._kinematic_limits.Invalidate)
+        except AttributeError as e:
+            logger.debug('Failed registering a joint change callback on'
+                         ' robot "%s"; the kinematic limits are only'
+                         ' invalidated by its SetDOF* methods: %s',
+                         self.GetName(), e)
+            self._kinematic_limits_handle = None
+
+    def GetKinematicLimits(self):
+        """
+        Get a read-only table of the robot's position limits, velocity limits,
+        acceleration limits, resolutions and weights, indexed by DOF index.
+
+        The table is reused until it is invalidated by a change to the
+        robot's joints or by this robot's SetDOF* methods. Invalidating only
+        increments a counter, so this is as cheap as an attribute lookup when
+        nothing has changed.
+
+        @return util.KinematicLimits
+        """
+        return self._kinematic_limits.Get(self)
+
+    def InvalidateKinematicLimits(self):
+        """
+        Discard the table returned by GetKinematicLimits.
+        """
+        self._kinematic_limits.Invalidate()
+
+    def SetDOFLimits(self, *args, **kw_args):
+        openravepy.Robot.SetDOFLimits(self, *args, **kw_args)
+        self.InvalidateKinematicLimits()
+
+    def SetDOFVelocityLimits(self, *args, **kw_args):
+        openravepy.Robot.SetDOFVelocityLimits(self, *args, **kw_args)
+        self.InvalidateKinematicLimits()
+
+    def SetDOFAccelerationLimits(self, *args, **kw_args):
+        openravepy.Robot.SetDOFAccelerationLimits(self, *args, **kw_args)
+        self.InvalidateKinematicLimits()
+
+    def SetDOFResolutions(self, *args, **kw_args):
+        openravepy.Robot.SetDOFResolutions(self, *args, **kw_args)
+        self.InvalidateKinematicLimits()
+
+    def SetDOFWeights(self, *args, **kw_args):
+        openravepy.Robot.SetDOFWeights(self, *args, **kw_args)
+        self.InvalidateKinematicLimits()
+
     def AttachController(self, name, args, dof_indices, affine_dofs, simulated):
         """
         Create and attach a controller to a subset of this robot's DOFs. If
@@ -222,6 +303,7 @@ class Robot(openravepy.Robot):
                         constrained=None, smooth=None, default_timelimit=0.5,
                         shortcut_options=None, smoothing_options=None,
                         retiming_options=None, affine_retiming_options=None,
+                        speculative=False, speculative_timelimits=None,
                         **kwargs):
         """ Post-process a geometric path to prepare it for execution.
 
@@ -241,6 +323,15 @@ class Robot(openravepy.Robot):
            path via self.smoother. This algorithm can change the geometric path
            to optimize runtime.
 
+        If speculative=True, case (4) instead runs alternative pipelines
+        concurrently, each with its own copies of the planners: the default
+        pipeline, self.smoother on the un-shortcut path, self.retimer on the
+        un-shortcut path, and the default pipeline once for each smoothing
+        timelimit in speculative_timelimits. The valid output trajectory with
+        the shortest duration is returned. Its POSTPROCESS_PIPELINE tag names
+        the pipeline that produced it and its POSTPROCESS_PIPELINE_TIMES tag
+        holds the time spent in each pipeline.
+
         The behavior in (2) and (3) can be forced by passing constrained=True
         or smooth=True. By default, the case is inferred by the tag(s) attached
         to the trajectory: (1) is triggered by the CONSTRAINED tag and (2) is
@@ -259,6 +350,8 @@ class Robot(openravepy.Robot):
         @param smoothing_options kwargs to self.smoother
         @param retiming_options kwargs to self.retimer
         @param affine_retiming_options kwargs to self.affine_retimer
+        @param speculative run alternative pipelines concurrently
+        @param speculative_timelimits extra smoothing timelimits to try
         @return trajectory ready for execution
         """
         from ..planning.base import Tags
@@ -273,12 +366,14 @@ class Robot(openravepy.Robot):
         if retiming_options is None:
             retiming_options = dict()
         if affine_retiming_options is None:
-            affine_retimer_options = dict()
+            affine_retiming_options = dict()
+        if speculative_timelimits is None:
+            speculative_timelimits = []
 
         shortcut_options.setdefault('timelimit', default_timelimit)
         smoothing_options.setdefault('timelimit', default_timelimit)
         retiming_options.setdefault('timelimit', default_timelimit)
-        affine_retimer_options.setdefault('timelimit', default_timelimit)
+        affine_retiming_options.setdefault('timelimit', default_timelimit)
 
         # Read default parameters from the trajectory's tags.
         tags = GetTrajectoryTags(path)
@@ -293,6 +388,49 @@ class Robot(openravepy.Robot):
             logger.debug('Detected "%s" tag on trajectory: Setting smooth'
                          ' = True', Tags.SMOOTH)
 
+        # Planners only operate on the active DOFs. We'll set any DOFs
+        # in the trajectory as active.
+        env = path.GetEnv()
+        cspec = path.GetConfigurationSpecification()
+
+        used_bodies = cspec.ExtractUsedBodies(env)
+        if self not in used_bodies:
+            raise ValueError(
+                'Robot "{:s}" is not in the trajectory.'.format(
+                    self.GetName()))
+
+        # Extract active DOFs from teh trajectory and set them as active.
+        dof_indices, _ = cspec.ExtractUsedIndices(self)
+
+        if util.HasAffineDOFs(cspec):
+            affine_dofs = (DOFAffine.X | DOFAffine.Y | DOFAffine.RotationAxis)
+
+            # Bug in OpenRAVE ExtractUsedIndices function makes 
+            # dof_indices = affine_dofs. Temporary workaround for that bug.
+            dof_indices = []
+            logger.warning(
+                'Trajectory contains affine DOFs. Any regular DOFs'
+                ' will be ignored.'
+            )
+        else:
+            affine_dofs = 0
+
+        # The speculative pipelines clone the robot's environment
+        # themselves.
+        if speculative and not constrained and not affine_dofs:
+            if smooth:
+                logger.warning(
+                    'Post-processing smooth paths is not supported.'
+                    ' Using the default post-processing logic; this may'
+                    ' significantly change the geometric path.'
+                )
+
+            logger.debug('Speculatively post-processing an unconstrained'
+                         ' path.')
+            return self._PostProcessSpeculative(
+                path, dof_indices, shortcut_options, smoothing_options,
+                retiming_options, speculative_timelimits)
+
         # Since we don't want to endlessly create postprocessing environments,
         # we maintain a map that uniquely associates each OpenRAVE environment
         # with a given postprocessing environment.  This way, if we re-clone
@@ -303,34 +441,6 @@ class Robot(openravepy.Robot):
         with Clone(self.GetEnv(),
                    clone_env=postprocess_env) as cloned_env:
             cloned_robot = cloned_env.Cloned(self)
-
-            # Planners only operate on the active DOFs. We'll set any DOFs
-            # in the trajectory as active.
-            env = path.GetEnv()
-            cspec = path.GetConfigurationSpecification()
-
-            used_bodies = cspec.ExtractUsedBodies(env)
-            if self not in used_bodies:
-                raise ValueError(
-                    'Robot "{:s}" is not in the trajectory.'.format(
-                        self.GetName()))
-
-            # Extract active DOFs from teh trajectory and set them as active.
-            dof_indices, _ = cspec.ExtractUsedIndices(self)
-
-            if util.HasAffineDOFs(cspec):
-                affine_dofs = (DOFAffine.X | DOFAffine.Y | DOFAffine.RotationAxis)
-
-                # Bug in OpenRAVE ExtractUsedIndices function makes 
-                # dof_indices = affine_dofs. Temporary workaround for that bug.
-                dof_indices = []
-                logger.warning(
-                    'Trajectory contains affine DOFs. Any regular DOFs'
-                    ' will be ignored.'
-                )
-            else:
-                affine_dofs = 0
-
             cloned_robot.SetActiveDOFs(dof_indices, affine_dofs)
             logger.debug(
                 'Setting robot "%s" DOFs %s (affine? %d) as active for'
@@ -344,7 +454,7 @@ class Robot(openravepy.Robot):
             # Special case for timing affine-only trajectories.
             elif affine_dofs:
                 traj = self.affine_retimer.RetimeTrajectory(
-                    cloned_robot, path, **affine_retimer_options)
+                    cloned_robot, path, **affine_retiming_options)
             else:
                 # Directly compute a timing of smooth trajectories.
                 if smooth:
@@ -381,6 +491,164 @@ class Robot(openravepy.Robot):
         output_traj = CopyTrajectory(traj, env=self.GetEnv())
         return output_traj
 
+    def _PostProcessSpeculative(self, path, dof_indices, shortcut_options,
+                                smoothing_options, retiming_options,
+                                speculative_timelimits):
+        from ..planning.base import CopyPlanner, Tags
+        from ..planning.exceptions import PlanningError
+        from ..util import CopyTrajectory, IsTimedTrajectory, Timer
+
+        # Each pipeline is a function of (planners, robot, path), where
+        # planners maps each of the robot's post-processing planners to the
+        # copy the pipeline should use.
+        def ShortcutAndSmooth(planners, robot, path, timelimit=None):
+            if self.simplifier is not None:
+                path = planners[self.simplifier].ShortcutPath(
+                    robot, path, **shortcut_options)
+
+            options = dict(smoothing_options)
+            if timelimit is not None:
+                options['timelimit'] = timelimit
+            return planners[self.smoother].RetimeTrajectory(
+                robot, path, **options)
+
+        def Smooth(planners, robot, path):
+            return planners[self.smoother].RetimeTrajectory(
+                robot, path, **smoothing_options)
+
+        def Retime(planners, robot, path):
+            return planners[self.retimer].RetimeTrajectory(
+                robot, path, **retiming_options)
+
+        shortcut_planners = [self.smoother]
+        if self.simplifier not in (None, self.smoother):
+            shortcut_planners.append(self.simplifier)
+
+        pipelines = [
+            ('shortcut_smooth', ShortcutAndSmooth, shortcut_planners),
+            ('smooth', Smooth, [self.smoother]),
+            ('retime', Retime, [self.retimer]),
+        ]
+        for timelimit in speculative_timelimits:
+            pipelines.append((
+                'shortcut_smooth_{:g}'.format(timelimit),
+                functools.partial(ShortcutAndSmooth, timelimit=timelimit),
+                shortcut_planners))
+
+        env = self.GetEnv()
+        env_id = openravepy.RaveGetEnvironmentId(env)
+        results = [None] * len(pipelines)
+
+        def AcquireEnv():
+            with Robot._speculative_postprocess_lock:
+                pool = Robot._speculative_postprocess_envs[env_id]
+                return pool.pop() if pool else openravepy.Environment()
+
+        def ReleaseEnv(staging_env):
+            with Robot._speculative_postprocess_lock:
+                Robot._speculative_postprocess_envs[env_id].append(
+                    staging_env)
+
+        # Planner calls clone into and lock their planner's environment, so
+        # each pipeline runs on its own copy of each planner.
+        def AcquirePlanner(planner):
+            with Robot._speculative_postprocess_lock:
+                pool = Robot._speculative_planners[planner]
+                if pool:
+                    return pool.pop()
+
+            try:
+                return CopyPlanner(planner)
+            except Exception as e:
+                logger.warning('Failed copying planner %s; speculative'
+                               ' pipelines that use it will not run'
+                               ' concurrently: %s', planner, e)
+                return planner
+
+        def ReleasePlanner(planner, planner_copy):
+            if planner_copy is not planner:
+                with Robot._speculative_postprocess_lock:
+                    Robot._speculative_planners[planner].append(
+                        planner_copy)
+
+        def worker(index, pipeline, planners, cloned_robot, cloned_path):
+            with Timer() as timer:
+                try:
+                    traj = pipeline(planners, cloned_robot, cloned_path)
+
+                    if not IsTimedTrajectory(traj):
+                        raise PlanningError(
+                            'Post-processing produced an un-timed'
+                            ' trajectory.')
+
+                    outcome = (True, CopyTrajectory(traj, env=env))
+                except Exception as e:
+                    outcome = (False, e)
+
+            results[index] = outcome + (timer.get_duration(),)
+
+        # Clone the robot's environment once. The planners clone this
+        # staging environment, so they do not lock the robot's environment.
+        # It is not locked while the pipelines run, since the planners
+        # lock it while they clone it.
+        staging_env = AcquireEnv()
+        acquired = []
+        try:
+            with Clone(env, clone_env=staging_env, lock=False) as cloned_env:
+                with cloned_env:
+                    cloned_robot = cloned_env.Cloned(self)
+                    cloned_robot.SetActiveDOFs(dof_indices)
+                    cloned_path = CopyTrajectory(path, env=cloned_env)
+
+                threads = []
+                for index, (_, pipeline, needed) in enumerate(pipelines):
+                    planners = dict()
+                    for planner in needed:
+                        planners[planner] = AcquirePlanner(planner)
+                        acquired.append((planner, planners[planner]))
+
+                    thread = threading.Thread(
+                        target=worker,
+                        args=(index, pipeline, planners, cloned_robot,
+                              cloned_path))
+                    thread.daemon = True
+                    thread.start()
+                    threads.append(thread)
+
+                for thread in threads:
+                    thread.join()
+        finally:
+            for planner, planner_copy in acquired:
+                ReleasePlanner(planner, planner_copy)
+            ReleaseEnv(staging_env)
+
+        best_index = None
+        for index, ((name, _, _), (success, value, _)) in enumerate(
+                zip(pipelines, results)):
+            if not success:
+                logger.debug('Post-processing pipeline "%s" failed: %s',
+                             name, value)
+            elif (best_index is None or value.GetDuration()
+                    < results[best_index][1].GetDuration()):
+                best_index = index
+
+        if best_index is None:
+            raise results[0][1]
+
+        name = pipelines[best_index][0]
+        traj = results[best_index][1]
+        logger.debug('Post-processing pipeline "%s" produced the fastest'
+                     ' trajectory, with a duration of %.3f seconds.',
+                     name, traj.GetDuration())
+
+        SetTrajectoryTags(traj, {
+            Tags.POSTPROCESS_PIPELINE: name,
+            Tags.POSTPROCESS_PIPELINE_TIMES: dict(
+                (pipeline_name, result[2]) for (pipeline_name, _, _), result
+                in zip(pipelines, results)),
+        }, append=True)
+        return traj
+
     def ExecutePath(self, path, **kwargs):
         """ Post-process and execute an un-timed path.
 
@@ -412,7 +680,8 @@ class Robot(openravepy.Robot):
         SetTrajectoryTags(exec_traj, {Tags.EXECUTION_TIME: timer.get_duration()}, append=True)
         return exec_traj
 
-    def ExecuteTrajectory(self, traj, timeout=None, period=0.01, **kwargs):
+    def ExecuteTrajectory(self, traj, timeout=None, period=0.01,
+                          return_executed=False, **kwargs):
         """ Executes a time trajectory on the robot.
 
         This function directly executes a timed OpenRAVE trajectory on the
@@ -433,13 +702,16 @@ class Robot(openravepy.Robot):
         successful or not. Other values of timeout are only supported for
         legacy reasons.
 
-        This function returns the trajectory that was actually executed on the
-        robot, including controller error. If this is not available, the input
-        trajectory will be returned instead.
+        If return_executed = True, this function returns the trajectory that
+        was actually executed on the robot, including controller error, built
+        from the feedback of the controllers. If this is not available, or
+        return_executed = False (the default), the input trajectory will be
+        returned instead.
 
         @param traj timed OpenRAVE trajectory to be executed
         @param timeout maximum time to wait for execution to finish
         @param period poll rate, in seconds, for checking trajectory status
+        @param return_executed return the trajectory built from feedback
         @return trajectory executed on the robot
         """
         # Don't execute trajectories that don't have at least one waypoint.
@@ -494,6 +766,19 @@ class Robot(openravepy.Robot):
                     ' available. Is self.base.controller set?')
 
         util.WaitForControllers(active_controllers, timeout=timeout)
+
+        if return_executed:
+            from ..controllers import CreateExecutedTrajectory
+
+            executed_traj = CreateExecutedTrajectory(self, active_controllers)
+            if executed_traj is not None:
+                SetTrajectoryTags(executed_traj, GetTrajectoryTags(traj))
+                return executed_traj
+
+            logger.warning('No controller feedback is available. Returning'
+                           ' the input trajectory instead of the executed'
+                           ' trajectory.')
+
         return traj
 
     def ViolatesVelocityLimits(self, traj):
@@ -502,7 +787,7 @@ class Robot(openravepy.Robot):
         @param traj input trajectory
         """
         # Get the limits that pertain to this trajectory
-        all_velocity_limits = self.GetDOFVelocityLimits()
+        all_velocity_limits = self.GetKinematicLimits().velocity
         traj_indices = util.GetTrajectoryIndices(traj)
         velocity_limits = [all_velocity_limits[idx] for idx in traj_indices]
 
@@ -1,3 +1,5 @@
 from rewd_controllers import OrController, RewdOrController, RewdOrTrajectoryController
 from position_command_controller import PositionCommandController
 from trigger_controller import TriggerController
+from feedback import (CreateExecutedTrajectory, FeedbackBuffer,
+                      FeedbackSample)
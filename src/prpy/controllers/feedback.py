@@ -0,0 +1,185 @@
+import collections
+import logging
+import numpy
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class FeedbackSample(collections.namedtuple(
+        'FeedbackSample',
+        ['time', 'position', 'velocity', 'error', 'effort'])):
+    """A controller feedback sample
+
+    :param time: time stamp of the sample, in seconds
+    :param position: actual joint positions
+    :param velocity: actual joint velocities
+    :param error: tracking error, i.e. desired minus actual positions
+    :param effort: actual joint efforts, e.g. torques; empty if the
+                   controller does not report them
+    """
+    __slots__ = ()
+
+    def __new__(cls, time, position, velocity, error, effort=()):
+        return super(FeedbackSample, cls).__new__(
+            cls, time, position, velocity, error, effort)
+
+    @classmethod
+    def FromMessage(cls, feedback, joint_names=None):
+        """Convert a control_msgs/FollowJointTrajectoryFeedback message
+
+        :param feedback: FollowJointTrajectoryFeedback message
+        :param joint_names: optional order of the joints in the sample
+        :returns: FeedbackSample
+        """
+        if joint_names is None:
+            order = slice(None)
+        else:
+            indices = dict((name, i)
+                           for i, name in enumerate(feedback.joint_names))
+            order = [indices[name] for name in joint_names]
+
+        def Values(values):
+            values = numpy.array(values, dtype=float)
+            return values[order] if len(values) else values
+
+        return cls(time=feedback.header.stamp.to_sec(),
+                   position=Values(feedback.actual.positions),
+                   velocity=Values(feedback.actual.velocities),
+                   error=Values(feedback.error.positions),
+                   effort=Values(feedback.actual.effort))
+
+
+class FeedbackBuffer(object):
+    """A bounded ring buffer of controller feedback samples
+
+    Once the buffer holds capacity samples, each new sample replaces the
+    oldest one. Samples may be appended from any thread, e.g. a ROS
+    subscriber callback, and callbacks added with AddCallback are called
+    with every new sample.
+    """
+    def __init__(self, capacity=10000):
+        if capacity < 1:
+            raise ValueError('Capacity must be positive.')
+
+        self._samples = collections.deque(maxlen=capacity)
+        self._callbacks = []
+        self._lock = threading.Lock()
+        self.num_dropped = 0
+
+    def __len__(self):
+        with self._lock:
+            return len(self._samples)
+
+    @property
+    def capacity(self):
+        return self._samples.maxlen
+
+    def Append(self, sample):
+        with self._lock:
+            if len(self._samples) == self._samples.maxlen:
+                self.num_dropped += 1
+
+            self._samples.append(sample)
+            callbacks = list(self._callbacks)
+
+        for callback in callbacks:
+            try:
+                callback(sample)
+            except Exception:
+                logger.exception('Feedback callback raised an exception.')
+
+    def AddCallback(self, fn):
+        """Call fn(sample) with each new sample"""
+        with self._lock:
+            self._callbacks.append(fn)
+
+    def RemoveCallback(self, fn):
+        with self._lock:
+            self._callbacks.remove(fn)
+
+    def Clear(self):
+        with self._lock:
+            self._samples.clear()
+            self.num_dropped = 0
+
+    def GetLatest(self):
+        """Get the newest sample, or None if the buffer is empty"""
+        with self._lock:
+            return self._samples[-1] if self._samples else None
+
+    def GetSamples(self):
+        """Get a list of the buffered samples, oldest first"""
+        with self._lock:
+            return list(self._samples)
+
+    def GetArrays(self):
+        """Get the buffered samples as arrays, oldest first
+
+        :returns: (times, positions, velocities, errors) with one row per
+                  sample
+        """
+        samples = self.GetSamples()
+        if not samples:
+            empty = numpy.zeros((0, 0))
+            return numpy.zeros(0), empty, empty, empty
+
+        return (numpy.array([sample.time for sample in samples]),
+                numpy.array([sample.position for sample in samples]),
+                numpy.array([sample.velocity for sample in samples]),
+                numpy.array([sample.error for sample in samples]))
+
+
+def CreateExecutedTrajectory(robot, controllers):
+    """Create the trajectory that controllers executed from their feedback
+
+    Controllers without feedback are ignored. The positions of controllers
+    that sampled at different times are linearly interpolated at the union
+    of their time stamps.
+
+    :param robot: robot that owns the controllers
+    :param controllers: controllers that implement GetFeedback and
+                        GetControlDOFIndices
+    :returns: timed trajectory starting at the first sample, or None if there
+              is no feedback
+    """
+    import openravepy
+
+    parts = []
+    for controller in controllers:
+        try:
+            feedback = controller.GetFeedback()
+            dof_indices = controller.GetControlDOFIndices()
+        except (AttributeError, NotImplementedError):
+            continue
+
+        times, positions, _, _ = feedback.GetArrays()
+        if len(times):
+            parts.append((list(dof_indices), times, positions))
+
+    if not parts:
+        return None
+
+    times = numpy.unique(numpy.concatenate([part[1] for part in parts]))
+    dof_indices = sum((part[0] for part in parts), [])
+    positions = numpy.column_stack([
+        numpy.interp(times, part_times, part_positions[:, i])
+        for _, part_times, part_positions in parts
+        for i in xrange(part_positions.shape[1])])
+
+    cspec = robot.GetConfigurationSpecificationIndices(dof_indices, 'linear')
+    cspec.AddDeltaTimeGroup()
+
+    columns = cspec.ExtractJointValues(
+        numpy.arange(cspec.GetDOF(), dtype=float),
+        robot, dof_indices).astype(int)
+
+    waypoints = numpy.zeros((len(times), cspec.GetDOF()))
+    waypoints[:, columns] = positions
+    waypoints[1:, cspec.GetGroupFromName('deltatime').offset] = \
+        numpy.diff(times)
+
+    traj = openravepy.RaveCreateTrajectory(robot.GetEnv(), '')
+    traj.Init(cspec)
+    traj.Insert(0, waypoints.ravel())
+    return traj
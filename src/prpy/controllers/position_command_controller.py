@@ -35,3 +35,6 @@ class PositionCommandController(OrController):
 
     def IsDone(self):
         return self._current_cmd is None or self._current_cmd.done()
+
+    def GetCommandFuture(self):
+        return self._current_cmd
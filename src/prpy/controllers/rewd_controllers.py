@@ -1,4 +1,5 @@
 import logging
+from .feedback import CreateExecutedTrajectory, FeedbackBuffer, FeedbackSample
 
 
 class OrController(object):
@@ -28,6 +29,62 @@ class OrController(object):
     def IsDone(self):
         raise NotImplementedError("IsDone not implemented")
 
+    def GetCommandFuture(self):
+        raise NotImplementedError("GetCommandFuture not implemented")
+
+    def AddDoneCallback(self, fn):
+        """Call fn(self) once the current command finishes
+
+        If no command is executing, fn is called immediately.
+
+        :param fn: function that is called with this controller
+        :returns: True if fn will be called, False if the controller can
+                  only be polled with IsDone
+        """
+        try:
+            future = self.GetCommandFuture()
+        except NotImplementedError:
+            return False
+
+        if future is None:
+            fn(self)
+        elif hasattr(future, 'add_done_callback'):
+            def callback(_):
+                self._GetDoneCallbacks().pop(fn, None)
+                fn(self)
+
+            self._GetDoneCallbacks()[fn] = (future, callback)
+            future.add_done_callback(callback)
+        else:
+            return False
+        return True
+
+    def RemoveDoneCallback(self, fn):
+        """Stop fn from being called once the current command finishes
+
+        Does nothing if fn was already called or was never added.
+
+        :param fn: function that was passed to AddDoneCallback
+        """
+        entry = self._GetDoneCallbacks().pop(fn, None)
+        if entry is None:
+            return
+
+        future, callback = entry
+        try:
+            future.remove_done_callback(callback)
+        except (AttributeError, ValueError):
+            pass
+
+    def _GetDoneCallbacks(self):
+        # Not all subclasses call an __init__ of this class, so the map is
+        # created on first use.
+        try:
+            return self._done_callbacks
+        except AttributeError:
+            self._done_callbacks = {}
+            return self._done_callbacks
+
     def GetTime(self):
         raise NotImplementedError("GetTime not implemented")
     
@@ -37,6 +94,9 @@ class OrController(object):
     def GetTorque(self):
         raise NotImplementedError("GetTorque not implemented")
 
+    def GetFeedback(self):
+        raise NotImplementedError("GetFeedback not implemented")
+
 
 class RewdOrController(OrController):
     """A super class for initializing all RewdOrControllers"""
@@ -56,7 +116,8 @@ class RewdOrTrajectoryController(RewdOrController):
     is "compatible" with how we use OpenRAVE controllers
     """
     def __init__(self, robot, namespace, controller_name, joint_names,
-                 simulated=False):
+                 simulated=False, feedback_capacity=10000,
+                 feedback_topic=None):
         super(RewdOrTrajectoryController, self).__init__(robot,
                                                          namespace,
                                                          joint_names,
@@ -70,6 +131,19 @@ class RewdOrTrajectoryController(RewdOrController):
         self.controller_client = FollowJointTrajectoryClient(namespace,
                                                              controller_name)
         self.current_trajectory = None
+
+        # Stream feedback from the action server into a ring buffer.
+        import rospy
+        from control_msgs.msg import FollowJointTrajectoryActionFeedback
+
+        if feedback_topic is None:
+            feedback_topic = '{:s}/{:s}/follow_joint_trajectory/feedback'\
+                .format(namespace, controller_name)
+
+        self.feedback = FeedbackBuffer(feedback_capacity)
+        self.feedback_subscriber = rospy.Subscriber(
+            feedback_topic, FollowJointTrajectoryActionFeedback,
+            self._FeedbackCallback)
         self.logger.info('Rewd Trajectory Controller initialized')
 
     def SetPath(self, traj):
@@ -80,13 +154,62 @@ class RewdOrTrajectoryController(RewdOrController):
                                             'trajectory', traj, None)
 
         ros_traj = or_to_ros_trajectory(self.GetRobot(), traj)
+        self.feedback.Clear()
         self.current_trajectory = self.controller_client.execute(ros_traj)
 
     def IsDone(self):
         return (self.current_trajectory is None or
                 self.current_trajectory.done())
 
+    def GetCommandFuture(self):
+        return self.current_trajectory
+
+    def GetControlDOFIndices(self):
+        return [self.GetRobot().GetJoint(name).GetDOFIndex()
+                for name in self.joint_names]
+
+    def GetFeedback(self):
+        """Get the ring buffer of feedback samples of the current trajectory
+
+        The buffer is cleared when a new trajectory is executed.
+        """
+        return self.feedback
+
     def GetTime(self):
-        # TODO implement with self.current_trajectory.partial_result()
-        raise NotImplementedError('GetTime not yet implemented in '
-                                  'RewdOrTrajectoryController')
+        """Get the time elapsed since the first feedback sample"""
+        samples = self.feedback.GetSamples()
+        if not samples:
+            return 0.
+        return samples[-1].time - samples[0].time
+
+    def GetVelocity(self):
+        latest = self.feedback.GetLatest()
+        if latest is None:
+            raise ValueError('No feedback has been received.')
+        return latest.velocity
+
+    def GetTorque(self):
+        """Get the joint efforts of the latest feedback sample"""
+        latest = self.feedback.GetLatest()
+        if latest is None:
+            raise ValueError('No feedback has been received.')
+        if not len(latest.effort):
+            raise ValueError('The feedback does not contain efforts.')
+        return latest.effort
+
+    def GetExecutedTrajectory(self):
+        """Create the trajectory executed so far from the feedback
+
+        This is also available after execution failed, e.g. to resume from
+        the configuration the robot stopped in.
+
+        :returns: timed trajectory, or None if there is no feedback
+        """
+        return CreateExecutedTrajectory(self.GetRobot(), [self])
+
+    def _FeedbackCallback(self, msg):
+        if self.IsDone():
+            return
+
+        self.feedback.Append(
+            FeedbackSample.FromMessage(msg.feedback, self.joint_names))
@@ -44,3 +44,6 @@ class TriggerController(OrController):
         return (self.simulated or
                 self._current_cmd is None or
                 self._current_cmd.done())
+
+    def GetCommandFuture(self):
+        return None if self.simulated else self._current_cmd
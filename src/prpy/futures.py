@@ -168,13 +168,13 @@ class Future(object):
         """
         with self.lock:
             if self._is_done:
+                do_call = True
+            else:
                 if fn in self._callbacks:
                     raise ValueError('Callback is already registered.')
 
                 self._callbacks.append(fn)
                 do_call = False
-            else:
-                do_call = True
 
         if do_call:
             fn(self)
@@ -224,7 +224,7 @@ class Future(object):
             try:
                 callback_fn(self)
             except Exception:
-                self.logger.exception('Callback raised an exception.')
+                logger.exception('Callback raised an exception.')
 
 
 def defer(fn, executor=None, args=(), kwargs={}):
@@ -0,0 +1,312 @@
+import collections
+import logging
+import numpy
+import openravepy
+import threading
+from .util import GetKinematicLimits
+
+logger = logging.getLogger(__name__)
+
+
+class IKCache(object):
+    """
+    Memoize the IK solutions of a manipulator for repeated goal poses.
+
+    Goal poses are expressed in the frame of the manipulator's base link and
+    quantized, so the cache remains valid when the robot drives around. The
+    key also includes the IK filter options, the values of the DOFs that are
+    not part of the arm (e.g. the hand) and the names of the grabbed bodies,
+    since these all affect self-collision.
+
+    Only solutions that pass the self-collision and joint limit filters are
+    stored. Environment collisions are checked against the current scene on
+    every lookup, so cached solutions remain correct when objects move. The
+    cache is cleared if the robot's kinematics hash or joint limits change.
+
+    FindIKSolutions adds poses to the cache. By default, FindIKSolution uses
+    cached solutions of exactly repeated poses, but otherwise calls OpenRAVE
+    directly, so one-off queries do not fill the cache. Callers that expect
+    to query the same pose again pass fill_cache=True instead.
+
+    A prpy Manipulator owns one IKCache in its ik_cache attribute, which is
+    shared with its clones so that planners running in cloned environments
+    reuse the same solutions.
+    """
+    def __init__(self, position_resolution=1e-4, orientation_resolution=1e-4,
+                 max_size=10000):
+        """
+        @param position_resolution quantization of the goal position, in
+                                   meters
+        @param orientation_resolution quantization of the goal rotation matrix
+        @param max_size maximum number of goal poses to remember; the least
+                        recently used pose is discarded first
+        """
+        self.position_resolution = position_resolution
+        self.orientation_resolution = orientation_resolution
+        self.max_size = max_size
+
+        self.kinematics_hash = None
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+        self._solutions = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._solutions)
+
+    def Clear(self):
+        """
+        Discard all cached solutions and statistics.
+        """
+        with self._lock:
+            self.kinematics_hash = None
+            self.hits = 0
+            self.misses = 0
+            self.invalidations = 0
+            self._solutions.clear()
+
+    def GetHitRate(self):
+        """
+        Fraction of lookups that were answered from the cache.
+
+        @return hit rate in [0, 1]; zero if no lookups have been made
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return float(self.hits) / lookups if lookups else 0.
+
+    def GetStatistics(self):
+        """
+        Get a dictionary of cache statistics.
+
+        @return dictionary with hits, misses, hit_rate, invalidations and size
+        """
+        hit_rate = self.GetHitRate()
+
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': hit_rate,
+                'invalidations': self.invalidations,
+                'size': len(self._solutions),
+            }
+
+    def GetKey(self, manipulator, pose, filter_options):
+        """
+        Compute the cache key of an IK query.
+
+        @param manipulator the manipulator
+        @param pose 4x4 goal pose of the end-effector in the world frame
+        @param filter_options IkFilterOptions without CheckEnvCollisions
+        @return hashable key
+        """
+        robot = manipulator.GetRobot()
+        arm_indices = manipulator.GetArmIndices()
+
+        base_pose = manipulator.GetBase().GetTransform()
+        relative_pose = numpy.dot(numpy.linalg.inv(base_pose), pose)
+        rotation = numpy.floor(
+            relative_pose[0:3, 0:3] / self.orientation_resolution + 0.5)
+        position = numpy.floor(
+            relative_pose[0:3, 3] / self.position_resolution + 0.5)
+
+        # The rest of the robot can collide with the arm, so its configuration
+        # is part of the key.
+        other_indices = numpy.setdiff1d(
+            numpy.arange(robot.GetDOF()), arm_indices)
+        other_cells = numpy.floor(
+            robot.GetDOFValues(other_indices)
+            / GetKinematicLimits(robot).resolution[other_indices] + 0.5)
+        grabbed = tuple(sorted(body.GetName() for body in robot.GetGrabbed()))
+
+        return (manipulator.GetName(), int(filter_options),
+                tuple(rotation.astype(int).flat),
+                tuple(position.astype(int)),
+                tuple(other_cells.astype(int)), grabbed)
+
+    def _Validate(self, manipulator):
+        robot = manipulator.GetRobot()
+        arm_indices = manipulator.GetArmIndices()
+        limits = GetKinematicLimits(robot)
+        kinematics_hash = (robot.GetKinematicsGeometryHash(),
+                           limits.lower[arm_indices].tostring(),
+                           limits.upper[arm_indices].tostring())
+
+        with self._lock:
+            if kinematics_hash == self.kinematics_hash:
+                return
+
+            if self.kinematics_hash is not None:
+                self.invalidations += 1
+                logger.debug('Kinematics of %s changed; discarding %d cached'
+                             ' IK queries.', robot.GetName(),
+                             len(self._solutions))
+
+            self.kinematics_hash = kinematics_hash
+            self._solutions.clear()
+
+    def _Lookup(self, manipulator, pose, filter_options):
+        self._Validate(manipulator)
+        key = self.GetKey(manipulator, pose, filter_options)
+
+        with self._lock:
+            solutions = self._solutions.pop(key, None)
+            if solutions is not None:
+                self.hits += 1
+                self._solutions[key] = solutions
+            else:
+                self.misses += 1
+
+        return key, solutions
+
+    def FindIKSolutions(self, manipulator, pose, filter_options):
+        """
+        Find all IK solutions for a goal pose, using cached solutions if the
+        same pose was queried before.
+
+        @param manipulator the manipulator
+        @param pose 4x4 goal pose of the end-effector in the world frame
+        @param filter_options IkFilterOptions passed to OpenRAVE
+        @return (n, num_arm_dofs) array of IK solutions
+        """
+        ikfo = openravepy.IkFilterOptions
+        check_env = bool(filter_options & ikfo.CheckEnvCollisions)
+        stored_options = filter_options & ~ikfo.CheckEnvCollisions
+
+        key, solutions = self._Lookup(manipulator, pose, stored_options)
+
+        if solutions is None:
+            solutions = self._Insert(manipulator, pose, key, stored_options)
+
+        if check_env and solutions.shape[0] > 0:
+            solutions = solutions[self._FindEnvFree(manipulator, solutions)]
+
+        return solutions
+
+    def FindIKSolution(self, manipulator, pose, filter_options,
+                       fill_cache=False):
+        """
+        Find the IK solution closest to the arm's current configuration.
+
+        Cached solutions are used if all IK solutions of the same pose were
+        queried before. Otherwise, this calls OpenRAVE's FindIKSolution,
+        which is much faster than finding all solutions, and does not add the
+        pose to the cache, unless fill_cache is True.
+
+        @param manipulator the manipulator
+        @param pose 4x4 goal pose of the end-effector in the world frame
+        @param filter_options IkFilterOptions passed to OpenRAVE
+        @param fill_cache find and cache all IK solutions if the pose is not
+                          cached, so that repeated queries are cache hits
+        @return IK solution, or None if there is no solution
+        """
+        ikfo = openravepy.IkFilterOptions
+        stored_options = filter_options & ~ikfo.CheckEnvCollisions
+
+        key, solutions = self._Lookup(manipulator, pose, stored_options)
+
+        if solutions is None and fill_cache:
+            solutions = self._Insert(manipulator, pose, key, stored_options)
+        elif solutions is None:
+            ik_param = openravepy.IkParameterization(
+                pose, openravepy.IkParameterizationType.Transform6D)
+            return manipulator.FindIKSolution(
+                ik_param, filter_options, ikreturn=False, releasegil=True)
+
+        if filter_options & ikfo.CheckEnvCollisions and solutions.shape[0] > 0:
+            solutions = solutions[self._FindEnvFree(manipulator, solutions)]
+
+        if solutions.shape[0] == 0:
+            return None
+
+        robot = manipulator.GetRobot()
+        arm_indices = manipulator.GetArmIndices()
+        weights = robot.GetDOFWeights()[arm_indices]
+        current = robot.GetDOFValues(arm_indices)
+
+        distances = numpy.sum(weights * (solutions - current) ** 2, axis=1)
+        return numpy.array(solutions[numpy.argmin(distances)])
+
+    def _Insert(self, manipulator, pose, key, stored_options):
+        ik_param = openravepy.IkParameterization(
+            pose, openravepy.IkParameterizationType.Transform6D)
+        solutions = manipulator.FindIKSolutions(
+            ik_param, stored_options, ikreturn=False, releasegil=True)
+        solutions = numpy.reshape(
+            solutions, (-1, len(manipulator.GetArmIndices())))
+        solutions.flags.writeable = False
+
+        with self._lock:
+            self._solutions[key] = solutions
+            while len(self._solutions) > self.max_size:
+                self._solutions.popitem(last=False)
+
+        return solutions
+
+    def _FindEnvFree(self, manipulator, solutions):
+        robot = manipulator.GetRobot()
+        env = robot.GetEnv()
+        arm_indices = manipulator.GetArmIndices()
+        p = openravepy.KinBody.SaveParameters
+
+        is_free = numpy.zeros(solutions.shape[0], dtype=bool)
+        with robot.CreateRobotStateSaver(p.LinkTransformation):
+            for i, q in enumerate(solutions):
+                robot.SetDOFValues(q, arm_indices)
+                is_free[i] = not env.CheckCollision(robot)
+
+        return is_free
+
+
+def FindIKSolutions(manipulator, pose, filter_options, cache=None):
+    """
+    Find all IK solutions for a goal pose.
+
+    @param manipulator the manipulator
+    @param pose 4x4 goal pose of the end-effector in the world frame
+    @param filter_options IkFilterOptions passed to OpenRAVE
+    @param cache optional IKCache to consult
+    @return (n, num_arm_dofs) array of IK solutions
+    """
+    if cache is not None:
+        return cache.FindIKSolutions(manipulator, pose, filter_options)
+
+    ik_param = openravepy.IkParameterization(
+        pose, openravepy.IkParameterizationType.Transform6D)
+    return manipulator.FindIKSolutions(
+        ik_param, filter_options, ikreturn=False, releasegil=True)
+
+
+def FindIKSolution(manipulator, pose, filter_options, cache=None,
+                   fill_cache=False):
+    """
+    Find the IK solution closest to the arm's current configuration.
+
+    @param manipulator the manipulator
+    @param pose 4x4 goal pose of the end-effector in the world frame
+    @param filter_options IkFilterOptions passed to OpenRAVE
+    @param cache optional IKCache to consult
+    @param fill_cache add the pose to the cache if it is not cached yet
+    @return IK solution, or None if there is no solution
+    """
+    if cache is not None:
+        return cache.FindIKSolution(manipulator, pose, filter_options,
+                                    fill_cache=fill_cache)
+
+    ik_param = openravepy.IkParameterization(
+        pose, openravepy.IkParameterizationType.Transform6D)
+    return manipulator.FindIKSolution(
+        ik_param, filter_options, ikreturn=False, releasegil=True)
+
+
+def GetIKCache(manipulator):
+    """
+    Get the IKCache of a manipulator, if it has one.
+
+    @param manipulator the manipulator
+    @return IKCache, or None for manipulators that are not bound to prpy
+    """
+    return getattr(manipulator, 'ik_cache', None)
@@ -28,9 +28,51 @@
 # ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
 # POSSIBILITY OF SUCH DAMAGE.
 
+import heapq
+import itertools
 import numpy
 
 
+class IKRanker(object):
+    """
+    Base class for IK rankers that precompute per-robot data.
+
+    A ranker scores an (n, num_dofs) array of IK solutions; lower scores are
+    better and infinite scores mark infeasible solutions. Bind() does any
+    per-robot work once, e.g. querying joint limits, and returns a function
+    that only scores solutions. Call Bind() once and reuse the result when
+    ranking many batches of solutions for the same robot.
+
+    Any function with the signature ranker(robot, ik_solutions) can be used
+    wherever an IKRanker is accepted.
+    """
+    def Bind(self, robot):
+        """
+        Precompute the data needed to rank IK solutions for a robot.
+
+        @param robot robot whose active DOFs the IK solutions are for
+        @return function that maps IK solutions to an array of scores
+        """
+        raise NotImplementedError
+
+    def __call__(self, robot, ik_solutions):
+        return self.Bind(robot)(ik_solutions)
+
+
+def BindRanker(ranker, robot):
+    """
+    Bind an IKRanker or a plain ranking function to a robot.
+
+    @param ranker IKRanker or function ranker(robot, ik_solutions)
+    @param robot robot whose active DOFs the IK solutions are for
+    @return function that maps IK solutions to an array of scores
+    """
+    if isinstance(ranker, IKRanker):
+        return ranker.Bind(robot)
+    else:
+        return lambda ik_solutions: ranker(robot, ik_solutions)
+
+
 def NoRanking(robot, ik_solutions):
     """
     Return IK solutions with an arbitrary ranking.
@@ -42,17 +84,46 @@ def JointLimitAvoidance(robot, ik_solutions):
     """
     Score IK solutions by their distance from joint limits. This is implemented
     with a quadratic loss function that measures distance from limits.
+
+    This queries the robot's joint limits on every call; use
+    JointLimitAvoidanceRanker to query them once.
     """
-    with robot.GetEnv():
-        lower_limits, upper_limits = robot.GetActiveDOFLimits()
+    return JointLimitAvoidanceRanker()(robot, ik_solutions)
+
+
+class JointLimitAvoidanceRanker(IKRanker):
+    def __init__(self, lower_limits=None, upper_limits=None):
+        """
+        Score IK solutions by their distance from joint limits. This is
+        implemented with a quadratic loss function that measures distance from
+        limits.
+
+        @param lower_limits optional lower limits; defaults to the robot's
+                            active DOF limits
+        @param upper_limits optional upper limits; defaults to the robot's
+                            active DOF limits
+        """
+        self.lower_limits = lower_limits
+        self.upper_limits = upper_limits
+
+    def Bind(self, robot):
+        if self.lower_limits is None or self.upper_limits is None:
+            with robot.GetEnv():
+                lower_limits, upper_limits = robot.GetActiveDOFLimits()
+        if self.lower_limits is not None:
+            lower_limits = numpy.array(self.lower_limits, dtype=float)
+        if self.upper_limits is not None:
+            upper_limits = numpy.array(self.upper_limits, dtype=float)
 
-    lower_distance = ik_solutions - lower_limits
-    upper_distance = upper_limits - ik_solutions
-    distance = numpy.minimum(lower_distance, upper_distance)
-    return -numpy.sum(distance**2, axis=1)
+        def rank(ik_solutions):
+            distance = numpy.minimum(ik_solutions - lower_limits,
+                                     upper_limits - ik_solutions)
+            return -numpy.einsum('ij,ij->i', distance, distance)
 
+        return rank
 
-class NominalConfiguration(object):
+
+class NominalConfiguration(IKRanker):
     def __init__(self, q_nominal, max_deviation=2*numpy.pi):
         """
         Score IK solutions by their distance from a nominal configuration.
@@ -60,19 +131,132 @@ class NominalConfiguration(object):
         @param max_deviation specify a maximum allowable per-joint deviation
                              from the nominal configuration, default is 2*PI
         """
-        self.q_nominal = q_nominal
+        self.q_nominal = numpy.array(q_nominal, dtype=float)
         self.max_deviation = max_deviation
 
-    def __call__(self, robot, ik_solutions):
+    def Bind(self, robot):
+        return self._Rank
+
+    def _Rank(self, ik_solutions):
         assert ik_solutions.shape[1] == self.q_nominal.shape[0]
-        L_2 = numpy.linalg.norm(ik_solutions - self.q_nominal,
-                                axis=1, ord=2)
+        deviation = ik_solutions - self.q_nominal
+        L_2 = numpy.sqrt(numpy.einsum('ij,ij->i', deviation, deviation))
 
         # Ignore IK solutions that are more than the specified distance away.
         # (This means a closer solution must exist!)
         if self.max_deviation is not None:
-            L_inf = numpy.linalg.norm(ik_solutions - self.q_nominal,
-                                      axis=1, ord=numpy.inf)
+            L_inf = numpy.max(numpy.abs(deviation), axis=1)
             L_2[L_inf > self.max_deviation] = numpy.inf
 
         return L_2
+
+
+class WeightedRanker(IKRanker):
+    def __init__(self, rankers, weights=None):
+        """
+        Score IK solutions by a weighted sum of the scores of other rankers.
+        A solution is infeasible if any ranker with a non-zero weight scores
+        it as infeasible.
+
+        @param rankers list of IKRankers or ranking functions
+        @param weights list of weights; defaults to one for each ranker
+        """
+        if weights is None:
+            weights = numpy.ones(len(rankers))
+        if len(weights) != len(rankers):
+            raise ValueError('There must be one weight per ranker.')
+
+        self.rankers = list(rankers)
+        self.weights = numpy.array(weights, dtype=float)
+
+    def Bind(self, robot):
+        bound_rankers = [
+            (BindRanker(ranker, robot), weight)
+            for ranker, weight in zip(self.rankers, self.weights)
+            if weight != 0.
+        ]
+
+        def rank(ik_solutions):
+            scores = numpy.zeros(ik_solutions.shape[0])
+            infeasible = numpy.zeros(ik_solutions.shape[0], dtype=bool)
+
+            for bound_ranker, weight in bound_rankers:
+                ranker_scores = numpy.asarray(bound_ranker(ik_solutions),
+                                              dtype=float)
+                infeasible |= numpy.isposinf(ranker_scores)
+                ranker_scores[infeasible] = 0.
+                scores += weight * ranker_scores
+
+            scores[infeasible] = numpy.inf
+            return scores
+
+        return rank
+
+
+class TopKSolutions(object):
+    def __init__(self, robot, ranker, k):
+        """
+        Incrementally rank batches of IK solutions, keeping only the k best.
+
+        Solutions are scored as they are added, so the full set of solutions
+        never has to be materialized and sorted. Infeasible solutions, i.e.
+        those with infinite cost, are discarded.
+
+        @param robot robot whose active DOFs the IK solutions are for
+        @param ranker IKRanker or function ranker(robot, ik_solutions)
+        @param k maximum number of solutions to keep
+        """
+        self.k = k
+        self.num_added = 0
+        self.num_feasible = 0
+
+        self._rank = BindRanker(ranker, robot)
+        self._heap = []  # (-score, counter, solution); worst solution first
+        self._counter = itertools.count()
+
+    def __len__(self):
+        return len(self._heap)
+
+    def Add(self, ik_solutions):
+        """
+        Score a batch of IK solutions and keep those among the k best.
+
+        @param ik_solutions (n, num_dofs) array of IK solutions
+        """
+        ik_solutions = numpy.asarray(ik_solutions)
+        if ik_solutions.shape[0] == 0:
+            return
+
+        scores = numpy.asarray(self._rank(ik_solutions), dtype=float)
+        feasible = numpy.flatnonzero(~numpy.isposinf(scores))
+
+        self.num_added += ik_solutions.shape[0]
+        self.num_feasible += feasible.shape[0]
+
+        if self.k <= 0:
+            return
+
+        # Only the k best solutions of a batch can enter the heap.
+        if feasible.shape[0] > self.k:
+            best = numpy.argpartition(scores[feasible], self.k - 1)
+            feasible = feasible[best[:self.k]]
+
+        for i in feasible:
+            entry = (-scores[i], next(self._counter), ik_solutions[i])
+
+            if len(self._heap) < self.k:
+                heapq.heappush(self._heap, entry)
+            elif entry[0] > self._heap[0][0]:
+                heapq.heapreplace(self._heap, entry)
+
+    def GetSolutions(self):
+        """
+        Get the best solutions, in ascending order of cost.
+
+        @return (scores, ik_solutions) tuple of an (m,) array of scores and
+                an (m, num_dofs) array of IK solutions, with m <= k
+        """
+        entries = sorted(self._heap, key=lambda entry: (-entry[0], entry[1]))
+        scores = numpy.array([-entry[0] for entry in entries])
+        ik_solutions = numpy.array([entry[2] for entry in entries])
+        return scores, ik_solutions
@@ -44,172 +44,252 @@ import numpy
 # R = numpy.eye(3) #3x3 rotation matrix
 # pose = [tx,ty,tz, qx,qy,qz,qw] # 7 element pose list with 3 element translation first followed by 4 element quaternion with qw last
 
+# Every conversion has a *_batch version that operates on arrays of shape
+# (n, ...), e.g. an (n, 4, 4) array of transforms, without looping in Python.
+# The unsuffixed functions operate on a single value and wrap the batch ones.
+
 # Ideas:
 #   TODO: rewrite the quat functions to match the OpenRAVE quat format ([qw,qx,qy,qz]).
 #   TODO: rewrite the pose functions to match the OpenRAVE pose format ([qw,qx,qy,qz,tx,ty,tz]).
 
+def _as_batch(x, ndim):
+    x = numpy.asarray(x, dtype=float)
+    if x.ndim != ndim:
+        raise ValueError('Expected an array with {:d} dimensions, got shape'
+                         ' {!r}.'.format(ndim, x.shape))
+    return x
+
+
+def pose_normalize_batch(poses):
+    '''
+    Normalize the quaternions of an (n, 7) array of poses in place.
+    '''
+    quats = poses[:, 3:7]
+    norms = numpy.sqrt(numpy.einsum('ij,ij->i', quats, quats))
+    quats /= norms[:, numpy.newaxis]
+
 def pose_normalize(pose):
     nm = numpy.linalg.norm(pose[3:7])
     pose[3:7] /= nm
 
-def R_to_quat(R):
-
-    q = numpy.zeros(4)
-
-    t = 1 + R[0,0] + R[1,1] + R[2,2]
-    if R[0,0] > R[1,1] and R[0,0] > R[2,2]:
-        imax = 0
-    elif R[1,1] > R[2,2]:
-        imax = 1
-    else:
-        imax = 2
-
-    if t > 0.000001:
-        r = numpy.sqrt(t)
-        s = 0.5 / r
-        q[0] = (R[2,1]-R[1,2])*s # x
-        q[1] = (R[0,2]-R[2,0])*s # y
-        q[2] = (R[1,0]-R[0,1])*s # z
-        q[3] = 0.5 * r # w
-    elif imax == 0: # Rxx largest
-        r = numpy.sqrt(1 + R[0,0] - R[1,1] - R[2,2])
-        s = 0.5 / r
-        q[0] = 0.5 * r # x
-        q[1] = (R[0,1]+R[1,0])*s # y
-        q[2] = (R[0,2]+R[2,0])*s # z
-        q[3] = (R[2,1]-R[1,2])*s # w
-    elif imax == 1: # Ryy largest
-        r = numpy.sqrt(1 - R[0,0] + R[1,1] - R[2,2])
-        s = 0.5 / r
-        q[0] = (R[1,0]+R[0,1])*s # x
-        q[1] = 0.5 * r # y
-        q[2] = (R[1,2]+R[2,1])*s # z ???
-        q[3] = (R[0,2]-R[2,0])*s # w
-    else: # Rzz largest
-        r = numpy.sqrt(1 - R[0,0] - R[1,1] + R[2,2])
-        s = 0.5 / r
-        q[0] = (R[2,0]+R[0,2])*s # x
-        q[1] = (R[2,1]+R[1,2])*s # y
-        q[2] = 0.5 * r # z
-        q[3] = (R[1,0]-R[0,1])*s # w
-    return q
+def R_to_quat_batch(R):
+    '''
+    Convert an (n, 3, 3) array of rotation matrices to an (n, 4) array of
+    quaternions.
 
+    All four extraction formulas are evaluated for every matrix and the
+    numerically stable one is selected, instead of branching per matrix.
+    '''
+    R = _as_batch(R, 3)
+    n = R.shape[0]
+
+    t = 1 + R[:,0,0] + R[:,1,1] + R[:,2,2]
+    imax = numpy.where((R[:,0,0] > R[:,1,1]) & (R[:,0,0] > R[:,2,2]), 0,
+                       numpy.where(R[:,1,1] > R[:,2,2], 1, 2))
+    case = numpy.where(t > 0.000001, 3, imax)
+
+    diagonal = numpy.array([
+        1 + R[:,0,0] - R[:,1,1] - R[:,2,2], # Rxx largest
+        1 - R[:,0,0] + R[:,1,1] - R[:,2,2], # Ryy largest
+        1 - R[:,0,0] - R[:,1,1] + R[:,2,2], # Rzz largest
+        t,
+    ])
+    r = numpy.sqrt(diagonal[case, numpy.arange(n)])
+    s = 0.5 / r
+    h = 0.5 * r
+
+    xw = (R[:,2,1] - R[:,1,2]) * s
+    yw = (R[:,0,2] - R[:,2,0]) * s
+    zw = (R[:,1,0] - R[:,0,1]) * s
+    xy = (R[:,0,1] + R[:,1,0]) * s
+    xz = (R[:,0,2] + R[:,2,0]) * s
+    yz = (R[:,1,2] + R[:,2,1]) * s
+
+    # candidates[c, i] is component i of the quaternion computed by case c.
+    candidates = numpy.array([
+        [h, xy, xz, xw],
+        [xy, h, yz, yw],
+        [xz, yz, h, zw],
+        [xw, yw, zw, h],
+    ])
+    return candidates[case, :, numpy.arange(n)]
 
-def R_from_quat(quat):
-   R = numpy.zeros((3,3))
-   xx = quat[0] * quat[0]
-   xy = quat[0] * quat[1]
-   xz = quat[0] * quat[2]
-   xw = quat[0] * quat[3]
-   yy = quat[1] * quat[1]
-   yz = quat[1] * quat[2]
-   yw = quat[1] * quat[3]
-   zz = quat[2] * quat[2]
-   zw = quat[2] * quat[3]
-   R[0,0] = 1 - 2 * (yy + zz)
-   R[0,1] = 2 * (xy - zw)
-   R[0,2] = 2 * (xz + yw)
-   R[1,0] = 2 * (xy + zw)
-   R[1,1] = 1 - 2 * (xx + zz)
-   R[1,2] = 2 * (yz - xw)
-   R[2,0] = 2 * (xz - yw)
-   R[2,1] = 2 * (yz + xw)
-   R[2,2] = 1 - 2 * (xx + yy)
+def R_to_quat(R):
+    return R_to_quat_batch(numpy.asarray(R)[numpy.newaxis])[0]
+
+
+def R_from_quat_batch(quat):
+   '''
+   Convert an (n, 4) array of quaternions to an (n, 3, 3) array of rotation
+   matrices.
+   '''
+   quat = _as_batch(quat, 2)
+   x, y, z, w = quat[:,0], quat[:,1], quat[:,2], quat[:,3]
+   R = numpy.empty((quat.shape[0], 3, 3))
+   R[:,0,0] = 1 - 2 * (y*y + z*z)
+   R[:,0,1] = 2 * (x*y - z*w)
+   R[:,0,2] = 2 * (x*z + y*w)
+   R[:,1,0] = 2 * (x*y + z*w)
+   R[:,1,1] = 1 - 2 * (x*x + z*z)
+   R[:,1,2] = 2 * (y*z - x*w)
+   R[:,2,0] = 2 * (x*z - y*w)
+   R[:,2,1] = 2 * (y*z + x*w)
+   R[:,2,2] = 1 - 2 * (x*x + y*y)
    return R
 
+def R_from_quat(quat):
+   return R_from_quat_batch(numpy.asarray(quat)[numpy.newaxis])[0]
+
+
+def pose_to_H_batch(pose):
+   '''
+   Convert an (n, 7) array of poses to an (n, 4, 4) array of transforms.
+   '''
+   pose = _as_batch(pose, 2)
+   H = numpy.zeros((pose.shape[0], 4, 4))
+   H[:,0:3,0:3] = R_from_quat_batch(pose[:,3:7])
+   H[:,0:3,3] = pose[:,0:3]
+   H[:,3,3] = 1.0
+   return H
 
 def pose_to_H(pose):
-   H = numpy.eye(4)
-   H[0:3,0:3] = R_from_quat(pose[3:7])
-   H[0:3,3] = pose[0:3]
-   return H
+   return pose_to_H_batch(numpy.asarray(pose)[numpy.newaxis])[0]
+
+def pose_from_H_batch(H):
+   '''
+   Convert an (n, 4, 4) array of transforms to an (n, 7) array of poses.
+   '''
+   H = _as_batch(H, 3)
+   pose = numpy.empty((H.shape[0], 7))
+   pose[:,0:3] = H[:,0:3,3]
+   pose[:,3:7] = R_to_quat_batch(H[:,0:3,0:3])
+   return pose
 
 def pose_from_H(H):
-   pose = numpy.zeros(7)
-   pose[0:3] = H[0:3,3]
-   pose[3:7] = R_to_quat(H[0:3,0:3])
-   return pose
+   return pose_from_H_batch(numpy.asarray(H)[numpy.newaxis])[0]
 
 
-def quat_to_ypr(quat):
-   ypr = numpy.zeros(3)
-   qx = quat[0]
-   qy = quat[1]
-   qz = quat[2]
-   qw = quat[3]   
+def quat_to_ypr_batch(quat):
+   '''
+   Convert an (n, 4) array of quaternions to an (n, 3) array of
+   [yaw, pitch, roll] angles.
+   '''
+   quat = _as_batch(quat, 2)
+   qx, qy, qz, qw = quat[:,0], quat[:,1], quat[:,2], quat[:,3]
    sinp2 = qw*qy-qz*qx
-   if sinp2 > 0.49999:
-      ypr[0] = -2.0*numpy.arctan2(qx,qw)
-      ypr[1] = 0.5*numpy.pi
-      ypr[2] = 0.0
-   elif sinp2 < -0.49999:
-      ypr[0] = 2.0*numpy.arctan2(qx,qw)
-      ypr[1] = -0.5*numpy.pi
-      ypr[2] = 0.0
-   else:
-      ypr[0] = numpy.arctan2(2*(qw*qz+qx*qy), 1-2*(qy*qy+qz*qz))
-      ypr[1] = numpy.arcsin(2*sinp2)
-      ypr[2] = numpy.arctan2(2*(qw*qx+qy*qz), 1-2*(qx*qx+qy*qy))
+   north = sinp2 > 0.49999
+   south = sinp2 < -0.49999
+   singular = north | south
+
+   ypr = numpy.empty((quat.shape[0], 3))
+   ypr[:,0] = numpy.arctan2(2*(qw*qz+qx*qy), 1-2*(qy*qy+qz*qz))
+   ypr[:,1] = numpy.arcsin(numpy.clip(2*sinp2, -1.0, 1.0))
+   ypr[:,2] = numpy.arctan2(2*(qw*qx+qy*qz), 1-2*(qx*qx+qy*qy))
+
+   # At the singularities, put all of the rotation about Z into yaw.
+   yaw_singular = 2.0*numpy.arctan2(qx,qw)
+   ypr[north,0] = -yaw_singular[north]
+   ypr[south,0] = yaw_singular[south]
+   ypr[north,1] = 0.5*numpy.pi
+   ypr[south,1] = -0.5*numpy.pi
+   ypr[singular,2] = 0.0
    return ypr
 
-
-def quat_from_ypr(ypr):
-   quat = numpy.zeros(4)
-   cy2 = numpy.cos(0.5*ypr[0])
-   sy2 = numpy.sin(0.5*ypr[0])
-   cp2 = numpy.cos(0.5*ypr[1])
-   sp2 = numpy.sin(0.5*ypr[1])
-   cr2 = numpy.cos(0.5*ypr[2])
-   sr2 = numpy.sin(0.5*ypr[2])
-   quat[0] = -sy2*sp2*cr2 + cy2*cp2*sr2 # qx
-   quat[1] =  cy2*sp2*cr2 + sy2*cp2*sr2 # qy
-   quat[2] = -cy2*sp2*sr2 + sy2*cp2*cr2 # qz
-   quat[3] =  sy2*sp2*sr2 + cy2*cp2*cr2 # qw
+def quat_to_ypr(quat):
+   return quat_to_ypr_batch(numpy.asarray(quat)[numpy.newaxis])[0]
+
+
+def quat_from_ypr_batch(ypr):
+   '''
+   Convert an (n, 3) array of [yaw, pitch, roll] angles to an (n, 4) array of
+   quaternions.
+   '''
+   ypr = _as_batch(ypr, 2)
+   cy2 = numpy.cos(0.5*ypr[:,0])
+   sy2 = numpy.sin(0.5*ypr[:,0])
+   cp2 = numpy.cos(0.5*ypr[:,1])
+   sp2 = numpy.sin(0.5*ypr[:,1])
+   cr2 = numpy.cos(0.5*ypr[:,2])
+   sr2 = numpy.sin(0.5*ypr[:,2])
+   quat = numpy.empty((ypr.shape[0], 4))
+   quat[:,0] = -sy2*sp2*cr2 + cy2*cp2*sr2 # qx
+   quat[:,1] =  cy2*sp2*cr2 + sy2*cp2*sr2 # qy
+   quat[:,2] = -cy2*sp2*sr2 + sy2*cp2*cr2 # qz
+   quat[:,3] =  sy2*sp2*sr2 + cy2*cp2*cr2 # qw
    return quat
 
+def quat_from_ypr(ypr):
+   return quat_from_ypr_batch(numpy.asarray(ypr)[numpy.newaxis])[0]
+
+
+def pose_from_xyzypr_batch(xyzypr):
+   '''
+   Convert an (n, 6) array of [x, y, z, yaw, pitch, roll] to an (n, 7) array
+   of poses.
+   '''
+   xyzypr = _as_batch(xyzypr, 2)
+   pose = numpy.empty((xyzypr.shape[0], 7))
+   pose[:,0:3] = xyzypr[:,0:3]
+   pose[:,3:7] = quat_from_ypr_batch(xyzypr[:,3:6])
+   return pose
 
 def pose_from_xyzypr(xyzypr):
-   pose = numpy.zeros(7)
-   cy2 = numpy.cos(0.5*xyzypr[3])
-   sy2 = numpy.sin(0.5*xyzypr[3])
-   cp2 = numpy.cos(0.5*xyzypr[4])
-   sp2 = numpy.sin(0.5*xyzypr[4])
-   cr2 = numpy.cos(0.5*xyzypr[5])
-   sr2 = numpy.sin(0.5*xyzypr[5])
-   pose[0] = xyzypr[0]
-   pose[1] = xyzypr[1]
-   pose[2] = xyzypr[2]
-   pose[3] = -sy2*sp2*cr2 + cy2*cp2*sr2 # qx
-   pose[4] =  cy2*sp2*cr2 + sy2*cp2*sr2 # qy
-   pose[5] = -cy2*sp2*sr2 + sy2*cp2*cr2 # qz
-   pose[6] =  sy2*sp2*sr2 + cy2*cp2*cr2 # qw
-   return pose
+   return pose_from_xyzypr_batch(numpy.asarray(xyzypr)[numpy.newaxis])[0]
+
+def pose_to_xyzypr_batch(pose):
+   '''
+   Convert an (n, 7) array of poses to an (n, 6) array of
+   [x, y, z, yaw, pitch, roll].
+   '''
+   pose = _as_batch(pose, 2)
+   xyzypr = numpy.empty((pose.shape[0], 6))
+   xyzypr[:,0:3] = pose[:,0:3]
+   xyzypr[:,3:6] = quat_to_ypr_batch(pose[:,3:7])
+   return xyzypr
 
 def pose_to_xyzypr(pose):
-   xyzypr = numpy.zeros(6)
-   xyzypr[0] = pose[0]
-   xyzypr[1] = pose[1]
-   xyzypr[2] = pose[2]
-   qx = pose[3]
-   qy = pose[4]
-   qz = pose[5]
-   qw = pose[6]
-   sinp2 = qw*qy-qz*qx
-   if sinp2 > 0.49999:
-      xyzypr[3] = -2.0*numpy.arctan2(qx,qw)
-      xyzypr[4] = 0.5*numpy.pi
-      xyzypr[5] = 0.0
-   elif sinp2 < -0.49999:
-      xyzypr[3] = 2.0*numpy.arctan2(qx,qw)
-      xyzypr[4] = -0.5*numpy.pi
-      xyzypr[5] = 0.0
-   else:
-      xyzypr[3] = numpy.arctan2(2*(qw*qz+qx*qy), 1-2*(qy*qy+qz*qz))
-      xyzypr[4] = numpy.arcsin(2*sinp2)
-      xyzypr[5] = numpy.arctan2(2*(qw*qx+qy*qz), 1-2*(qx*qx+qy*qy))
-   return xyzypr
+   return pose_to_xyzypr_batch(numpy.asarray(pose)[numpy.newaxis])[0]
 
 
+def H_from_op_diff_batch(pos_from, pos_to_diff):
+    '''
+    Produce an (n, 4, 4) array of transforms rooted at the locations
+    pos_from, an (n, 3) array, with Z axes pointed in the directions
+    pos_to_diff, an (n, 3) array. See H_from_op_diff.
+    '''
+    pos_from = _as_batch(pos_from, 2)
+    pos_to_diff = _as_batch(pos_to_diff, 2)
+    n = pos_to_diff.shape[0]
+
+    H = numpy.zeros((n, 4, 4))
+    H[:,0:3,3] = pos_from
+    H[:,3,3] = 1.0
+
+    # Define Z axis in direction of arrow
+    z = pos_to_diff / numpy.sqrt(
+        numpy.einsum('ij,ij->i', pos_to_diff, pos_to_diff))[:,numpy.newaxis]
+    H[:,0:3,2] = z
+
+    # Define other axes. If Z is too close to e1, cross e2 with Z to get X
+    # and then Y = Z x X. Otherwise cross Z with e1 to get Y and then
+    # X = Y x Z. Both are computed and the valid one is selected.
+    near_e1 = numpy.abs(z[:,0]) > 0.9
+
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        vlen_e1 = numpy.sqrt(z[:,2]*z[:,2] + z[:,0]*z[:,0])
+        x_e1 = numpy.column_stack((z[:,2] / vlen_e1, numpy.zeros(n),
+                                   -z[:,0] / vlen_e1))
+        y_e1 = numpy.cross(z, x_e1)
+
+        vlen = numpy.sqrt(z[:,2]*z[:,2] + z[:,1]*z[:,1])
+        y = numpy.column_stack((numpy.zeros(n), z[:,2] / vlen,
+                                -z[:,1] / vlen))
+        x = numpy.cross(y, z)
+
+    H[:,0:3,0] = numpy.where(near_e1[:,numpy.newaxis], x_e1, x)
+    H[:,0:3,1] = numpy.where(near_e1[:,numpy.newaxis], y_e1, y)
+    return H
+
 def H_from_op_diff(pos_from, pos_to_diff):
     '''
     Produce a transform H rooted at location pos_from
@@ -217,93 +297,96 @@ def H_from_op_diff(pos_from, pos_to_diff):
     Taken from libcds kin.c
     2011-08-01 cdellin
     '''
-    H = numpy.eye(4)
-    # Set d
-    H[0,3] = pos_from[0]
-    H[1,3] = pos_from[1]
-    H[2,3] = pos_from[2]
-    # Define Z axis in direction of arrow */
-    zlen = numpy.sqrt(numpy.dot(pos_to_diff,pos_to_diff))
-    H[0,2] = pos_to_diff[0]/zlen
-    H[1,2] = pos_to_diff[1]/zlen
-    H[2,2] = pos_to_diff[2]/zlen
-    # Define other axes
-    if abs(H[0,2]) > 0.9:
-        # Z is too close to e1, but sufficiently far from e2
-        # cross e2 with Z to get X (and normalize)
-        vlen = numpy.sqrt(H[2,2]*H[2,2] + H[0,2]*H[0,2])
-        H[0][0] = H[2,2] / vlen
-        H[1][0] = 0.0
-        H[2][0] = -H[0,2] / vlen
-        # Then Y = Z x X
-        H[0,1] = H[1,2] * H[2,0] - H[2,2] * H[1,0]
-        H[1,1] = H[2,2] * H[0,0] - H[0,2] * H[2,0]
-        H[2,1] = H[0,2] * H[1,0] - H[1,2] * H[0,0]
-    else:
-        # Z is sufficiently far from e1;
-        # cross Z with e1 to get Y (and normalize)
-        vlen = numpy.sqrt(H[2,2]*H[2,2] + H[1,2]*H[1,2])
-        H[0,1] = 0.0
-        H[1,1] = H[2,2] / vlen
-        H[2,1] = -H[1,2] / vlen
-        # Then X = Y x Z
-        H[0,0] = H[1,1] * H[2,2] - H[2,1] * H[1,2]
-        H[1,0] = H[2,1] * H[0,2] - H[0,1] * H[2,2]
-        H[2,0] = H[0,1] * H[1,2] - H[1,1] * H[0,2]
-    return H
+    return H_from_op_diff_batch(numpy.asarray(pos_from)[numpy.newaxis],
+                                numpy.asarray(pos_to_diff)[numpy.newaxis])[0]
 
 
+def invert_H_batch(H):
+    '''
+    Invert an (n, 4, 4) array of rigid transforms using the transpose of
+    their rotations.
+    '''
+    H = _as_batch(H, 3)
+    Rt = numpy.transpose(H[:,0:3,0:3], (0, 2, 1))
+    Hinv = numpy.zeros(H.shape)
+    Hinv[:,0:3,0:3] = Rt
+    Hinv[:,0:3,3] = -numpy.einsum('nij,nj->ni', Rt, H[:,0:3,3])
+    Hinv[:,3,3] = 1.0
+    return Hinv
+
 def invert_H(H):
     '''
     Invert transform H
     '''
-    R = H[0:3,0:3]
-    d = H[0:3,3]
-    Hinv = numpy.eye(4)
-    Hinv[0:3,0:3] = R.T
-    Hinv[0:3,3] = -numpy.dot(R.T, d)
-    return Hinv
+    return invert_H_batch(numpy.asarray(H)[numpy.newaxis])[0]
+
 
+def xyzt_to_H_batch(xyzt):
+    '''
+    Convert an (n, 4) array of [x,y,z,theta] to an (n, 4, 4) array of
+    transforms. theta is rotation about z-axis
+    '''
+    xyzt = _as_batch(xyzt, 2)
+    xyzypr = numpy.zeros((xyzt.shape[0], 6))
+    xyzypr[:,0:4] = xyzt
+    return xyzypr_to_H_batch(xyzypr)
 
 def xyzt_to_H(xyzt):
     '''
     Convert [x,y,z,theta] to 4x4 transform H
     theta is rotation about z-axis
     '''
-    ypr = [xyzt[3],0.0,0.0]
-    quat = quat_from_ypr(ypr)
-    pose = [xyzt[0],xyzt[1],xyzt[2],quat[0],quat[1],quat[2],quat[3]]
-    H = pose_to_H(pose)
-    return H
+    return xyzt_to_H_batch(numpy.asarray(xyzt)[numpy.newaxis])[0]
+
+def xyzypr_to_H_batch(xyzypr):
+    '''
+    Convert an (n, 6) array of [x,y,z,yaw,pitch,roll] to an (n, 4, 4) array
+    of transforms.
+    '''
+    return pose_to_H_batch(pose_from_xyzypr_batch(xyzypr))
 
 def xyzypr_to_H(xyzypr):
     '''
     Convert [x,y,z,yaw,pitch,roll] to 4x4 transform H
     '''
-    quat = quat_from_ypr(xyzypr[3:6])
-    pose = [xyzypr[0],xyzypr[1],xyzypr[2],quat[0],quat[1],quat[2],quat[3]]
-    H = pose_to_H(pose)
-    return H
+    return xyzypr_to_H_batch(numpy.asarray(xyzypr)[numpy.newaxis])[0]
+
+def quat_to_axisangle_batch(quat):
+   '''
+   Convert an (n, 4) array of quaternions to an (n, 3) array of axes and an
+   (n,) array of angles.
+   '''
+   quat = _as_batch(quat, 2)
+   a2 = numpy.arccos(quat[:,3])
+   angle = 2.0*a2
+   axis = quat[:,0:3] / numpy.sin(a2)[:,numpy.newaxis]
+   return (axis, angle)
 
 def quat_to_axisangle(quat):
-   a2 = numpy.arccos(quat[3]);
-   angle = 2.0*a2;
-   sina2inv = 1.0/numpy.sin(a2);
-   axis = numpy.zeros(3)
-   axis[0] = sina2inv * quat[0];
-   axis[1] = sina2inv * quat[1];
-   axis[2] = sina2inv * quat[2];
-   return (axis, angle)
+   axis, angle = quat_to_axisangle_batch(numpy.asarray(quat)[numpy.newaxis])
+   return (axis[0], angle[0])
+
 
 
+def transform_comparison_batch(H1, H2):
+    '''
+    Compare two (n, 4, 4) arrays of transforms H1 and H2.
+    Return (n,) arrays of the differences in position and rotation.
+    '''
+    T_difference = numpy.einsum('nij,njk->nik', invert_H_batch(H1),
+                                _as_batch(H2, 3))
+    quat_difference = R_to_quat_batch(T_difference[:,0:3,0:3]) #[x,y,z,w]
+    # 2*acos(qw)
+    rotation_difference = numpy.abs(2.0* numpy.arccos(quat_difference[:,3]))
+    position_difference = numpy.sqrt(numpy.einsum(
+        'ij,ij->i', T_difference[:,0:3,3], T_difference[:,0:3,3]))
+    return position_difference, rotation_difference
 
 def transform_comparison(H1, H2):
     '''
     Compare two 4x4 transforms H1 and H2. 
     Return the differnce in position and rotation.
     '''
-    T_difference = numpy.dot( invert_H(H1), H2 )
-    quat_difference = R_to_quat(T_difference[0:3,0:3]) #[x,y,z,w]
-    rotation_difference = numpy.abs(2.0* numpy.arccos(quat_difference[3])) # 2*acos(qw)
-    position_difference = numpy.sqrt( numpy.dot( numpy.array(T_difference[0:3,3]), numpy.array(T_difference[0:3,3]) ) )
-    return position_difference, rotation_difference
+    position_difference, rotation_difference = transform_comparison_batch(
+        numpy.asarray(H1)[numpy.newaxis], numpy.asarray(H2)[numpy.newaxis])
+    return position_difference[0], rotation_difference[0]
@@ -29,7 +29,9 @@
 # POSSIBILITY OF SUCH DAMAGE.
 
 from base import PerceptionModule, PerceptionMethod
+from scene import DetectedObject, SceneUpdate, SceneUpdater
 from apriltags import ApriltagsModule
 from simulated import SimulatedPerceptionModule
 from rock_module import RockModule
 from simtrack import SimtrackModule
+from meta import MetaModule, RunAll
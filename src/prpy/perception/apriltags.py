@@ -99,19 +99,27 @@ class ApriltagsModule(PerceptionModule):
             if reference_link is None:
                 reference_link = self.reference_link
 
-            # TODO: Creating detector is not instant...might want
-            #  to just do this once in the constructor
+            # Creating the detector is not instant, so it is created once
+            # for each environment and set of parameters.
             import kinbody_detector.kinbody_detector as kd
-            detector = kd.KinBodyDetector(env,
-                                          marker_data_path,
-                                          kinbody_path,
-                                          marker_topic,
-                                          detection_frame,
-                                          destination_frame,
-                                          reference_link)
+            import openravepy
+
+            key = (openravepy.RaveGetEnvironmentId(env), marker_topic,
+                   marker_data_path, kinbody_path, detection_frame,
+                   destination_frame, reference_link)
+            detector = self._GetHandle(
+                ('detector',) + key,
+                lambda: kd.KinBodyDetector(env,
+                                           marker_data_path,
+                                           kinbody_path,
+                                           marker_topic,
+                                           detection_frame,
+                                           destination_frame,
+                                           reference_link))
 
             logger.warn('Waiting to detect objects...')
-            return detector.Update()
+            return self._GetCachedDetections(('update',) + key,
+                                             detector.Update)
         except Exception, e:
             logger.error('Detecton failed update: %s' % str(e))
             raise
@@ -1,18 +1,20 @@
 #!/usr/bin/env python
 
 import functools
+import threading
+import time
 
 class PerceptionException(Exception):
     pass
 
 class PerceptionMethod(object):
-    
+
     def __init__(self, func):
         self.func = func
 
     def __call__(self, instance, robot, *args, **kw_args):
         return self.func(instance, robot, *args, **kw_args)
-            
+
     def __get__(self, instance, instancetype):
         # Bind the self reference and use update_wrapper to propagate the
         # function's metadata (e.g. name and docstring).
@@ -20,8 +22,28 @@ class PerceptionMethod(object):
         functools.update_wrapper(wrapper, self.func)
         wrapper.is_perception_method = True
         return wrapper
-        
+
 class PerceptionModule(object):
+
+    _transform_listener = None
+    _transform_listener_lock = threading.Lock()
+
+    def __init__(self, detection_cache_timeout=0., transform_timeout=1.0):
+        """
+        @param detection_cache_timeout Reuse detections that finished at most
+            this many seconds ago. Callers that request a detection while
+            the same detection is running always share its result.
+        @param transform_timeout Maximum time, in seconds, to wait for a TF
+            transform
+        """
+        self.detection_cache_timeout = detection_cache_timeout
+        self.transform_timeout = transform_timeout
+
+        self._handles = dict()
+        self._handles_lock = threading.Lock()
+        self._detections = dict()
+        self._detections_lock = threading.Lock()
+
     def has_perception_method(self, method_name):
         """
         Check if this module has the desired PerceptionMethod
@@ -42,3 +64,194 @@ class PerceptionModule(object):
         """
         return filter(lambda method_name: self.has_perception_method(method_name), dir(self))
 
+    @PerceptionMethod
+    def DetectObjectsAsync(self, robot, **kw_args):
+        """
+        Run DetectObjects in a background thread
+        @param robot The OpenRAVE robot
+        @return A prpy.futures.Future for the result of DetectObjects
+        """
+        from prpy.futures import defer
+        return defer(self.DetectObjects, args=(robot,), kwargs=kw_args)
+
+    def _CreateKinBody(self, env, detection):
+        """
+        Create the kinbody of a detection. Modules that implement
+        GetDetections, which returns DetectedObjects without modifying the
+        environment, override this so other code can apply their detections.
+        @param env The OpenRAVE environment
+        @param detection A prpy.perception.scene.DetectedObject
+        @return A kinbody that is not yet in the environment
+        """
+        raise NotImplementedError(
+            '{:s} does not create kinbodies.'.format(str(self)))
+
+    def _GetHandle(self, key, factory):
+        """
+        Get a persistent handle, e.g. a detector or service proxy, that is
+        created by factory() the first time it is requested
+        @param key A hashable key that identifies the handle
+        @param factory A function that creates the handle
+        @return The handle
+        """
+        with self._handles_lock:
+            if key not in self._handles:
+                self._handles[key] = factory()
+            return self._handles[key]
+
+    def _ResetHandle(self, key):
+        """
+        Discard a persistent handle, e.g. after its connection failed, so it
+        is created again the next time it is requested
+        @param key The key of the handle
+        """
+        with self._handles_lock:
+            self._handles.pop(key, None)
+
+    def _GetServiceProxy(self, service_name, service_class):
+        """
+        Get a persistent ROS service proxy
+        @param service_name The name of the ROS service
+        @param service_class The type of the ROS service
+        @return A rospy.ServiceProxy
+        """
+        import rospy
+
+        def CreateServiceProxy():
+            rospy.wait_for_service(service_name)
+            return rospy.ServiceProxy(service_name, service_class,
+                                      persistent=True)
+
+        return self._GetHandle(('service', service_name), CreateServiceProxy)
+
+    def _CallService(self, service_name, service_class, *args, **kw_args):
+        """
+        Call a ROS service through a persistent service proxy, reconnecting
+        once if the connection was lost
+        @param service_name The name of the ROS service
+        @param service_class The type of the ROS service
+        @return The response of the service
+        """
+        import rospy
+
+        proxy = self._GetServiceProxy(service_name, service_class)
+        try:
+            return proxy(*args, **kw_args)
+        except rospy.ServiceException:
+            proxy.close()
+            self._ResetHandle(('service', service_name))
+            proxy = self._GetServiceProxy(service_name, service_class)
+            return proxy(*args, **kw_args)
+
+    @staticmethod
+    def _GetTransformListener():
+        """
+        Get the TF listener that is shared by all perception modules
+        @return A tf.TransformListener
+        """
+        with PerceptionModule._transform_listener_lock:
+            if PerceptionModule._transform_listener is None:
+                import tf
+                PerceptionModule._transform_listener = tf.TransformListener()
+            return PerceptionModule._transform_listener
+
+    def _LookupTransform(self, target_frame, source_frame, timeout=None):
+        """
+        Look up the latest transform between two TF frames
+        @param target_frame The frame to transform into
+        @param source_frame The frame to transform from
+        @param timeout Maximum time to wait for the transform, in seconds;
+            defaults to transform_timeout
+        @return The 4x4 transformation matrix from source_frame to
+            target_frame
+        """
+        import numpy
+        import rospy
+        import tf.transformations as transformations
+
+        if timeout is None:
+            timeout = self.transform_timeout
+
+        listener = self._GetTransformListener()
+        listener.waitForTransform(target_frame, source_frame,
+                                  rospy.Time(0), rospy.Duration(timeout))
+        t, r = listener.lookupTransform(target_frame, source_frame,
+                                        rospy.Time(0))
+
+        transform = numpy.array(transformations.quaternion_matrix(r))
+        transform[0:3, 3] = t
+        return transform
+
+    def _GetSceneUpdater(self, env):
+        """
+        Get the persistent SceneUpdater that applies this module's detections
+        to an environment
+        @param env The OpenRAVE environment
+        @return A prpy.perception.scene.SceneUpdater
+        """
+        import openravepy
+        from prpy.perception.scene import SceneUpdater
+
+        return self._GetHandle(
+            ('scene', openravepy.RaveGetEnvironmentId(env)),
+            lambda: SceneUpdater(env))
+
+    def _GetCachedDetections(self, key, detect_fn):
+        """
+        Run a detection, sharing the result with other callers
+
+        Callers that request the same detection while it is running wait
+        for and share its result. Results are reused for
+        detection_cache_timeout seconds after the detection finished.
+
+        @param key A hashable key that identifies the detection, e.g. the
+            names of the queried objects
+        @param detect_fn A function that runs the detection and returns its
+            result, e.g. a list of (name, pose) tuples
+        @return The result of detect_fn
+        """
+        from prpy.futures import Future
+
+        with self._detections_lock:
+            entry = self._detections.get(key)
+
+            if entry is not None:
+                future, finish_time = entry
+                if not future.done():
+                    run = False
+                elif (finish_time is not None and future.exception() is None
+                        and time.time() - finish_time
+                        <= self.detection_cache_timeout):
+                    run = False
+                else:
+                    run = True
+            else:
+                run = True
+
+            if run:
+                future = Future()
+                self._detections[key] = (future, None)
+
+        if run:
+            try:
+                result = detect_fn()
+            except Exception as e:
+                with self._detections_lock:
+                    self._detections[key] = (future, None)
+                future.set_exception(e)
+                raise
+
+            with self._detections_lock:
+                self._detections[key] = (future, time.time())
+            future.set_result(result)
+
+        return future.result()
+
+    def ClearDetectionCache(self):
+        """
+        Discard all cached detections
+        """
+        with self._detections_lock:
+            self._detections = dict(
+                (key, entry) for key, entry in self._detections.iteritems()
+                if not entry[0].done())
@@ -2,11 +2,11 @@ import prpy,os,numpy,sys
 import tabletop_perception_tools.msg
 from tabletop_perception_tools.srv import *
 import rospy
-import tf
 import geometry_msgs.msg
 from tf.transformations import quaternion_matrix,euler_from_matrix,euler_matrix
 
 from base import PerceptionModule, PerceptionMethod
+from scene import DetectedObject
 
 import logging
 logger = logging.getLogger(__name__)
@@ -15,21 +15,22 @@ table_z_offset = -0.02
 
 class BlockDetector(PerceptionModule):
 
-    def __init__(self,point_cloud_topic,detection_frame,destination_frame):
+    def __init__(self,point_cloud_topic,detection_frame,destination_frame,
+                 **kw_args):
         """
         Initializes a Block Detector
 
         @param point_cloud_topic the name of the point-cloud to read from
         @param detection_frame the TF frame of the camera
         @param destination_frame the TF frame of block_in_world
+        @param kw_args forwarded to PerceptionModule, e.g. detection_cache_timeout
         """
 
-        super(PerceptionModule, self).__init__()
+        super(BlockDetector, self).__init__(**kw_args)
 
         self.point_cloud_topic = point_cloud_topic
         self.detection_frame = detection_frame
         self.destination_frame = destination_frame
-        self.listener = tf.TransformListener()
                 
     def __str__(self):
         return 'BlockDetector'
@@ -67,8 +68,6 @@ class BlockDetector(PerceptionModule):
         @return list of blocks found, if any
         """
 
-        logging.info("waiting for service...")
-        rospy.wait_for_service(service_name);
         logging.info("Calling service...")
         try:
             box_min_pt = geometry_msgs.msg.Point();
@@ -80,8 +79,7 @@ class BlockDetector(PerceptionModule):
             box_max_pt.y = box_max[1];
             box_max_pt.z = box_max[2];
 
-            service = rospy.ServiceProxy(service_name, FindBlocks);
-            response = service(cloud_topic, segment_planes, num_planes, plane_distance, segment_depth, min_depth, max_depth, cluster_tolerance, min_cluster_size, max_cluster_size, segment_box, box_min_pt, box_max_pt);
+            response = self._CallService(service_name, FindBlocks, cloud_topic, segment_planes, num_planes, plane_distance, segment_depth, min_depth, max_depth, cluster_tolerance, min_cluster_size, max_cluster_size, segment_box, box_min_pt, box_max_pt);
             return response.blocks;
         except rospy.ServiceException, e:
             logging.error("Service call failed: %s", str(e))
@@ -103,72 +101,98 @@ class BlockDetector(PerceptionModule):
             # Add all blocks
         
             env = robot.GetEnv()
+            detections = self.GetDetections(robot, table=table,
+                                            timeout=timeout)
 
-            # Get the pr-ordata package path
-            import prpy.util
-            block_path = os.path.join('objects', 'block.kinbody.xml')
-            
-            detected_blocks = self.find_blocks(cloud_topic=self.point_cloud_topic)
-        
-            # Place blocks on the table
+            # Reuse the blocks that are already on the table and only move
+            # the ones that moved
+            update = self._GetSceneUpdater(env).Update(
+                detections, lambda detection: self._CreateKinBody(env,
+                                                                  detection))
+            blocks.extend(update.bodies)
+
+        return blocks
+
+    @PerceptionMethod
+    def GetDetections(self, robot, table=None, timeout=10, **kw_args):
+        """
+        Detect blocks without modifying the environment
+
+        @param robot: The robot instance using the detector
+        @param table: The kinbody for the table on which the blocks are
+            placed; if None, the blocks are not snapped to a table
+        @param timeout: Maximum time, in seconds, to wait for the camera pose
+
+        @return A list of DetectedObjects whose data is the block's color
+        """
+        detected_blocks = self._GetCachedDetections(
+                ('find_blocks', self.point_cloud_topic),
+                lambda: self.find_blocks(cloud_topic=self.point_cloud_topic))
+
+        # Look up the camera pose once for all blocks
+        if detected_blocks:
+            frame_offset = self._LookupTransform(
+                    self.destination_frame,
+                    self.detection_frame,
+                    timeout)
+    
+        # Place blocks on the table
+        if table is not None:
             from prpy.util import ComputeEnabledAABB
             with prpy.rave.Disabled(table, padding_only=True):
                 table_aabb = ComputeEnabledAABB(table)
                 z = table_aabb.pos()[2] + table_aabb.extents()[2] + table_z_offset #OFFSET SET AT TOP
 
-            for b in detected_blocks:
-
-                block = env.ReadKinBodyXMLFile(block_path)
-
-                for link in block.GetLinks():
-                    for geometry in link.GetGeometries():
-                        geometry.SetDiffuseColor(numpy.array([b.avg_color.r,b.avg_color.g,b.avg_color.b,b.avg_color.a]))
-
-                block_pose = numpy.array(quaternion_matrix([
-                        b.pose.orientation.x,
-                        b.pose.orientation.y,
-                        b.pose.orientation.z,
-                        b.pose.orientation.w]))
-                block_pose[0,3] = b.pose.position.x
-                block_pose[1,3] = b.pose.position.y
-                block_pose[2,3] = b.pose.position.z
-
-                self.listener.waitForTransform(
-                        self.detection_frame,
-                        self.destination_frame,
-                        rospy.Time(0),
-                        rospy.Duration(timeout))
-
-                frame_trans, frame_rot = self.listener.lookupTransform(
-                        self.destination_frame,
-                        self.detection_frame,
-                        rospy.Time(0))
-
-                frame_offset = numpy.matrix(quaternion_matrix(frame_rot))
-                frame_offset[0,3] = frame_trans[0]
-                frame_offset[1,3] = frame_trans[1]
-                frame_offset[2,3] = frame_trans[2]
-
-                block_in_world = numpy.array(numpy.dot(frame_offset,block_pose))
-              
-                
-                #Snap block to table
-                
+        detections = []
+        for b in detected_blocks:
+
+            block_pose = numpy.array(quaternion_matrix([
+                    b.pose.orientation.x,
+                    b.pose.orientation.y,
+                    b.pose.orientation.z,
+                    b.pose.orientation.w]))
+            block_pose[0,3] = b.pose.position.x
+            block_pose[1,3] = b.pose.position.y
+            block_pose[2,3] = b.pose.position.z
+
+            block_in_world = numpy.array(numpy.dot(frame_offset,block_pose))
+          
+            
+            #Snap block to table
+            
+            if table is not None:
                 block_in_world[2,3] = z
 
-                #To snap blocks to upright on table
-                
-                block_matrix = block_in_world[0:3,0:3]
-                ax, ay, az = euler_from_matrix(block_matrix)
-                ax = 0
-                ay = 0
-                block_in_world_corrected = euler_matrix(ax,ay,az)
-                block_in_world[0:3,0:3] = block_in_world_corrected[0:3,0:3]
-                block.SetTransform(block_in_world)
-                
-                #Set block name 
-                block.SetName('block')
-                env.Add(block,anonymous=True)
-                blocks.append(block)
+            #To snap blocks to upright on table
+            
+            block_matrix = block_in_world[0:3,0:3]
+            ax, ay, az = euler_from_matrix(block_matrix)
+            ax = 0
+            ay = 0
+            block_in_world_corrected = euler_matrix(ax,ay,az)
+            block_in_world[0:3,0:3] = block_in_world_corrected[0:3,0:3]
 
-        return blocks
+            color = numpy.array([b.avg_color.r,b.avg_color.g,b.avg_color.b,b.avg_color.a])
+            detections.append(DetectedObject(None, 'block', block_in_world, color))
+
+        return detections
+
+    def _CreateKinBody(self, env, detection):
+        """
+        Load a block with the detected color
+
+        @param env: The OpenRAVE environment
+        @param detection: The DetectedObject of the block
+
+        @return A block that is not yet in the environment
+        """
+        block_path = os.path.join('objects', 'block.kinbody.xml')
+        block = env.ReadKinBodyXMLFile(block_path)
+
+        for link in block.GetLinks():
+            for geometry in link.GetGeometries():
+                geometry.SetDiffuseColor(detection.data)
+
+        #Set block name 
+        block.SetName('block')
+        return block
@@ -1,25 +1,291 @@
 #!/usr/bin/env python
 
-import functools
-        
-from base import PerceptionModule, PerceptionMethod
-
-class MetaModule(PerceptionModule)
-    def __init__(self, modules):
-        super(PerceptionModule, self).__init__()
-        self.modules = modules;
-    
+import logging
+import time
+
+from base import PerceptionModule, PerceptionMethod, PerceptionException
+
+logger = logging.getLogger(__name__)
+
+def PreferFirst(name, candidates):
+    """
+    Resolve a conflict by using the detection of the highest-priority module
+    @param name The name of the object that more than one module detected
+    @param candidates A list of (module, DetectedObject) tuples, ordered by
+        priority
+    @return The DetectedObject to apply
+    """
+    return candidates[0][1]
+
+class MetaModule(PerceptionModule):
+
+    def __init__(self, modules, timeout=None, resolve_conflict=None):
+        """
+        A perception module that runs other perception modules concurrently
+
+        Sub-modules that implement GetDetections, which returns
+        DetectedObjects without modifying the environment, are preferred:
+        their results are merged and applied to the environment once, so
+        they cannot change the environment after they miss the deadline.
+        The DetectObjects method of the other sub-modules is called instead;
+        these modules modify the environment themselves, even if they miss
+        the deadline.
+
+        @param modules The list of perception modules, ordered by priority
+            (highest first)
+        @param timeout Default deadline, in seconds, for a detection; modules
+            that have not finished by then are ignored. None to wait for all
+            modules.
+        @param resolve_conflict A function resolve_conflict(name, candidates)
+            that returns the DetectedObject to apply for an object that more
+            than one module detected, where candidates is a list of (module,
+            DetectedObject) tuples ordered by priority (default: PreferFirst)
+        """
+        super(MetaModule, self).__init__()
+        self.modules = modules
+        self.timeout = timeout
+
+        if resolve_conflict is None:
+            resolve_conflict = PreferFirst
+        self.resolve_conflict = resolve_conflict
+
+        for module in modules:
+            if not (module.has_perception_method('GetDetections')
+                    or module.has_perception_method('DetectObjects')):
+                logger.warning('Module %s implements neither GetDetections'
+                               ' nor DetectObjects and will not be used.',
+                               module)
+
     def __str__(self):
         return 'MetaModule'
-        
-class RunAll(MetaModule)
-    def __init__(self, modules):
-        super(MetaModule, self).__init__(modules)
-    
+
+    @staticmethod
+    def _DetectBodies(module, robot, **kw_args):
+        """
+        Call DetectObjects of a module that does not implement GetDetections
+        and describe the kinbodies it returns as DetectedObjects
+        @param module The perception module
+        @param robot The OpenRAVE robot
+        @param kw_args Forwarded to DetectObjects
+        @return A list of DetectedObjects whose data is the kinbody
+        """
+        from prpy.perception.scene import DetectedObject
+
+        bodies = module.DetectObjects(robot, **kw_args)
+        return [DetectedObject(body.GetName(), None, body.GetTransform(), body)
+                for body in bodies]
+
+    def _Dispatch(self, robot, timeout, **kw_args):
+        """
+        Call GetDetections, or DetectObjects if a module does not implement
+        it, of all modules, each in its own thread, and collect the results
+        until the deadline
+
+        Modules that are still running at the deadline keep running in the
+        background, but their results are dropped.
+
+        @param robot The OpenRAVE robot
+        @param timeout Deadline in seconds, relative to now; None to wait for
+            all modules
+        @param kw_args Forwarded to GetDetections or DetectObjects
+        @return A generator of (module, detections) tuples of the modules that
+            succeeded in time, in priority order
+        """
+        from prpy.futures import TimeoutError, defer
+
+        if timeout is not None:
+            deadline = time.time() + timeout
+
+        dispatched = []
+        for module in self.modules:
+            if module.has_perception_method('GetDetections'):
+                future = defer(module.GetDetections, args=(robot,),
+                               kwargs=kw_args)
+            elif module.has_perception_method('DetectObjects'):
+                future = defer(self._DetectBodies, args=(module, robot),
+                               kwargs=kw_args)
+            else:
+                continue
+            dispatched.append((module, future))
+
+        for module, future in dispatched:
+            if timeout is None:
+                remaining = None
+            else:
+                remaining = max(0., deadline - time.time())
+
+            try:
+                detections = future.result(timeout=remaining)
+            except TimeoutError:
+                logger.warning('Module %s did not finish in %.3f seconds.',
+                               module, timeout)
+                continue
+            except Exception as e:
+                logger.warning('Module %s failed: %s', module, str(e))
+                continue
+
+            yield module, detections
+
+    def _Apply(self, env, candidates):
+        """
+        Add or move the kinbodies of detections in a single update
+        @param env The OpenRAVE environment
+        @param candidates A list of (module, DetectedObject) tuples; the
+            module creates the kinbody if it is not in the environment
+        @return The list of kinbodies, in the order of candidates
+        """
+        # Modules without GetDetections already added their kinbodies, which
+        # only need to be moved if the conflict resolution changed the pose.
+        bodies = [None] * len(candidates)
+        detections, indices, sources = [], [], dict()
+        for i, (module, detection) in enumerate(candidates):
+            if module.has_perception_method('GetDetections'):
+                detections.append(detection)
+                indices.append(i)
+                sources[id(detection)] = module
+            else:
+                bodies[i] = detection.data
+
+        def CreateKinBody(detection):
+            return sources[id(detection)]._CreateKinBody(env, detection)
+
+        with env:
+            update = self._GetSceneUpdater(env).Update(detections,
+                                                       CreateKinBody)
+            for i, body in zip(indices, update.bodies):
+                bodies[i] = body
+
+            for body, (_, detection) in zip(bodies, candidates):
+                if body is detection.data:
+                    body.SetTransform(detection.pose)
+
+        return bodies
+
+class RunAll(MetaModule):
+
+    def __init__(self, modules, **kw_args):
+        """
+        Run all modules concurrently and merge their detections
+
+        @param modules The list of perception modules, ordered by priority
+            (highest first)
+        @param kw_args Forwarded to MetaModule
+        """
+        super(RunAll, self).__init__(modules, **kw_args)
+
     def __str__(self):
         return 'RunAll'
-    
+
     @PerceptionMethod
-    def DetectObjects(self, robot, **kw_args):
-        for module in modules:
-            module.DetectObjects(robot, kw_args);
+    def GetDetections(self, robot, timeout=None, **kw_args):
+        """
+        Detect objects with all modules concurrently, without modifying the
+        environment
+
+        Modules that do not finish within the timeout or fail are ignored.
+        If several modules detected the same object, resolve_conflict picks
+        the detection to use. Modules that do not implement GetDetections
+        still add their kinbodies to the environment.
+
+        @param robot The OpenRAVE robot
+        @param timeout Deadline in seconds (default: the module's timeout)
+        @param kw_args Forwarded to the GetDetections or DetectObjects method
+            of each module
+        @return A list of DetectedObjects
+        """
+        return [detection for _, detection
+                in self._Merge(robot, timeout, **kw_args)]
+
+    def _CreateKinBody(self, env, detection):
+        for module in self.modules:
+            try:
+                return module._CreateKinBody(env, detection)
+            except NotImplementedError:
+                continue
+
+        return super(RunAll, self)._CreateKinBody(env, detection)
+
+    def _Merge(self, robot, timeout, **kw_args):
+        """
+        Collect and merge the detections of all modules
+        @return A list of (module, DetectedObject) tuples, where module is
+            the module whose detection was picked, or the highest-priority
+            module that detected the object if resolve_conflict created a
+            new detection
+        """
+        if timeout is None:
+            timeout = self.timeout
+
+        # Group the named detections by name, in priority order. Objects
+        # without a name can not be matched between modules.
+        merged = []
+        candidates = dict()
+        for module, detections in self._Dispatch(robot, timeout, **kw_args):
+            for detection in detections:
+                if detection.name is None:
+                    merged.append([(module, detection)])
+                elif detection.name not in candidates:
+                    candidates[detection.name] = [(module, detection)]
+                    merged.append(candidates[detection.name])
+                else:
+                    candidates[detection.name].append((module, detection))
+
+        resolved = []
+        for group in merged:
+            if len(group) == 1:
+                resolved.append(group[0])
+            else:
+                detection = self.resolve_conflict(group[0][1].name, group)
+
+                # Apply the detection with the module that reported it, or
+                # the highest-priority module if it is a new detection.
+                module = group[0][0]
+                for candidate_module, candidate in group:
+                    if candidate is detection:
+                        module = candidate_module
+                        break
+                resolved.append((module, detection))
+
+        return resolved
+
+    @PerceptionMethod
+    def DetectObjects(self, robot, timeout=None, **kw_args):
+        """
+        Detect objects with all modules concurrently and apply the merged
+        detections to the environment
+
+        @param robot The OpenRAVE robot
+        @param timeout Deadline in seconds (default: the module's timeout)
+        @param kw_args Forwarded to the GetDetections or DetectObjects method
+            of each module
+        @return The list of kinbodies detected by the modules that finished
+        """
+        detections = self._Merge(robot, timeout, **kw_args)
+        return self._Apply(robot.GetEnv(), detections)
+
+    @PerceptionMethod
+    def DetectObject(self, robot, obj_name, timeout=None, **kw_args):
+        """
+        Detect a single object with all modules concurrently
+        @param robot The OpenRAVE robot
+        @param obj_name The name of the object to detect
+        @param timeout Deadline in seconds (default: the module's timeout)
+        @param kw_args Forwarded to the GetDetections or DetectObjects method
+            of each module
+        @return The kinbody detected by the highest-priority module that
+            detected it in time
+        @throws PerceptionException if no module detected the object
+        """
+        if timeout is None:
+            timeout = self.timeout
+
+        # Results are returned in priority order, so the first one wins and
+        # the lower-priority modules are not waited for.
+        for module, detections in self._Dispatch(robot, timeout, **kw_args):
+            for detection in detections:
+                if detection.name == obj_name:
+                    return self._Apply(robot.GetEnv(),
+                                       [(module, detection)])[0]
+
+        raise PerceptionException(
+            'Failed to detect object {:s}'.format(obj_name))
@@ -0,0 +1,177 @@
+import collections
+import logging
+import numpy
+
+logger = logging.getLogger(__name__)
+
+
+class DetectedObject(collections.namedtuple(
+        'DetectedObject', ['name', 'kinbody_type', 'pose', 'data'])):
+    """
+    An object reported by a perception module
+
+    @param name Name of the KinBody, or None for objects without an identity
+        (e.g. blocks), which are matched to bodies of the same type by pose
+    @param kinbody_type Type of the object, e.g. the name of its KinBody XML
+        file; bodies are only reused for objects of the same type
+    @param pose 4x4 pose of the object in the world frame
+    @param data Optional detector-specific data, e.g. the object's color
+    """
+    __slots__ = ()
+
+    def __new__(cls, name, kinbody_type, pose, data=None):
+        return super(DetectedObject, cls).__new__(
+            cls, name, kinbody_type, pose, data)
+
+
+SceneUpdate = collections.namedtuple(
+    'SceneUpdate', ['bodies', 'added', 'moved', 'removed'])
+
+
+class SceneUpdater(object):
+    """
+    Applies detections to an environment incrementally
+
+    Detections are diffed against the bodies that are already in the
+    environment: bodies are matched by name, or by type and position for
+    detections without a name, and reused. Only bodies that moved by more
+    than the tolerances are moved and only unmatched detections create new
+    bodies, so repeated detections of a static scene do not modify the
+    environment. All modifications are made while holding the environment
+    lock once.
+
+    Bodies that are in the environment before they are first detected by name
+    are adopted. Anonymous detections only match bodies this updater created.
+    """
+    def __init__(self, env, position_tolerance=0.005, angle_tolerance=0.02,
+                 match_distance=0.05):
+        """
+        @param env The OpenRAVE environment to update
+        @param position_tolerance Bodies that moved less than this distance,
+            in meters, and rotated less than angle_tolerance are not moved
+        @param angle_tolerance Rotation tolerance, in radians
+        @param match_distance Maximum distance, in meters, between an
+            anonymous detection and the body it is matched to
+        """
+        self.env = env
+        self.position_tolerance = position_tolerance
+        self.angle_tolerance = angle_tolerance
+        self.match_distance = match_distance
+
+        # Map from the name of each body this updater manages to its type.
+        self._types = dict()
+
+    def Update(self, detections, factory, remove_missing=False):
+        """
+        Update the environment to match a list of detections
+
+        @param detections A list of DetectedObjects
+        @param factory A function that creates a KinBody, which is not yet in
+            the environment, for a DetectedObject that matches no body
+        @param remove_missing Remove the bodies managed by this updater that
+            were not detected
+        @return A SceneUpdate whose bodies are the bodies of the detections,
+            in order, and whose added, moved and removed lists contain the
+            bodies that were added, moved and removed
+        """
+        added, moved, removed = [], [], []
+
+        with self.env:
+            # Forget bodies that were removed from the environment.
+            for name in list(self._types):
+                if self.env.GetKinBody(name) is None:
+                    del self._types[name]
+
+            bodies = self._Match(detections, removed)
+
+            for i, detection in enumerate(detections):
+                body = bodies[i]
+
+                if body is None:
+                    body = factory(detection)
+                    if detection.name is not None:
+                        body.SetName(detection.name)
+                    body.SetTransform(detection.pose)
+                    self.env.Add(body, anonymous=detection.name is None)
+
+                    self._types[body.GetName()] = detection.kinbody_type
+                    bodies[i] = body
+                    added.append(body)
+                elif self._HasMoved(body.GetTransform(), detection.pose):
+                    body.SetTransform(detection.pose)
+                    moved.append(body)
+
+            if remove_missing:
+                detected = set(body.GetName() for body in bodies)
+                for name in list(self._types):
+                    if name not in detected:
+                        body = self.env.GetKinBody(name)
+                        del self._types[name]
+                        self.env.Remove(body)
+                        removed.append(body)
+
+        logger.debug('Added %d, moved %d and removed %d of %d bodies.',
+                     len(added), len(moved), len(removed), len(bodies))
+        return SceneUpdate(bodies, added, moved, removed)
+
+    def _Match(self, detections, removed):
+        bodies = [None] * len(detections)
+        claimed = set()
+
+        for i, detection in enumerate(detections):
+            if detection.name is None or detection.name in claimed:
+                continue
+
+            body = self.env.GetKinBody(detection.name)
+            if body is None:
+                continue
+
+            kinbody_type = self._types.get(detection.name)
+            if kinbody_type is None or kinbody_type == detection.kinbody_type:
+                self._types[detection.name] = detection.kinbody_type
+                bodies[i] = body
+                claimed.add(detection.name)
+            else:
+                # The name is reused for a different type of object.
+                del self._types[detection.name]
+                self.env.Remove(body)
+                removed.append(body)
+
+        # Greedily match anonymous detections to the closest unclaimed body
+        # of the same type.
+        candidates = []
+        for name, kinbody_type in self._types.iteritems():
+            if name not in claimed:
+                position = self.env.GetKinBody(name).GetTransform()[0:3, 3]
+                candidates.append((name, kinbody_type, position))
+
+        pairs = []
+        for i, detection in enumerate(detections):
+            if detection.name is not None:
+                continue
+
+            for name, kinbody_type, position in candidates:
+                if kinbody_type != detection.kinbody_type:
+                    continue
+
+                distance = numpy.linalg.norm(
+                    position - numpy.asarray(detection.pose)[0:3, 3])
+                if distance <= self.match_distance:
+                    pairs.append((distance, i, name))
+
+        for _, i, name in sorted(pairs):
+            if bodies[i] is None and name not in claimed:
+                bodies[i] = self.env.GetKinBody(name)
+                claimed.add(name)
+
+        return bodies
+
+    def _HasMoved(self, T_current, T_detected):
+        T_detected = numpy.asarray(T_detected)
+        distance = numpy.linalg.norm(T_current[0:3, 3] - T_detected[0:3, 3])
+
+        R = numpy.dot(T_current[0:3, 0:3].T, T_detected[0:3, 0:3])
+        angle = numpy.arccos(numpy.clip((numpy.trace(R) - 1.) / 2., -1., 1.))
+
+        return (distance > self.position_tolerance
+                or angle > self.angle_tolerance)
@@ -3,12 +3,13 @@ import numpy
 import os.path
 
 from base import PerceptionModule, PerceptionMethod
+from scene import DetectedObject
 
 
 class SimtrackModule(PerceptionModule):
 
     def __init__(self, kinbody_path, detection_frame, world_frame,
-                 service_namespace=None):
+                 service_namespace=None, **kw_args):
         """
         This initializes a simtrack detector.
         
@@ -16,21 +17,17 @@ class SimtrackModule(PerceptionModule):
         @param detection_frame The TF frame of the camera
         @param world_frame The desired world TF frame
         @param service_namespace The namespace for the simtrack service (default: /simtrack)
+        @param kw_args Forwarded to PerceptionModule, e.g. detection_cache_timeout
         """
         import rospy
-        import tf
-        import tf.transformations as transformations
+
+        super(SimtrackModule, self).__init__(**kw_args)
+
         # Initialize a new ros node if one has not already been created
         try:
             rospy.init_node('simtrack_detector', anonymous=True)
         except rospy.exceptions.ROSException:
             pass
-            
-        #For getting transforms in world frame
-        if detection_frame is not None and world_frame is not None:
-            self.listener = tf.TransformListener()
-        else:
-            self.listener = None
                 
         if service_namespace is None:
             service_namespace='/simtrack'
@@ -65,54 +62,42 @@ class SimtrackModule(PerceptionModule):
         
 	return pose
 
-    def _LocalToWorld(self,pose):
+    def _GetDetections(self, obj_names):
         """
-        Transform a pose from local frame to world frame
-        @param pose The 4x4 transformation matrix containing the pose to transform
-        @return The 4x4 transformation matrix describing the pose in world frame
+        Calls the service to get detections of a list of objects. Callers
+        that query the same objects concurrently share one service call.
+        @param obj_names The names of the objects to detect; an empty list
+        detects all objects
+        @return A list of (name, pose) tuples, where pose is a 4x4
+        transformation matrix describing the pose of the object in world frame
         """
-        import rospy
-        #Get pose w.r.t world frame
-        self.listener.waitForTransform(self.world_frame,self.detection_frame,
-                                       rospy.Time(),rospy.Duration(10))
-        t, r = self.listener.lookupTransform(self.world_frame,self.detection_frame,
-                                             rospy.Time(0))
-        
-        #Get relative transform between frames
-        offset_to_world = numpy.matrix(transformations.quaternion_matrix(r))
-        offset_to_world[0,3] = t[0]
-        offset_to_world[1,3] = t[1]
-        offset_to_world[2,3] = t[2]
-        
-        #Compose with pose to get pose in world frame
-        result = numpy.array(numpy.dot(offset_to_world, pose))
-        
-        return result
-        
+        return self._GetCachedDetections(
+            ('detect_objects', tuple(obj_names)),
+            lambda: self._CallDetectObjects(obj_names))
 
-    def _GetDetections(self, obj_names):
+    def _CallDetectObjects(self, obj_names):
         import simtrack_msgs.srv
-        """
-        Calls the service to get a detection of a particular object.
-        @param obj_name The name of the object to detect
-        @return A 4x4 transformation matrix describing the pose of the object
-        in world frame, None if the object is not detected
-        """
-        #Call detection service for a particular object
-        detect_simtrack = rospy.ServiceProxy(self.service_namespace+'/detect_objects',
-                                         simtrack_msgs.srv.DetectObjects)
-        
-        detect_resp = detect_simtrack(obj_names, 5.0)
 
-        
+        #Call detection service through a persistent proxy
+        detect_resp = self._CallService(
+            self.service_namespace + '/detect_objects',
+            simtrack_msgs.srv.DetectObjects, obj_names, 5.0)
+
+        #Look up the camera pose once for all detections
+        if (self.detection_frame is not None and self.world_frame is not None):
+            offset_to_world = self._LookupTransform(self.world_frame,
+                                                    self.detection_frame)
+        else:
+            offset_to_world = None
+
         detections = []
 
         for i in xrange(0, len(detect_resp.detected_models)) :
             obj_name = detect_resp.detected_models[i];
             obj_pose = detect_resp.detected_poses[i];
             obj_pose_tf = self._MsgToPose(obj_pose);
-            if (self.detection_frame is not None and self.world_frame is not None):
-                obj_pose_tf = self._LocalToWorld(obj_pose_tf)
+            if offset_to_world is not None:
+                obj_pose_tf = numpy.dot(offset_to_world, obj_pose_tf)
             detections.append((obj_name, obj_pose_tf));
 
         return detections
@@ -133,14 +118,14 @@ class SimtrackModule(PerceptionModule):
             raise PerceptionException('The simtrack module cannot detect object %s', obj_name)
 
         query_name = self.kinbody_to_query_map[obj_name]
-        obj_poses = self._GetDetections(query_name)
-        if len(obj_poses is 0):
+        obj_poses = self._GetDetections([query_name])
+        if len(obj_poses) == 0:
             raise PerceptionException('Failed to detect object %s', obj_name)
         
         obj_pose = None
 
         for (name, pose) in obj_poses:
-            if (name is query_name):
+            if (name == query_name):
                 obj_pose = pose
                 break;
 
@@ -148,43 +133,60 @@ class SimtrackModule(PerceptionModule):
             raise PerceptionException('Failed to detect object %s', obj_name)  
 
         env = robot.GetEnv()
-        if env.GetKinBody(obj_name) is None:
-            from prpy.rave import add_object
-            kinbody_file = '%s.kinbody.xml' % obj_name
-            new_body = add_object(
-                env,
-                obj_name,
-                os.path.join(self.kinbody_path, kinbody_file))
-            
-        body = env.GetKinBody(obj_name)
-        body.SetTransform(obj_pose)
-        return body
+        update = self._GetSceneUpdater(env).Update(
+            [DetectedObject(obj_name, obj_name, obj_pose)],
+            lambda detection: self._CreateKinBody(env, detection))
+        return update.bodies[0]
 
     @PerceptionMethod 
     def DetectObjects(self, robot, **kw_args):
         """
         Overriden method for detection_frame
+        @return The list of kinbodies of the detected objects
         """
-        from prpy.perception.base import PerceptionException
         env = robot.GetEnv()
+        objects = self.GetDetections(robot, **kw_args)
+
+        # Reuse the kinbodies that are already in the environment and only
+        # move the ones that moved
+        update = self._GetSceneUpdater(env).Update(
+            objects, lambda detection: self._CreateKinBody(env, detection))
+        return update.bodies
+
+    @PerceptionMethod
+    def GetDetections(self, robot, **kw_args):
+        """
+        Detect all objects without modifying the environment
+        @return A list of DetectedObjects
+        """
         # Detecting empty list will detect all possible objects
         detections = self._GetDetections([])
 
+        objects = []
         for (obj_name, obj_pose) in detections:
             if (obj_name not in self.query_to_kinbody_map):
                 continue
 
             kinbody_name = self.query_to_kinbody_map[obj_name]
+            objects.append(DetectedObject(kinbody_name, kinbody_name, obj_pose))
+
+        return objects
+
+    def _CreateKinBody(self, env, detection):
+        """
+        Load the kinbody of a detected object
+        @param env The OpenRAVE environment
+        @param detection The DetectedObject
+        @return A kinbody that is not yet in the environment
+        """
+        from prpy.perception.base import PerceptionException
 
-            if env.GetKinBody(kinbody_name) is None:
-                from prpy.rave import add_object
-                kinbody_file = '%s.kinbody.xml' % kinbody_name
-                new_body = add_object(
-                    env,
-                    kinbody_name,
-                    os.path.join(self.kinbody_path, kinbody_file))
-            print kinbody_name
-            body = env.GetKinBody(kinbody_name)
-            body.SetTransform(obj_pose)
+        kinbody_file = '%s.kinbody.xml' % detection.kinbody_type
+        body = env.ReadKinBodyXMLFile(
+            os.path.join(self.kinbody_path, kinbody_file))
+        if body is None:
+            raise PerceptionException(
+                'Could not load object from %s' % kinbody_file)
+        return body
 
 
@@ -2,18 +2,18 @@ import rospy
 import vncc_msgs.srv
 import vncc_msgs.msg
 import math
-import tf
 import tf.transformations as transformations
 import numpy
 import os.path
 
 from base import PerceptionModule, PerceptionMethod
+from scene import DetectedObject
 
 
 class VnccModule(PerceptionModule):
 
     def __init__(self, kinbody_path, detection_frame, world_frame,
-                 service_namespace=None):
+                 service_namespace=None, **kw_args):
         """
         This initializes a VNCC detector.
         
@@ -21,19 +21,15 @@ class VnccModule(PerceptionModule):
         @param detection_frame The TF frame of the camera
         @param world_frame The desired world TF frame
         @param service_namespace The namespace for the VNCC service (default: /vncc)
+        @param kw_args Forwarded to PerceptionModule, e.g. detection_cache_timeout
         """
+        super(VnccModule, self).__init__(**kw_args)
 
         # Initialize a new ros node if one has not already been created
         try:
             rospy.init_node('vncc_detector', anonymous=True)
         except rospy.exceptions.ROSException:
             pass
-            
-        #For getting transforms in world frame
-        if detection_frame is not None and world_frame is not None:
-            self.listener = tf.TransformListener()
-        else:
-            self.listener = None
                 
         if service_namespace is None:
             service_namespace='/vncc'
@@ -71,17 +67,9 @@ class VnccModule(PerceptionModule):
         @param pose The 4x4 transformation matrix containing the pose to transform
         @return The 4x4 transformation matrix describing the pose in world frame
         """
-        #Get pose w.r.t world frame
-        self.listener.waitForTransform(self.world_frame,self.detection_frame,
-                                       rospy.Time(),rospy.Duration(10))
-        t, r = self.listener.lookupTransform(self.world_frame,self.detection_frame,
-                                             rospy.Time(0))
-        
-        #Get relative transform between frames
-        offset_to_world = numpy.matrix(transformations.quaternion_matrix(r))
-        offset_to_world[0,3] = t[0]
-        offset_to_world[1,3] = t[1]
-        offset_to_world[2,3] = t[2]
+        #Get relative transform between frames from the shared listener
+        offset_to_world = self._LookupTransform(self.world_frame,
+                                                self.detection_frame)
         
         #Compose with pose to get pose in world frame
         result = numpy.array(numpy.dot(offset_to_world, pose))
@@ -96,11 +84,15 @@ class VnccModule(PerceptionModule):
         @return A 4x4 transformation matrix describing the pose of the object
         in world frame, None if the object is not detected
         """
+        return self._GetCachedDetections(
+            ('get_vncc_detections', obj_name),
+            lambda: self._CallGetDetections(obj_name))
+
+    def _CallGetDetections(self, obj_name):
         #Call detection service for a particular object
-        detect_vncc = rospy.ServiceProxy(self.service_namespace+'/get_vncc_detections',
-                                         vncc_msgs.srv.GetDetections)
-        
-        detect_resp = detect_vncc(object_name=obj_name)
+        detect_resp = self._CallService(
+            self.service_namespace + '/get_vncc_detections',
+            vncc_msgs.srv.GetDetections, object_name=obj_name)
         
         if detect_resp.ok == False:
             return None
@@ -135,14 +127,39 @@ class VnccModule(PerceptionModule):
                 'Failed to detect object {:s}'.format(obj_name))
             
         env = robot.GetEnv()
-        if env.GetKinBody(obj_name) is None:
-            from prpy.rave import add_object
-            kinbody_file = '{:s}.kinbody.xml'.format(obj_name)
-            new_body = add_object(
-                env,
-                obj_name,
-                os.path.join(self.kinbody_path, kinbody_file))
-            
-        body = env.GetKinBody(obj_name)
-        body.SetTransform(obj_pose)
+        update = self._GetSceneUpdater(env).Update(
+            [DetectedObject(obj_name, obj_name, obj_pose)],
+            lambda detection: self._CreateKinBody(env, detection))
+        return update.bodies[0]
+
+    @PerceptionMethod
+    def GetDetections(self, robot, **kw_args):
+        """
+        Detect all known objects without modifying the environment
+        @param robot The OpenRAVE robot
+        @return A list of DetectedObjects
+        """
+        objects = []
+        for obj_name, query_name in self.kinbody_to_query_map.iteritems():
+            obj_pose = self._GetDetection(query_name)
+            if obj_pose is not None:
+                objects.append(DetectedObject(obj_name, obj_name, obj_pose))
+
+        return objects
+
+    def _CreateKinBody(self, env, detection):
+        """
+        Load the kinbody of a detected object
+        @param env The OpenRAVE environment
+        @param detection The DetectedObject
+        @return A kinbody that is not yet in the environment
+        """
+        from prpy.perception.base import PerceptionException
+
+        kinbody_file = '{:s}.kinbody.xml'.format(detection.kinbody_type)
+        body = env.ReadKinBodyXMLFile(
+            os.path.join(self.kinbody_path, kinbody_file))
+        if body is None:
+            raise PerceptionException(
+                'Could not load object from {:s}'.format(kinbody_file))
         return body
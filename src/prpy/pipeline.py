@@ -0,0 +1,200 @@
+import collections
+import logging
+import openravepy
+import threading
+from .clone import Clone
+from .exceptions import TrajectoryNotExecutable
+from .futures import Future, defer
+from .planning.base import Tags
+from .util import (CopyTrajectory, HasAffineDOFs, IsAtTrajectoryEnd,
+                   SetTrajectoryTags, Timer)
+
+logger = logging.getLogger(__name__)
+
+
+class MotionPipeline(object):
+    """
+    Plans, post-processes and executes a queue of motions back-to-back.
+
+    Each queued request names a planning method of the robot. While one
+    trajectory is executing, the next request is planned and post-processed
+    from the configuration at the end of that trajectory, in a clone of the
+    environment, so the robot does not idle between motions.
+
+    If a motion fails to plan or execute, or the robot does not reach the end
+    of the executed trajectory, all queued work is aborted: the futures of
+    the remaining requests are cancelled and the error is raised from Run().
+    """
+
+    _plan_envs = collections.defaultdict(openravepy.Environment)
+    """
+    Mapping from robot environments to planning environments, shared by all
+    pipelines of robots in that environment.
+    """
+
+    def __init__(self, robot, **kwargs):
+        """
+        @param robot prpy Robot that executes the motions
+        @param **kwargs forwarded to PostProcessPath and ExecuteTrajectory
+        """
+        self.robot = robot
+        self.kwargs = kwargs
+
+        self._requests = collections.deque()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._requests)
+
+    def Enqueue(self, method_name, *args, **kw_args):
+        """
+        Queue a planning request. This may be called from any thread, also
+        while Run() is executing the queue.
+
+        @param method_name name of a planning method of the robot, e.g.
+                           'PlanToConfiguration'
+        @param *args positional arguments of the planning method
+        @param **kw_args keyword arguments of the planning method
+        @return future that is set to the executed trajectory
+        """
+        future = Future()
+        with self._lock:
+            self._requests.append((method_name, args, kw_args, future))
+        return future
+
+    def Clear(self):
+        """
+        Cancel all queued requests.
+        """
+        with self._lock:
+            requests = list(self._requests)
+            self._requests.clear()
+
+        for _, _, _, future in requests:
+            future.set_cancelled()
+
+    def Run(self):
+        """
+        Plan, post-process and execute the queued requests until the queue is
+        empty. The timing tags that _PlanWrapper and ExecutePath add to their
+        trajectories are added to the executed trajectories.
+
+        @return list of the executed trajectories
+        """
+        executed = []
+        request = self._Pop()
+        if request is None:
+            return executed
+
+        pending = defer(self._Prepare, args=(request, None))
+
+        while request is not None:
+            future = request[3]
+
+            try:
+                traj = pending.result()
+            except Exception as e:
+                future.set_exception(e)
+                self.Clear()
+                raise
+
+            # Plan the next motion while this one is executing.
+            next_request = self._Pop()
+            if next_request is not None:
+                pending = defer(self._Prepare, args=(next_request, traj))
+
+            try:
+                with Timer() as timer:
+                    exec_traj = self.robot.ExecuteTrajectory(
+                        traj, **self.kwargs)
+                SetTrajectoryTags(
+                    exec_traj, {Tags.EXECUTION_TIME: timer.get_duration()},
+                    append=True)
+
+                # The next motion was planned from the end of this trajectory.
+                if next_request is not None:
+                    with self.robot.GetEnv():
+                        diverged = not IsAtTrajectoryEnd(self.robot, traj)
+
+                    if diverged:
+                        raise TrajectoryNotExecutable(
+                            'Robot did not reach the end of the executed'
+                            ' trajectory.')
+            except Exception as e:
+                future.set_exception(e)
+                self._Abort(next_request, pending)
+                raise
+
+            future.set_result(exec_traj)
+            executed.append(exec_traj)
+
+            # A request that was enqueued while the last motion was executing
+            # is planned from the current state.
+            if next_request is None:
+                next_request = self._Pop()
+                if next_request is not None:
+                    pending = defer(self._Prepare, args=(next_request, None))
+
+            request = next_request
+
+        return executed
+
+    def _Pop(self):
+        with self._lock:
+            return self._requests.popleft() if self._requests else None
+
+    def _Abort(self, request, pending):
+        logger.warning('Aborting the queued motions.')
+
+        if request is not None:
+            request[3].set_cancelled()
+        self.Clear()
+
+        # Wait for the motion that is being planned, since it uses the
+        # planning environment.
+        if request is not None:
+            pending.exception()
+
+    def _Prepare(self, request, start_traj):
+        method_name, args, kw_args, _ = request
+        kw_args = dict(kw_args)
+        kw_args['execute'] = False
+
+        # Reuse the planning environment of the robot's environment instead
+        # of creating one per pipeline. Clone locks it while we plan.
+        env = self.robot.GetEnv()
+        plan_env = MotionPipeline._plan_envs[
+            openravepy.RaveGetEnvironmentId(env)]
+
+        with Clone(env, clone_env=plan_env) as cloned_env:
+            cloned_robot = cloned_env.Cloned(self.robot)
+            cloned_robot.SetActiveDOFs(self.robot.GetActiveDOFIndices(),
+                                       self.robot.GetAffineDOF())
+
+            if start_traj is not None:
+                _SetTrajectoryEnd(cloned_robot, start_traj)
+
+            path = getattr(cloned_robot, method_name)(*args, **kw_args)
+
+            with Timer() as timer:
+                traj = cloned_robot.PostProcessPath(path, **self.kwargs)
+            SetTrajectoryTags(
+                traj, {Tags.POSTPROCESS_TIME: timer.get_duration()},
+                append=True)
+
+            return CopyTrajectory(traj, env=env)
+
+
+def _SetTrajectoryEnd(robot, traj):
+    cspec = traj.GetConfigurationSpecification()
+    waypoint = traj.GetWaypoint(traj.GetNumWaypoints() - 1)
+
+    if HasAffineDOFs(cspec):
+        robot.SetTransform(cspec.ExtractTransform(
+            robot.GetTransform(), waypoint, robot))
+    else:
+        dof_indices, _ = cspec.ExtractUsedIndices(robot)
+        robot.SetDOFValues(
+            cspec.ExtractJointValues(waypoint, robot, dof_indices),
+            dof_indices)
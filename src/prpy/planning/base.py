@@ -33,6 +33,7 @@ import functools
 import logging
 import numpy
 import openravepy
+import threading
 from ..clone import Clone, CloneException
 from ..futures import defer
 from ..util import CopyTrajectory, GetTrajectoryTags, SetTrajectoryTags
@@ -83,6 +84,18 @@ class Tags(object):
     The amount of time that was spent actually running a trajectory.
     """
 
+    POSTPROCESS_PIPELINE = 'postprocess_pipeline'
+    """
+    The name of the speculative post-processing pipeline that produced a
+    trajectory.
+    """
+
+    POSTPROCESS_PIPELINE_TIMES = 'postprocess_pipeline_times'
+    """
+    The amount of time that was spent in each speculative post-processing
+    pipeline, keyed by the name of the pipeline.
+    """
+
 
 class LockedPlanningMethod(object):
     """
@@ -152,6 +165,11 @@ class ClonedPlanningMethod(LockedPlanningMethod):
                         str(joint_values[0]), str(joint_values[1]))
                     cloned_robot.SetActiveDOFValues(joint_values[0])
 
+                # Discard memoized collision checks if the scene changed.
+                collision_cache = getattr(instance, 'collision_cache', None)
+                if collision_cache is not None:
+                    collision_cache.Update(cloned_env, cloned_robot)
+
                 traj = super(ClonedPlanningMethod, self).__call__(
                     instance, cloned_robot, *args, **kw_args)
                 return CopyTrajectory(traj, env=env)
@@ -186,6 +204,173 @@ class BasePlanner(Planner):
         super(BasePlanner, self).__init__()
         self.env = openravepy.Environment()
 
+        # Optional prpy.planning.collision.CollisionCache shared with other
+        # planners. This is only used by planners that check collisions in
+        # Python, e.g. SnapPlanner and VectorFieldPlanner.
+        self.collision_cache = None
+
+
+def CopyPlanner(planner):
+    """
+    Create a copy of a planner that has its own planning environment.
+
+    ClonedPlanningMethods clone into, and lock, their planner's environment
+    for the whole call, so calls on the same planner run one at a time. A
+    copy can plan concurrently with the original. The copy shares all other
+    attributes with the original (e.g. its options and collision cache),
+    except for the OpenRAVE planners it holds, which are re-created in the
+    new environment.
+
+    @param planner a BasePlanner
+    @return copy of the planner
+    """
+    import copy
+
+    planner_copy = copy.copy(planner)
+    planner_copy.env = openravepy.Environment()
+
+    for name, value in vars(planner).iteritems():
+        if isinstance(value, openravepy.Planner):
+            rave_planner = openravepy.RaveCreatePlanner(
+                planner_copy.env, value.GetXMLId())
+            if rave_planner is None:
+                raise UnsupportedPlanningError(
+                    'Unable to create "{:s}" planner.'.format(
+                        value.GetXMLId()))
+
+            setattr(planner_copy, name, rave_planner)
+
+    return planner_copy
+
+
+class PlannerPool(object):
+    """
+    Pool of delegate planners used to run planning attempts concurrently.
+
+    Each planner in the pool is paired with a dedicated environment. Before
+    an attempt is dispatched, the calling environment is cloned into the
+    planner's environment, so the attempts do not contend for the caller's
+    environment lock. A planner is only reused once its previous attempt has
+    finished, even if the result of that attempt was discarded.
+
+    @param planners list of planners; one attempt runs on each at a time
+    """
+    def __init__(self, planners):
+        if not planners:
+            raise ValueError('PlannerPool requires at least one planner.')
+
+        self.planners = list(planners)
+        self._envs = [openravepy.Environment() for _ in self.planners]
+        self._free = range(len(self.planners))
+        self._condition = threading.Condition()
+
+    def __len__(self):
+        return len(self.planners)
+
+    def _Acquire(self, blocking=True):
+        with self._condition:
+            while blocking and not self._free:
+                self._condition.wait()
+
+            return self._free.pop(0) if self._free else None
+
+    def _Release(self, slot):
+        with self._condition:
+            self._free.append(slot)
+            self._condition.notify_all()
+
+    def PlanRanked(self, robot, attempts):
+        """
+        Run ranked planning attempts concurrently and return the best one.
+
+        Attempts are dispatched in rank order, one per free planner. The
+        result of an attempt is returned as soon as it succeeds and every
+        better-ranked attempt has failed. No further attempts are started
+        after that; attempts that are still running finish in the background
+        and their results are discarded.
+
+        @param robot robot to plan for; its environment is cloned once per
+                     planner and should be locked by the caller
+        @param attempts list of functions, in rank order, that are called
+                        with a planner and a cloned robot and return a
+                        trajectory or raise a PlanningError
+        @return (index, traj, errors) the index and result of the returned
+                attempt, or (None, None, errors) if every attempt failed;
+                errors maps attempt index to PlanningError
+        """
+        num_attempts = len(attempts)
+        results = [None] * num_attempts
+        state = {'next': 0, 'cancelled': False}
+        condition = threading.Condition()
+
+        def worker(slot, cloned_robot):
+            planner = self.planners[slot]
+
+            try:
+                while True:
+                    with condition:
+                        if state['cancelled'] or state['next'] >= num_attempts:
+                            return
+
+                        index = state['next']
+                        state['next'] += 1
+
+                    try:
+                        traj = attempts[index](planner, cloned_robot)
+                        outcome = (True, traj)
+                    except Exception as e:
+                        outcome = (False, e)
+
+                    with condition:
+                        results[index] = outcome
+                        condition.notify_all()
+            finally:
+                self._Release(slot)
+
+        # Block for the first planner, then take any others that are free.
+        slots = [self._Acquire(blocking=True)]
+        while len(slots) < num_attempts:
+            slot = self._Acquire(blocking=False)
+            if slot is None:
+                break
+            slots.append(slot)
+
+        env = robot.GetEnv()
+        for slot in slots:
+            clone = Clone(env, clone_env=self._envs[slot], lock=False)
+            with clone as cloned_env:
+                cloned_robot = cloned_env.Cloned(robot)
+                cloned_robot.SetActiveDOFs(robot.GetActiveDOFIndices())
+                cloned_robot.SetActiveDOFValues(robot.GetActiveDOFValues())
+
+            thread = threading.Thread(target=worker, args=(slot, cloned_robot))
+            thread.daemon = True
+            thread.start()
+
+        # Wait until the best-ranked outcome can be decided.
+        try:
+            with condition:
+                while True:
+                    for index, outcome in enumerate(results):
+                        if outcome is None:
+                            break
+                        elif outcome[0]:
+                            errors = dict(enumerate(
+                                result[1] for result in results[:index]))
+                            traj = CopyTrajectory(outcome[1], env=env)
+                            return index, traj, errors
+                        elif not isinstance(outcome[1], PlanningError):
+                            raise outcome[1]
+                    else:
+                        errors = dict(enumerate(
+                            result[1] for result in results))
+                        return None, None, errors
+
+                    condition.wait()
+        finally:
+            with condition:
+                state['cancelled'] = True
+
 
 class MetaPlanner(Planner):
     __metaclass__ = abc.ABCMeta
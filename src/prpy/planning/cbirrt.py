@@ -187,7 +187,7 @@ class CBiRRTPlanner(BasePlanner):
 
     def Plan(self, robot, smoothingitrs=None, timelimit=None, allowlimadj=0,
              jointstarts=None, jointgoals=None, psample=None, tsr_chains=None,
-             extra_args=None, **kw_args):
+             extra_args=None, compact_tsrs=False, **kw_args):
         from openravepy import CollisionOptions, CollisionOptionsStateSaver
 
         # TODO We may need this work-around because CBiRRT doesn't like it
@@ -254,7 +254,8 @@ class CBiRRTPlanner(BasePlanner):
 
         if tsr_chains is not None:
             for tsr_chain in tsr_chains:
-                args += ['TSRChain', SerializeTSRChain(tsr_chain)]
+                args += ['TSRChain',
+                         SerializeTSRChain(tsr_chain, compact=compact_tsrs)]
 
         # FIXME: Why can't we write to anything other than cmovetraj.txt or
         # /tmp/cmovetraj.txt with CBiRRT?
@@ -302,14 +303,15 @@ class CBiRRTPlanner(BasePlanner):
 
 
 def SerializeTransform12Col(tm, format='%.5f'):
-    return ' '.join([(format % (i,)) for i in tm[0:3, :].T.reshape(12)])
+    return ' '.join((format,) * 12) % tuple(tm[0:3, :].T.reshape(12))
 
 
 def SerializeArray(a, format='%.5f'):
-    return ' '.join([(format % (i,)) for i in a.reshape(-1)])
+    a = numpy.asarray(a).reshape(-1)
+    return ' '.join((format,) * a.shape[0]) % tuple(a)
 
 
-def SerializeTSR(self):
+def SerializeTSR(self, compact=False):
     """
     Function for Serializing TSRs for CBIRRT.
 
@@ -326,16 +328,15 @@ def SerializeTSR(self):
     Bw (double 1x12): bounds in x y z roll pitch yaw.
                       Format: [x_min, x_max, y_min, y_max ...]
 
+    The string is cached on the TSR, see TSR.serialize.
+
     Output:
     outstring (str): string to use for SerializeTSRChain function
     """
-    return '%d %s %s %s %s' % (self.manipindex, self.bodyandlink,
-                               SerializeTransform12Col(self.T0_w),
-                               SerializeTransform12Col(self.Tw_e),
-                               SerializeArray(self.Bw))
+    return self.serialize(compact=compact)
 
 
-def SerializeTSRChain(self):
+def SerializeTSRChain(self, compact=False):
     """
     Function for Serializing TSR Chains for CBIRRT.
 
@@ -358,17 +359,9 @@ def SerializeTSRChain(self):
     mimicbodyjoints (int [1xn]): 0-indexed indices of mimicbody's joints that
                                  are mimiced (INCREASING AND CONSECUTIVE)
 
+    The string is cached on the TSR chain, see TSRChain.serialize.
+
     Output:
     outstring (str): string to include in call to cbirrt planner
     """
-    allTSRstring = ' '.join([SerializeTSR(tsr) for tsr in self.TSRs])
-    numTSRs = len(self.TSRs)
-    outstring = '%d %d %d' % (int(self.sample_start),
-                              int(self.sample_goal),
-                              int(self.constrain))
-    outstring += ' %d %s' % (numTSRs, allTSRstring)
-    outstring += ' ' + self.mimicbodyname
-    if len(self.mimicbodyjoints) > 0:
-        outstring += ' %d %s' % (len(self.mimicbodyjoints),
-                                 SerializeArray(self.mimicbodyjoints))
-    return outstring
+    return self.serialize(compact=compact)
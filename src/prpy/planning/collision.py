@@ -0,0 +1,205 @@
+import hashlib
+import logging
+import numpy
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+def ComputeSceneFingerprint(env, robot=None):
+    """
+    Compute a digest of everything in a scene that can affect collisions.
+
+    The digest covers the name, geometry, transform, enabled links and DOF
+    values of every body in the environment, as well as the bodies grabbed by
+    each robot. If robot is specified, its active DOF values are excluded so
+    that moving the robot through configurations does not change the digest.
+
+    @param env the environment; should be locked by the caller
+    @param robot optional robot whose active DOF values are ignored
+    @return hex digest string
+    """
+    digest = hashlib.sha1()
+
+    for body in sorted(env.GetBodies(), key=lambda b: b.GetName()):
+        digest.update(body.GetName())
+        digest.update(body.GetKinematicsGeometryHash())
+        digest.update(numpy.asarray(body.GetTransform()).tostring())
+        digest.update(numpy.array(
+            [link.IsEnabled() for link in body.GetLinks()]).tostring())
+
+        dof_values = numpy.array(body.GetDOFValues())
+        if robot is not None and body == robot:
+            dof_values[robot.GetActiveDOFIndices()] = 0.
+        digest.update(dof_values.tostring())
+
+        if body.IsRobot():
+            for grabbed in body.GetGrabbed():
+                digest.update(grabbed.GetName())
+
+    return digest.hexdigest()
+
+
+class CollisionCache(object):
+    """
+    Memoize the collision checks of a robot within a single scene.
+
+    Configurations are quantized at the resolution of the robot's active DOFs,
+    so two configurations that round to the same cell share a result. The
+    cache is opt-in: assign the same instance to the collision_cache attribute
+    of each planner that should share it, e.g. every planner in a Sequence.
+    ClonedPlanningMethod calls Update() with the cloned scene before each
+    planning call, which clears the cache if the scene has changed.
+
+    Collision-free configurations are cached as None; colliding
+    configurations are cached as the PlanningError that was raised.
+    """
+    def __init__(self):
+        self.fingerprint = None
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+        self._results = dict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._results)
+
+    def Update(self, env, robot=None):
+        """
+        Clear the cache if the scene differs from the cached scene.
+
+        @param env the environment; should be locked by the caller
+        @param robot optional robot whose active DOF values are ignored
+        @return True if the cache was invalidated
+        """
+        fingerprint = ComputeSceneFingerprint(env, robot)
+
+        with self._lock:
+            if fingerprint == self.fingerprint:
+                return False
+
+            if self.fingerprint is not None:
+                self.invalidations += 1
+                logger.debug('Scene changed; discarding %d cached collision'
+                              ' checks.', len(self._results))
+
+            self.fingerprint = fingerprint
+            self._results.clear()
+            return True
+
+    def Clear(self):
+        """
+        Discard all cached results and statistics.
+        """
+        with self._lock:
+            self.fingerprint = None
+            self.hits = 0
+            self.misses = 0
+            self.invalidations = 0
+            self._results.clear()
+
+    def GetHitRate(self):
+        """
+        Fraction of lookups that were answered from the cache.
+
+        @return hit rate in [0, 1]; zero if no lookups have been made
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return float(self.hits) / lookups if lookups else 0.
+
+    def GetStatistics(self):
+        """
+        Get a dictionary of cache statistics.
+
+        @return dictionary with hits, misses, hit_rate, invalidations and size
+        """
+        hit_rate = self.GetHitRate()
+
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': hit_rate,
+                'invalidations': self.invalidations,
+                'size': len(self._results),
+            }
+
+    def GetKey(self, robot, q=None):
+        """
+        Quantize a configuration of the robot's active DOFs.
+
+        @param robot the robot
+        @param q active DOF values; defaults to the current configuration
+        @return hashable key
+        """
+        dof_indices = robot.GetActiveDOFIndices()
+        if q is None:
+            q = robot.GetActiveDOFValues()
+
+        from ..util import GetKinematicLimits
+        resolutions = GetKinematicLimits(robot).resolution[dof_indices]
+        cells = numpy.floor(numpy.asarray(q) / resolutions + 0.5)
+
+        return (robot.GetName(), tuple(dof_indices),
+                tuple(cells.astype(int)))
+
+    def CheckCollision(self, robot):
+        """
+        Check the robot's current configuration, using a cached result if
+        one is available.
+
+        @param robot the robot, already set to the configuration to check
+        @throws CollisionPlanningError if in collision with the environment
+        @throws SelfCollisionPlanningError if in self-collision
+        """
+        key = self.GetKey(robot)
+
+        with self._lock:
+            found = key in self._results
+            if found:
+                self.hits += 1
+                error = self._results[key]
+            else:
+                self.misses += 1
+
+        if not found:
+            error = _FindCollision(robot)
+
+            with self._lock:
+                self._results[key] = error
+
+        if error is not None:
+            raise error
+
+
+def _FindCollision(robot):
+    from openravepy import CollisionReport
+    from .exceptions import CollisionPlanningError, SelfCollisionPlanningError
+
+    report = CollisionReport()
+    if robot.GetEnv().CheckCollision(robot, report=report):
+        return CollisionPlanningError.FromReport(report)
+    elif robot.CheckSelfCollision(report=report):
+        return SelfCollisionPlanningError.FromReport(report)
+    else:
+        return None
+
+
+def CheckCollision(robot, cache=None):
+    """
+    Check the robot's current configuration for collision.
+
+    @param robot the robot, already set to the configuration to check
+    @param cache optional CollisionCache to consult
+    @throws CollisionPlanningError if in collision with the environment
+    @throws SelfCollisionPlanningError if in self-collision
+    """
+    if cache is not None:
+        cache.CheckCollision(robot)
+    else:
+        error = _FindCollision(robot)
+        if error is not None:
+            raise error
@@ -33,52 +33,67 @@ import openravepy
 from .. import ik_ranking
 from base import (BasePlanner,
                   PlanningError,
+                  PlannerPool,
                   ClonedPlanningMethod)
 
 logger = logging.getLogger(__name__)
 
 
 class IKPlanner(BasePlanner):
-    def __init__(self, delegate_planner=None):
+    """
+    Planner that plans to a pose by planning to its ranked IK solutions.
+
+    By default, the delegate planner is called on each IK solution in turn
+    until one succeeds. If parallel_delegates is a list of planners, the IK
+    solutions are ranked once and planning to the top-ranked solutions is
+    dispatched concurrently, one solution per delegate at a time.
+
+    @param delegate_planner planner used for sequential planning; defaults
+                            to robot.planner
+    @param parallel_delegates optional list of planners for concurrent
+                              planning
+    """
+    def __init__(self, delegate_planner=None, parallel_delegates=None):
         super(IKPlanner, self).__init__()
         self.delegate_planner = delegate_planner
 
+        if parallel_delegates is not None:
+            self.delegate_pool = PlannerPool(parallel_delegates)
+        else:
+            self.delegate_pool = None
+
     def __str__(self):
         return 'IKPlanner'
 
     @ClonedPlanningMethod
     def PlanToIK(self, robot, goal_pose, ranker=ik_ranking.JointLimitAvoidance,
                  num_attempts=1, **kw_args):
-        from openravepy import (IkFilterOptions,
-                                IkParameterization,
-                                IkParameterizationType)
+        from openravepy import IkFilterOptions
+        from ..ik_cache import FindIKSolutions, GetIKCache
 
-        # FIXME: Currently meta-planners duplicate IK ranking in each planning
-        # thread. It should be possible to fix this by IK ranking once, then
-        # calling PlanToConfiguration in separate threads.
+        # NOTE: Meta-planners duplicate IK ranking in each planning thread.
+        # Use parallel_delegates to rank once and plan to the IK solutions in
+        # separate threads instead.
 
         # Find an unordered list of IK solutions.
         with robot.GetEnv():
             manipulator = robot.GetActiveManipulator()
-            ik_param = IkParameterization(
-                goal_pose, IkParameterizationType.Transform6D)
-            ik_solutions = manipulator.FindIKSolutions(
-                ik_param, IkFilterOptions.CheckEnvCollisions,
-                ikreturn=False, releasegil=True
-            )
+            ik_solutions = FindIKSolutions(
+                manipulator, goal_pose, IkFilterOptions.CheckEnvCollisions,
+                cache=GetIKCache(manipulator))
 
         if ik_solutions.shape[0] == 0:
             raise PlanningError('There is no IK solution at the goal pose.')
 
         # Sort the IK solutions in ascending order by the costs returned by the
         # ranker. Lower cost solutions are better and infinite cost solutions
-        # are assumed to be infeasible.
-        scores = ranker(robot, ik_solutions)
-        ranked_indices = numpy.argsort(scores)
-        ranked_indices = ranked_indices[~numpy.isposinf(scores)]
-        ranked_ik_solutions = ik_solutions[ranked_indices, :]
+        # are assumed to be infeasible. Only the solutions that will be
+        # planned to are sorted.
+        top_solutions = ik_ranking.TopKSolutions(robot, ranker, num_attempts)
+        top_solutions.Add(ik_solutions)
+        _, ranked_ik_solutions = top_solutions.GetSolutions()
 
-        if ranked_ik_solutions.shape[0] == 0:
+        if top_solutions.num_feasible == 0:
             raise PlanningError('All IK solutions have infinite cost.')
 
         # Sequentially plan to the solutions in descending order of cost.
@@ -89,6 +104,11 @@ class IKPlanner(BasePlanner):
             robot.SetActiveDOFs(manipulator.GetArmIndices())
 
             num_attempts = min(ranked_ik_solutions.shape[0], num_attempts)
+
+            if self.delegate_pool is not None:
+                return self._PlanToIKParallel(
+                    robot, ranked_ik_solutions[0:num_attempts, :])
+
             for i, ik_sol in enumerate(ranked_ik_solutions[0:num_attempts, :]):
                 try:
                     traj = planner.PlanToConfiguration(robot, ik_sol)
@@ -102,4 +122,27 @@ class IKPlanner(BasePlanner):
 
         raise PlanningError(
             'Planning to the top {:d} of {:d} IK solutions failed.'
-            .format(num_attempts, ranked_ik_solutions.shape[0]))
+            .format(num_attempts, top_solutions.num_feasible))
+
+    def _PlanToIKParallel(self, robot, ik_solutions):
+        num_attempts = ik_solutions.shape[0]
+
+        def plan_to(ik_sol):
+            return lambda planner, robot: \
+                planner.PlanToConfiguration(robot, ik_sol)
+
+        attempts = [plan_to(ik_sol) for ik_sol in ik_solutions]
+        index, traj, errors = self.delegate_pool.PlanRanked(robot, attempts)
+
+        for i, error in sorted(errors.items()):
+            logger.warning('Planning to IK solution %d of %d failed: %s',
+                           i + 1, num_attempts, error)
+
+        if index is None:
+            raise PlanningError(
+                'Planning to the top {:d} IK solutions failed.'
+                .format(num_attempts))
+
+        logger.info('Planned to IK solution %d of %d.',
+                    index + 1, num_attempts)
+        return traj
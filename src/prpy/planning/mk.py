@@ -29,7 +29,7 @@
 # POSSIBILITY OF SUCH DAMAGE.
 
 import logging, numpy, openravepy, time
-from ..util import SetTrajectoryTags
+from ..util import GetKinematicLimits, SetTrajectoryTags
 from base import (BasePlanner, PlanningError,
                   ClonedPlanningMethod, Tags)
 
@@ -41,22 +41,21 @@ def DoNothing(robot):
 # Based on Moslem Kazemi's code from ARM-S.
 def JointLimitAvoidance(robot, limit_tolerance=0.2, gain=100):
     q = robot.GetActiveDOFValues()
-    q_min, q_max = robot.GetDOFLimits(robot.GetActiveDOFIndices())
-
-    num_dofs = robot.GetActiveDOF()
-    q_dot = numpy.zeros(num_dofs)
-    for i in xrange(num_dofs):
-        max_limit_dist = q_max[i] - q[i]
-        min_limit_dist = q_min[i] - q[i]
-
-        if max_limit_dist < limit_tolerance:
-            q_dot[i] = -gain * (max_limit_dist - limit_tolerance) ** 2
-        elif min_limit_dist > -limit_tolerance:
-            q_dot[i] =  gain * (min_limit_dist + limit_tolerance) ** 2
-        else:
-            q_dot[i] = 0
-
-    return q_dot
+    limits = GetKinematicLimits(robot)
+    active_dof_indices = robot.GetActiveDOFIndices()
+    q_min = limits.lower[active_dof_indices]
+    q_max = limits.upper[active_dof_indices]
+
+    max_limit_dist = q_max - q
+    min_limit_dist = q_min - q
+
+    # Push away from whichever limit is within limit_tolerance, preferring
+    # the upper limit if both are.
+    return numpy.where(
+        max_limit_dist < limit_tolerance,
+        -gain * (max_limit_dist - limit_tolerance) ** 2,
+        numpy.where(min_limit_dist > -limit_tolerance,
+                    gain * (min_limit_dist + limit_tolerance) ** 2, 0.))
 
 class MKPlanner(BasePlanner):
     def __init__(self):
@@ -69,7 +68,7 @@ class MKPlanner(BasePlanner):
         ### NOTE: The sign_flipper is a hack
         ### Sometimes, it seems changing the direction of the error term caused it to succeed
         ### sign_flipper is monitered by the planner. If the orientation error starts increasing, it flips the sign of the error term
-    def GetStraightVelocity(self, manip, velocity, initial_hand_pose, nullspace_fn, step_size, sign_flipper = 1):
+    def GetStraightVelocity(self, manip, velocity, initial_hand_pose, nullspace_fn, step_size, sign_flipper = 1, damping=1e-3):
         robot = manip.GetRobot()
         current_hand_pose = manip.GetEndEffectorTransform()
         initial_position = initial_hand_pose[0:3, 3]
@@ -87,23 +86,27 @@ class MKPlanner(BasePlanner):
         choices_ori = [ current_ori - initial_ori, current_ori + initial_ori ]
         error_ori = sign_flipper*min(choices_ori, key=lambda q: numpy.linalg.norm(q))
 
-        # Jacobian pseudo-inverse.
         jacobian_spatial = manip.CalculateJacobian()
         jacobian_angular = manip.CalculateRotationJacobian() #this function seems very buggy/wrong
         jacobian = numpy.vstack((jacobian_spatial, jacobian_angular))
-        jacobian_pinv = numpy.linalg.pinv(jacobian)
-
-        # Null-space projector
-        nullspace_projector = numpy.eye(jacobian.shape[1]) - numpy.dot(jacobian_pinv, jacobian)
         nullspace_goal = nullspace_fn(robot)
         pose_error = numpy.hstack((error_pos, error_ori))
 
-        return numpy.dot(jacobian_pinv, pose_error) + numpy.dot(nullspace_projector, nullspace_goal)
+        # Damped least-squares solution with the nullspace goal projected
+        # into the nullspace of the Jacobian. With J# = J^T (J J^T + d^2 I)^-1,
+        # J# e + (I - J# J) g = g + J# (e - J g), so a single linear solve
+        # replaces the pseudo-inverse and the projector.
+        damped = numpy.dot(jacobian, jacobian.T)
+        damped[numpy.diag_indices_from(damped)] += damping ** 2
+        residual = pose_error - numpy.dot(jacobian, nullspace_goal)
+        return nullspace_goal + numpy.dot(
+            jacobian.T, numpy.linalg.solve(damped, residual))
 
     @ClonedPlanningMethod
     def PlanToEndEffectorOffset(self, robot, direction, distance, max_distance=None,
                                 nullspace=JointLimitAvoidance, timelimit=5.0, step_size=0.001,
-                                position_tolerance=0.01, angular_tolerance=0.15, **kw_args):
+                                position_tolerance=0.01, angular_tolerance=0.15,
+                                max_step_size=None, **kw_args):
         """
         Plan to a desired end-effector offset with move-hand-straight
         constraint. movement less than distance will return failure. The motion
@@ -116,6 +119,9 @@ class MKPlanner(BasePlanner):
         @param stepsize step size in meters for the Jacobian pseudoinverse controller
         @param position_tolerance constraint tolerance in meters
         @param angular_tolerance constraint tolerance in radians
+        @param max_step_size if set, adapt the step size between step_size
+                             and max_step_size so that each step moves every
+                             joint by about its DOF resolution
         @return traj
         """
         if distance < 0:
@@ -126,18 +132,13 @@ class MKPlanner(BasePlanner):
             raise ValueError('Max distance is less than minimum distance.')
         elif step_size <= 0:
             raise ValueError('Step size must be positive.')
+        elif max_step_size is not None and max_step_size < step_size:
+            raise ValueError('Max step size is less than step size.')
         elif position_tolerance < 0:
             raise ValueError('Position tolerance must be non-negative.')
         elif angular_tolerance < 0:
             raise ValueError('Angular tolerance must be non-negative.')
 
-        # save all active bodies so we only check collision with those
-        active_bodies = []
-        for body in self.env.GetBodies():
-            if body.IsEnabled():
-                active_bodies.append(body)
-        
-
         # Normalize the direction vector.
         direction  = numpy.array(direction, dtype='float')
         direction /= numpy.linalg.norm(direction)
@@ -152,7 +153,10 @@ class MKPlanner(BasePlanner):
             traj.Init(manip.GetArmConfigurationSpecification())
 
             active_dof_indices = manip.GetArmIndices()
-            limits_lower, limits_upper = robot.GetDOFLimits(active_dof_indices)
+            limits = GetKinematicLimits(robot)
+            limits_lower = limits.lower[active_dof_indices]
+            limits_upper = limits.upper[active_dof_indices]
+            resolutions = limits.resolution[active_dof_indices]
             initial_pose = manip.GetEndEffectorTransform()
             q = robot.GetDOFValues(active_dof_indices)
             traj.Insert(0, q)
@@ -161,6 +165,7 @@ class MKPlanner(BasePlanner):
             current_distance = 0.0
             sign_flipper = 1
             last_rot_error = 9999999999.0
+            current_step_size = step_size
             try:
                 while current_distance < max_distance:
                     # Check for a timeout.
@@ -169,15 +174,24 @@ class MKPlanner(BasePlanner):
                         raise PlanningError('Reached time limit.')
 
                     # Compute joint velocities using the Jacobian pseudoinverse.
-                    q_dot = self.GetStraightVelocity(manip, direction, initial_pose, nullspace, step_size, sign_flipper=sign_flipper)
+                    q_dot = self.GetStraightVelocity(manip, direction, initial_pose, nullspace, current_step_size, sign_flipper=sign_flipper)
+
+                    if max_step_size is not None:
+                        # Never move a joint by more than its resolution in
+                        # one step, and aim the next step at the resolution.
+                        ratio = numpy.max(numpy.abs(q_dot) / resolutions)
+                        if ratio > 1.:
+                            q_dot /= ratio
+                        current_step_size = numpy.clip(
+                            current_step_size / max(ratio, 0.5),
+                            step_size, max_step_size)
+
                     q += q_dot
                     robot.SetDOFValues(q, active_dof_indices)
 
-                    # Check for collisions.
-                    #if self.env.CheckCollision(robot):
-                    for body in active_bodies:
-                        if self.env.CheckCollision(robot, body):
-                            raise PlanningError('Encountered collision.')
+                    # Check for collisions with all enabled bodies at once.
+                    if self.env.CheckCollision(robot):
+                        raise PlanningError('Encountered collision.')
                     if robot.CheckSelfCollision():
                         raise PlanningError('Encountered self-collision.')
                     # Check for joint limits.
@@ -218,6 +232,6 @@ class MKPlanner(BasePlanner):
                     logger.warning('Terminated early at distance %f < %f: %s',
                                    current_distance, max_distance, e.message)
 
-        SetTrajectoryTags(output_traj, {Tags.CONSTRAINED: True}, append=True)
+        SetTrajectoryTags(traj, {Tags.CONSTRAINED: True}, append=True)
         return traj
 
@@ -75,6 +75,7 @@ class OMPLPlanner(BasePlanner):
         Plan using the given set of TSR chains with OMPL.
         @param robot
         @param tsrchains A list of tsrchains to use during planning
+        @param compact_tsrs serialize the TSRs without rounding them
         @param return traj
         """
         return self._TSRPlan(robot, tsrchains, **kw_args)
@@ -114,11 +115,11 @@ class OMPLPlanner(BasePlanner):
 
         return traj
 
-    def _TSRPlan(self, robot, tsrchains, **kw_args):
-        extraParams = ''
-        for chain in tsrchains:
-            extraParams += '<{k:s}>{v:s}</{k:s}>'.format(
-                k='tsr_chain', v=SerializeTSRChain(chain))
+    def _TSRPlan(self, robot, tsrchains, compact_tsrs=False, **kw_args):
+        extraParams = ''.join([
+            '<tsr_chain>{:s}</tsr_chain>'.format(
+                SerializeTSRChain(chain, compact=compact_tsrs))
+            for chain in tsrchains])
 
         return self._Plan(robot, formatted_extra_params=extraParams, **kw_args)
 
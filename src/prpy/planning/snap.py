@@ -50,10 +50,28 @@ class SnapPlanner(BasePlanner):
     speed-up planning between nearby configurations. This planner is
     most commonly used as the first item in a Sequence meta-planner to
     avoid calling a motion planner when the trivial solution is valid.
+
+    By default, configurations along the edge are checked in Van der Corput
+    order so a collision anywhere on the edge is found after only a few
+    checks. If goal_first is True, the goal configuration is checked before
+    any other point on the edge, which rejects infeasible goals immediately.
+
+    @param sampling_func generator of sample times used to order the
+                         collision checks, e.g. SampleTimeGenerator or
+                         VanDerCorputSampleGenerator (the default)
+    @param goal_first if True, check the goal before the start and interior
     """
-    def __init__(self):
+    def __init__(self, sampling_func=None, goal_first=False):
+        from prpy.util import VanDerCorputSampleGenerator
+
         super(SnapPlanner, self).__init__()
 
+        if sampling_func is None:
+            sampling_func = VanDerCorputSampleGenerator
+
+        self.sampling_func = sampling_func
+        self.goal_first = goal_first
+
     def __str__(self):
         return 'SnapPlanner'
 
@@ -85,29 +103,29 @@ class SnapPlanner(BasePlanner):
         @param goal_pose desired end-effector pose
         @return traj
         """
+        from prpy.ik_cache import FindIKSolution, FindIKSolutions, GetIKCache
         from prpy.planning.exceptions import CollisionPlanningError
         from prpy.planning.exceptions import SelfCollisionPlanningError
 
-        ikp = openravepy.IkParameterizationType
         ikfo = openravepy.IkFilterOptions
 
         # Find an IK solution. OpenRAVE tries to return a solution that is
         # close to the configuration of the arm, so we don't need to do any
-        # custom IK ranking.
+        # custom IK ranking. Snapping is often repeated for the same pose,
+        # so the pose is added to the IK cache.
         manipulator = robot.GetActiveManipulator()
-        ik_param = openravepy.IkParameterization(goal_pose, ikp.Transform6D)
-        ik_solution = manipulator.FindIKSolution(
-            ik_param, ikfo.CheckEnvCollisions,
-            ikreturn=False, releasegil=True
-        )
+        ik_cache = GetIKCache(manipulator)
+        ik_solution = FindIKSolution(
+            manipulator, goal_pose, ikfo.CheckEnvCollisions, cache=ik_cache,
+            fill_cache=True)
 
         if ik_solution is None:
             # FindIKSolutions is slower than FindIKSolution,
             # so call this only to identify and raise error when
             # there is no solution
-            ik_solutions = manipulator.FindIKSolutions(
-                ik_param, ikfo.IgnoreSelfCollisions,
-                ikreturn=False, releasegil=True)
+            ik_solutions = FindIKSolutions(
+                manipulator, goal_pose, ikfo.IgnoreSelfCollisions,
+                cache=ik_cache)
 
             for q in ik_solutions:
                 robot.SetActiveDOFValues(q)
@@ -124,8 +142,7 @@ class SnapPlanner(BasePlanner):
     def _Snap(self, robot, goal, **kw_args):
         from prpy.util import CheckJointLimits
         from prpy.util import GetLinearCollisionCheckPts
-        from prpy.planning.exceptions import CollisionPlanningError
-        from prpy.planning.exceptions import SelfCollisionPlanningError
+        from prpy.planning.collision import CheckCollision
 
         # Create a two-point trajectory between the
         # current configuration and the goal.
@@ -160,18 +177,13 @@ class SnapPlanner(BasePlanner):
         # Note: this returns a python generator, and if the
         # trajectory only has one waypoint then only the
         # start configuration will be collisioned checked.
-        #
-        # Sampling function:
-        # 'linear'
-        # from prpy.util import SampleTimeGenerator
-        # linear = SampleTimeGenerator
-        # 'Van der Corput'
-        from prpy.util import VanDerCorputSampleGenerator
-        vdc = VanDerCorputSampleGenerator
+        sampling_func = self.sampling_func
+        if self.goal_first:
+            sampling_func = GoalFirstSampleGenerator(sampling_func)
 
         checks = GetLinearCollisionCheckPts(robot, traj,
                                             norm_order=2,
-                                            sampling_func=vdc)
+                                            sampling_func=sampling_func)
 
         # Run constraint checks at DOF resolution:
         for t, q in checks:
@@ -180,12 +192,29 @@ class SnapPlanner(BasePlanner):
             robot.SetActiveDOFValues(q)
 
             # Check for collisions
-            report = openravepy.CollisionReport()
-            if self.env.CheckCollision(robot, report=report):
-                raise CollisionPlanningError.FromReport(report)
-            elif robot.CheckSelfCollision(report=report):
-                raise SelfCollisionPlanningError.FromReport(report)
+            CheckCollision(robot, cache=self.collision_cache)
 
         # Tag the return trajectory as smooth (in joint space).
         SetTrajectoryTags(traj, {Tags.SMOOTH: True}, append=True)
         return traj
+
+
+class GoalFirstSampleGenerator(object):
+    """
+    Wrap a sample time generator so the end of the range is yielded first.
+
+    The remaining values are yielded in the order of the wrapped generator,
+    skipping the end value so it is not checked twice.
+
+    @param sampling_func generator of sample times, e.g.
+                         VanDerCorputSampleGenerator
+    """
+    def __init__(self, sampling_func):
+        self.sampling_func = sampling_func
+
+    def __call__(self, start, end, step=1):
+        yield float(end)
+
+        for t in self.sampling_func(start, end, step=step):
+            if t != end:
+                yield t
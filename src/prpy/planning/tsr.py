@@ -32,17 +32,34 @@ import time
 import itertools
 import numpy
 import openravepy
-from base import (BasePlanner, ClonedPlanningMethod, PlanningError,
-                  UnsupportedPlanningError)
+from base import (BasePlanner, ClonedPlanningMethod, PlannerPool,
+                  PlanningError, UnsupportedPlanningError)
 
 logger = logging.getLogger(__name__)
 
 
 class TSRPlanner(BasePlanner):
-    def __init__(self, delegate_planner=None):
+    """
+    Planner that plans to a TSR goal set by planning to sampled IK solutions.
+
+    If parallel_delegates is a list of planners, planning to the top-ranked
+    IK solution sets is dispatched concurrently, one set per delegate at a
+    time, instead of calling delegate_planner on each set in turn.
+
+    @param delegate_planner planner used for sequential planning; defaults
+                            to robot.planner
+    @param parallel_delegates optional list of planners for concurrent
+                              planning
+    """
+    def __init__(self, delegate_planner=None, parallel_delegates=None):
         super(TSRPlanner, self).__init__()
         self.delegate_planner = delegate_planner
 
+        if parallel_delegates is not None:
+            self.delegate_pool = PlannerPool(parallel_delegates)
+        else:
+            self.delegate_pool = None
+
     def __str__(self):
         if self.delegate_planner is not None:
             return 'TSRPlanner({:s})'.format(str(self.delegate_planner))
@@ -64,7 +81,9 @@ class TSRPlanner(BasePlanner):
     @ClonedPlanningMethod
     def PlanToTSR(self, robot, tsrchains, tsr_timeout=2.0,
                   num_attempts=3, chunk_size=1, ranker=None,
-                  max_deviation=2 * numpy.pi, **kw_args):
+                  max_deviation=2 * numpy.pi, reachability_map=None,
+                  min_reachability=0., tsr_sampler=None, seed=None,
+                  **kw_args):
         """
         Plan to a desired TSR set using a-priori goal sampling.  This planner
         samples a fixed number of goals from the specified TSRs up-front, then
@@ -83,6 +102,16 @@ class TSRPlanner(BasePlanner):
         @param ranker an IK ranking function to use over the IK solutions
         @param max_deviation the maximum per-joint deviation from current pose
                              that can be considered a valid sample.
+        @param reachability_map ReachabilityMap used to discard unreachable
+                                samples before calling IK; defaults to the
+                                manipulator's reachability_map, if any
+        @param min_reachability samples with a reachability score at or below
+                                this are discarded
+        @param tsr_sampler how to sample the TSR chains: the name of a sampler
+                           in prpy.tsr.samplers.SAMPLERS ('uniform',
+                           'halton', 'sobol' or 'stratified') or a
+                           TSRSampler; defaults to numpy.random
+        @param seed optional seed that makes the sampling reproducible
         @return traj a trajectory that satisfies the specified TSR chains
         """
         # Delegate to robot.planner by default.
@@ -92,6 +121,10 @@ class TSRPlanner(BasePlanner):
         with robot.GetEnv():
             manipulator = robot.GetActiveManipulator()
 
+            if reachability_map is None:
+                reachability_map = getattr(
+                    manipulator, 'reachability_map', None)
+
             # Distance from current configuration is default ranking.
             if ranker is None:
                 from ..ik_ranking import NominalConfiguration
@@ -105,42 +138,61 @@ class TSRPlanner(BasePlanner):
                     'Cannot handle start or trajectory-wide TSR constraints.')
         tsrchains = [t for t in tsrchains if t.sample_goal]
 
+        # Create one sampler per TSR chain, each with its own random stream.
+        if tsr_sampler is None and seed is not None:
+            tsr_sampler = 'uniform'
+
+        if tsr_sampler is not None:
+            from ..tsr.samplers import CreateSampler
+            samplers = [
+                CreateSampler(tsr_sampler,
+                              seed=None if seed is None else [seed, i])
+                for i in xrange(len(tsrchains))]
+        else:
+            samplers = [None] * len(tsrchains)
+
         # Create an iterator that cycles through each TSR chain.
-        tsr_cycler = itertools.cycle(tsrchains)
+        tsr_cycler = itertools.cycle(zip(tsrchains, samplers))
 
         # Create an iterator that cycles TSR chains until the timelimit.
         tsr_timelimit = time.time() + tsr_timeout
-        tsr_sampler = itertools.takewhile(
+        tsr_iterator = itertools.takewhile(
             lambda v: time.time() < tsr_timelimit, tsr_cycler)
 
         # Sample a list of TSR poses and collate valid IK solutions.
-        from openravepy import (IkFilterOptions,
-                                IkParameterization,
-                                IkParameterizationType)
-        ik_solutions = []
-        for tsrchain in tsr_sampler:
-            ik_param = IkParameterization(
-                tsrchain.sample(), IkParameterizationType.Transform6D)
-            ik_solution = manipulator.FindIKSolutions(
-                ik_param, IkFilterOptions.CheckEnvCollisions,
-                ikreturn=False, releasegil=True
-            )
-            if ik_solution.shape[0] > 0:
-                ik_solutions.append(ik_solution)
-
-        if len(ik_solutions) == 0:
+        from openravepy import IkFilterOptions
+        from ..ik_cache import FindIKSolutions
+        from ..ik_ranking import TopKSolutions
+
+        # Rank IK solutions as they are found, keeping only as many of the
+        # lowest cost solutions as can be used by the planning attempts. Lower
+        # cost solutions are better and infinite cost solutions are assumed
+        # to be infeasible.
+        top_solutions = TopKSolutions(robot, ranker, num_attempts * chunk_size)
+        num_unreachable = 0
+        for tsrchain, sampler in tsr_iterator:
+            pose = tsrchain.sample(sampler=sampler)
+
+            # Skip IK on poses that the arm cannot reach.
+            if (reachability_map is not None and
+                    not reachability_map.IsReachable(
+                        manipulator, pose, min_score=min_reachability)):
+                num_unreachable += 1
+                continue
+
+            # TSR samples are not repeated, so they are not cached.
+            ik_solution = FindIKSolutions(
+                manipulator, pose, IkFilterOptions.CheckEnvCollisions)
+            top_solutions.Add(ik_solution)
+
+        if num_unreachable > 0:
+            logger.debug('Discarded %d unreachable TSR samples.',
+                         num_unreachable)
+
+        if top_solutions.num_added == 0:
             raise PlanningError('No collision-free IK solutions at goal TSRs.')
 
-        # Sort the IK solutions in ascending order by the costs returned by the
-        # ranker. Lower cost solutions are better and infinite cost solutions
-        # are assumed to be infeasible.
-        ik_solutions = numpy.vstack(ik_solutions)
-        scores = ranker(robot, ik_solutions)
-        valid_idxs = ~numpy.isposinf(scores)
-        valid_scores = scores[valid_idxs]
-        valid_solutions = ik_solutions[valid_idxs, :]
-        ranked_indices = numpy.argsort(valid_scores)
-        ranked_ik_solutions = valid_solutions[ranked_indices, :]
+        _, ranked_ik_solutions = top_solutions.GetSolutions()
 
         # Group the IK solutions into sets of the specified size
         # (plan for each set of IK solutions together).
@@ -157,6 +209,10 @@ class TSRPlanner(BasePlanner):
         with robot.CreateRobotStateSaver(p.ActiveDOF):
             robot.SetActiveDOFs(manipulator.GetArmIndices())
 
+            if self.delegate_pool is not None:
+                return self._PlanToTSRParallel(
+                    robot, ranked_ik_solution_sets[:num_attempts], kw_args)
+
             # Try planning to each solution set in descending cost order.
             for i, ik_set in ik_set_list:
                 try:
@@ -178,4 +234,34 @@ class TSRPlanner(BasePlanner):
         # If none of the planning attempts succeeded, report failure.
         raise PlanningError(
             'Planning to the top {:d} of {:d} IK solution sets failed.'
-            .format(num_attempts, len(ranked_ik_solution_sets)))
+            .format(num_attempts, int(numpy.ceil(
+                float(top_solutions.num_feasible) / chunk_size))))
+
+    def _PlanToTSRParallel(self, robot, ik_sets, kw_args):
+        num_attempts = len(ik_sets)
+
+        def plan_to(ik_set):
+            def attempt(planner, robot):
+                if ik_set.shape[0] > 1:
+                    return planner.PlanToConfigurations(
+                        robot, ik_set, **kw_args)
+                else:
+                    return planner.PlanToConfiguration(
+                        robot, ik_set[0], **kw_args)
+            return attempt
+
+        attempts = [plan_to(ik_set) for ik_set in ik_sets]
+        index, traj, errors = self.delegate_pool.PlanRanked(robot, attempts)
+
+        for i, error in sorted(errors.items()):
+            logger.warning('Planning to IK solution set %d of %d failed: %s',
+                           i + 1, num_attempts, error)
+
+        if index is None:
+            raise PlanningError(
+                'Planning to the top {:d} IK solution sets failed.'
+                .format(num_attempts))
+
+        logger.info('Planned to IK solution set %d of %d.',
+                    index + 1, num_attempts)
+        return traj
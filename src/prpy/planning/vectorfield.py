@@ -108,7 +108,8 @@ class VectorFieldPlanner(BasePlanner):
                 robot, twist, joint_velocity_limits=numpy.PINF)
 
             # Go as fast as possible
-            vlimits = robot.GetDOFVelocityLimits(robot.GetActiveDOFIndices())
+            vlimits = util.GetKinematicLimits(robot).velocity[
+                robot.GetActiveDOFIndices()]
             return min(abs(vlimits[i] / dqout[i])
                        if dqout[i] != 0. else 1.
                        for i in xrange(vlimits.shape[0])) * dqout
@@ -292,6 +293,9 @@ class VectorFieldPlanner(BasePlanner):
 
         manip = robot.GetActiveManipulator()
 
+        # Index the trajectory for the closest-point queries.
+        traj_index = util.WorkspaceTrajectoryIndex(traj, dt=0.0005)
+
         # Get the final end-effector pose
         duration = traj.GetDuration()
         T_ee_goal = openravepy.matrixFromPose(traj.Sample(duration)[0:7])
@@ -304,8 +308,7 @@ class VectorFieldPlanner(BasePlanner):
 
             # Find where we are on the goal trajectory by finding
             # the the closest point
-            (_, t, _) = util.GetMinDistanceBetweenTransformAndWorkspaceTraj(
-                T_ee_actual, traj, 0.0005)
+            (_, t, _) = traj_index.GetMinDistance(T_ee_actual)
 
             # Get the desired end-effector transform from
             # the goal trajectory
@@ -365,8 +368,7 @@ class VectorFieldPlanner(BasePlanner):
 
             # Find where we are on the goal trajectory by finding
             # the the closest point
-            (_, t, _) = util.GetMinDistanceBetweenTransformAndWorkspaceTraj(
-                T_ee_curr, traj, 0.0005)
+            (_, t, _) = traj_index.GetMinDistance(T_ee_curr)
 
             # Get the desired end-effector transform from
             # the goal trajectory
@@ -433,11 +435,8 @@ class VectorFieldPlanner(BasePlanner):
         @param kw_args keyword arguments to be passed to fn_vectorfield
         @return traj
         """
-        from .exceptions import (
-            CollisionPlanningError,
-            SelfCollisionPlanningError,
-        )
-        from openravepy import CollisionReport, RaveCreateTrajectory
+        from .collision import CheckCollision
+        from openravepy import RaveCreateTrajectory
         from ..util import GetCollisionCheckPts
         import time
         import scipy.integrate
@@ -495,11 +494,7 @@ class VectorFieldPlanner(BasePlanner):
             robot.SetActiveDOFValues(q)
 
             # Check collision.
-            report = CollisionReport()
-            if env.CheckCollision(robot, report=report):
-                raise CollisionPlanningError.FromReport(report)
-            elif robot.CheckSelfCollision(report=report):
-                raise SelfCollisionPlanningError.FromReport(report)
+            CheckCollision(robot, cache=self.collision_cache)
 
             # Check the termination condition.
             status = fn_terminate()
@@ -156,6 +156,7 @@ class GreedyIKPlanner(BasePlanner):
                                  CollisionPlanningError,
                                  SelfCollisionPlanningError)
         from openravepy import CollisionReport
+        from ..ik_cache import FindIKSolution, FindIKSolutions
         p = openravepy.KinBody.SaveParameters
 
         with robot:
@@ -185,13 +186,14 @@ class GreedyIKPlanner(BasePlanner):
                             current_time - start_time > timelimit):
                         raise TimeoutPlanningError(timelimit)
 
-                    # Hypothesize new configuration as closest IK to current
+                    # Hypothesize new configuration as closest IK to current.
+                    # Every step queries a new pose, so the IK cache is not
+                    # used.
                     qcurr = robot.GetActiveDOFValues()  # Configuration at t.
-                    qnew = manip.FindIKSolution(
+                    qnew = FindIKSolution(
+                        manip,
                         openravepy.matrixFromPose(traj.Sample(t + dt)[0:7]),
-                        ik_options,
-                        ikreturn=False,
-                        releasegil=True
+                        ik_options
                     )
 
                     # Check if the step was within joint DOF resolution.
@@ -227,11 +229,11 @@ class GreedyIKPlanner(BasePlanner):
                 if t < min_time:
                     # FindIKSolutions is slower than FindIKSolution, so call
                     # this only to identify error when there is no solution.
-                    ik_solutions = manip.FindIKSolutions(
+                    ik_solutions = FindIKSolutions(
+                        manip,
                         openravepy.matrixFromPose(
                             traj.Sample(t + dt * 2.0)[0:7]),
-                        openravepy.IkFilterOptions.IgnoreSelfCollisions,
-                        ikreturn=False, releasegil=True
+                        openravepy.IkFilterOptions.IgnoreSelfCollisions
                     )
 
                     collision_error = None
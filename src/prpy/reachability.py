@@ -0,0 +1,342 @@
+import logging
+import numpy
+import openravepy
+
+logger = logging.getLogger(__name__)
+
+
+class ReachabilityMap(object):
+    """
+    Offline map of the end-effector poses that a manipulator can reach.
+
+    Poses are expressed in the frame of the manipulator's base link. The
+    position of the end-effector is voxelized on a regular grid and the tool
+    direction is discretized into polar and azimuthal bins. Each cell stores
+    a score in [0, 1] proportional to the number of random joint
+    configurations that landed in it while the map was built; a score of zero
+    means that the pose is (very likely) unreachable.
+
+    Maps are built with Build(), saved with Save() and loaded with Load(), or
+    from the command line with `python -m prpy.reachability`. Assign a loaded
+    map to the reachability_map attribute of a prpy Manipulator to let
+    TSRPlanner reject unreachable TSR samples before calling IK.
+    """
+    def __init__(self, scores, origin, position_resolution,
+                 local_tool_direction, manipulator_name=None,
+                 kinematics_hash=None):
+        """
+        @param scores (nx, ny, nz, num_polar, num_azimuth) array of uint8
+                      scores, where 255 is the most reachable cell
+        @param origin position of the corner of the first voxel
+        @param position_resolution edge length of a voxel, in meters
+        @param local_tool_direction tool direction in the end-effector frame
+        @param manipulator_name name of the manipulator the map describes
+        @param kinematics_hash kinematics hash of the robot the map describes
+        """
+        self.scores = numpy.asarray(scores, dtype=numpy.uint8)
+        self.origin = numpy.array(origin, dtype=float)
+        self.position_resolution = float(position_resolution)
+        self.local_tool_direction = numpy.array(local_tool_direction,
+                                                dtype=float)
+        self.manipulator_name = manipulator_name
+        self.kinematics_hash = kinematics_hash
+
+    @property
+    def num_polar_bins(self):
+        return self.scores.shape[3]
+
+    @property
+    def num_azimuth_bins(self):
+        return self.scores.shape[4]
+
+    @classmethod
+    def Build(cls, manipulator, num_samples=100000,
+              position_resolution=0.05, num_polar_bins=8,
+              num_azimuth_bins=16, check_self_collision=True, dilate=True,
+              rng=None):
+        """
+        Build a map by sampling random configurations of the manipulator.
+
+        The DOFs that are not part of the arm keep their current values. The
+        environment should be locked by the caller.
+
+        @param manipulator the manipulator
+        @param num_samples number of random arm configurations to sample
+        @param position_resolution edge length of a voxel, in meters
+        @param num_polar_bins number of bins for the tool direction's angle
+                              from the base z-axis
+        @param num_azimuth_bins number of bins for the tool direction's angle
+                                about the base z-axis
+        @param check_self_collision discard self-colliding configurations
+        @param dilate mark the neighbors of each reached voxel as reachable,
+                      to compensate for sampling sparsity
+        @param rng optional numpy.random.RandomState
+        @return ReachabilityMap
+        """
+        if rng is None:
+            rng = numpy.random.RandomState()
+
+        robot = manipulator.GetRobot()
+        arm_indices = manipulator.GetArmIndices()
+        lower, upper = robot.GetDOFLimits(arm_indices)
+        local_tool_direction = manipulator.GetLocalToolDirection()
+
+        configurations = lower + rng.random_sample(
+            (num_samples, len(arm_indices))) * (upper - lower)
+
+        poses = []
+        p = openravepy.KinBody.SaveParameters
+        with robot.CreateRobotStateSaver(p.LinkTransformation):
+            base_inv = numpy.linalg.inv(manipulator.GetBase().GetTransform())
+
+            for q in configurations:
+                robot.SetDOFValues(q, arm_indices)
+                if check_self_collision and robot.CheckSelfCollision():
+                    continue
+
+                poses.append(numpy.dot(
+                    base_inv, manipulator.GetEndEffectorTransform()))
+
+        if not poses:
+            raise ValueError('All sampled configurations are in'
+                             ' self-collision.')
+
+        poses = numpy.array(poses)
+        logger.info('Sampled %d of %d configurations without self-collision.',
+                    poses.shape[0], num_samples)
+
+        # Pad the bounding box of the samples by one voxel on each side.
+        positions = poses[:, 0:3, 3]
+        origin = positions.min(axis=0) - position_resolution
+        shape = numpy.ceil((positions.max(axis=0) + position_resolution
+                            - origin) / position_resolution).astype(int) + 1
+
+        reachability_map = cls(
+            numpy.zeros(tuple(shape) + (num_polar_bins, num_azimuth_bins)),
+            origin, position_resolution, local_tool_direction,
+            manipulator_name=manipulator.GetName(),
+            kinematics_hash=robot.GetKinematicsGeometryHash())
+
+        cells, _ = reachability_map._GetCells(poses)
+        counts = numpy.zeros(reachability_map.scores.shape)
+        numpy.add.at(counts, tuple(cells.T), 1)
+
+        if dilate:
+            counts = _Dilate(counts)
+
+        reachability_map.scores = numpy.ceil(
+            255. * counts / counts.max()).astype(numpy.uint8)
+        return reachability_map
+
+    @classmethod
+    def Load(cls, path, manipulator=None):
+        """
+        Load a map from disk.
+
+        @param path path of a file written by Save()
+        @param manipulator optional manipulator to check the map against
+        @return ReachabilityMap
+        """
+        data = numpy.load(path)
+        reachability_map = cls(
+            data['scores'], data['origin'],
+            data['position_resolution'], data['local_tool_direction'],
+            manipulator_name=str(data['manipulator_name']),
+            kinematics_hash=str(data['kinematics_hash']))
+
+        if manipulator is not None:
+            robot = manipulator.GetRobot()
+            if (robot.GetKinematicsGeometryHash()
+                    != reachability_map.kinematics_hash):
+                raise ValueError(
+                    'Reachability map "{:s}" was built for a different robot'
+                    ' model.'.format(path))
+
+        return reachability_map
+
+    def Save(self, path):
+        """
+        Save this map to disk in numpy's .npz format.
+
+        @param path output path
+        """
+        numpy.savez_compressed(
+            path, scores=self.scores, origin=self.origin,
+            position_resolution=self.position_resolution,
+            local_tool_direction=self.local_tool_direction,
+            manipulator_name=str(self.manipulator_name),
+            kinematics_hash=str(self.kinematics_hash))
+
+    def _GetCells(self, relative_poses):
+        positions = relative_poses[:, 0:3, 3]
+        directions = numpy.dot(relative_poses[:, 0:3, 0:3],
+                               self.local_tool_direction)
+        directions /= numpy.linalg.norm(directions, axis=1)[:, numpy.newaxis]
+
+        voxels = numpy.floor(
+            (positions - self.origin) / self.position_resolution).astype(int)
+        in_bounds = numpy.all(
+            (voxels >= 0) & (voxels < self.scores.shape[0:3]), axis=1)
+
+        polar = numpy.arccos(numpy.clip(directions[:, 2], -1., 1.))
+        polar_bins = numpy.minimum(
+            (polar * self.num_polar_bins / numpy.pi).astype(int),
+            self.num_polar_bins - 1)
+
+        azimuth = numpy.arctan2(directions[:, 1], directions[:, 0])
+        azimuth_bins = numpy.floor(
+            (azimuth + numpy.pi) * self.num_azimuth_bins / (2. * numpy.pi)
+        ).astype(int) % self.num_azimuth_bins
+
+        cells = numpy.column_stack((voxels, polar_bins, azimuth_bins))
+        return cells, in_bounds
+
+    def GetScores(self, manipulator, poses):
+        """
+        Look up the reachability score of end-effector poses.
+
+        @param manipulator the manipulator, used for its base frame
+        @param poses (n, 4, 4) array of end-effector poses in the world frame
+        @return (n,) array of scores in [0, 1]; zero is unreachable
+        """
+        poses = numpy.reshape(poses, (-1, 4, 4))
+        base_inv = numpy.linalg.inv(manipulator.GetBase().GetTransform())
+        relative_poses = numpy.einsum('ij,njk->nik', base_inv, poses)
+
+        cells, in_bounds = self._GetCells(relative_poses)
+        scores = numpy.zeros(poses.shape[0])
+        scores[in_bounds] = self.scores[tuple(cells[in_bounds].T)] / 255.
+        return scores
+
+    def GetScore(self, manipulator, pose):
+        """
+        Look up the reachability score of an end-effector pose.
+
+        @param manipulator the manipulator, used for its base frame
+        @param pose 4x4 end-effector pose in the world frame
+        @return score in [0, 1]; zero is unreachable
+        """
+        return self.GetScores(manipulator, pose)[0]
+
+    def IsReachable(self, manipulator, pose, min_score=0.):
+        """
+        Check whether an end-effector pose is likely to be reachable.
+
+        @param manipulator the manipulator, used for its base frame
+        @param pose 4x4 end-effector pose in the world frame
+        @param min_score poses with a score at or below this are unreachable
+        @return True if the pose is likely to be reachable
+        """
+        return self.GetScore(manipulator, pose) > min_score
+
+    def SampleTSRChain(self, manipulator, tsrchain, max_attempts=100,
+                       min_score=0., bias=False, rng=None, sampler=None):
+        """
+        Sample a reachable end-effector pose from a TSR chain.
+
+        Samples are drawn from the chain until one has a score above
+        min_score. If bias is True, samples are additionally accepted with a
+        probability equal to their score, which favors well-reachable poses.
+
+        @param manipulator the manipulator, used for its base frame
+        @param tsrchain TSR chain to sample from
+        @param max_attempts maximum number of samples to draw
+        @param min_score poses with a score at or below this are rejected
+        @param bias accept samples with probability equal to their score
+        @param rng optional numpy.random.RandomState
+        @param sampler optional TSRSampler used to sample the chain
+        @return 4x4 pose, or None if no reachable sample was found
+        """
+        if rng is None:
+            rng = numpy.random
+
+        for _ in xrange(max_attempts):
+            pose = tsrchain.sample(sampler=sampler)
+            score = self.GetScore(manipulator, pose)
+
+            if score > min_score and (not bias or rng.random_sample() < score):
+                return pose
+
+        return None
+
+
+def _Dilate(counts):
+    # Take the maximum over the 3x3x3 neighborhood of each voxel, separately
+    # for each tool direction bin. The maximum filter is separable, so this
+    # is done one position axis at a time.
+    dilated = numpy.copy(counts)
+    for axis in xrange(3):
+        lower = [slice(None)] * counts.ndim
+        upper = [slice(None)] * counts.ndim
+        lower[axis] = slice(0, -1)
+        upper[axis] = slice(1, None)
+        lower, upper = tuple(lower), tuple(upper)
+
+        current = numpy.copy(dilated)
+        numpy.maximum(dilated[lower], current[upper], out=dilated[lower])
+        numpy.maximum(dilated[upper], current[lower], out=dilated[upper])
+    return dilated
+
+
+def main(argv=None):
+    """
+    Build a reachability map from a robot model and save it to disk.
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Build the reachability map of a manipulator.')
+    parser.add_argument('model', help='OpenRAVE robot or environment file')
+    parser.add_argument('manipulator', help='name of the manipulator')
+    parser.add_argument('output', help='output .npz file')
+    parser.add_argument('--robot', default=None,
+                        help='name of the robot; defaults to the first robot')
+    parser.add_argument('--samples', type=int, default=100000,
+                        help='number of random configurations to sample')
+    parser.add_argument('--resolution', type=float, default=0.05,
+                        help='voxel edge length in meters')
+    parser.add_argument('--polar-bins', type=int, default=8,
+                        help='number of polar tool direction bins')
+    parser.add_argument('--azimuth-bins', type=int, default=16,
+                        help='number of azimuthal tool direction bins')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='random seed')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+
+    env = openravepy.Environment()
+    try:
+        with env:
+            if not env.Load(args.model):
+                parser.error('Failed to load "{:s}".'.format(args.model))
+
+            if args.robot is not None:
+                robot = env.GetRobot(args.robot)
+            else:
+                robot = next(iter(env.GetRobots()), None)
+            if robot is None:
+                parser.error('There is no robot to build a map for.')
+
+            manipulator = robot.GetManipulator(args.manipulator)
+            if manipulator is None:
+                parser.error('Robot "{:s}" has no manipulator "{:s}".'.format(
+                    robot.GetName(), args.manipulator))
+
+            reachability_map = ReachabilityMap.Build(
+                manipulator, num_samples=args.samples,
+                position_resolution=args.resolution,
+                num_polar_bins=args.polar_bins,
+                num_azimuth_bins=args.azimuth_bins,
+                rng=numpy.random.RandomState(args.seed))
+
+        reachability_map.Save(args.output)
+        logger.info('Saved a %s reachability map to "%s".',
+                    'x'.join(str(n) for n in reachability_map.scores.shape),
+                    args.output)
+    finally:
+        env.Destroy()
+
+
+if __name__ == '__main__':
+    main()
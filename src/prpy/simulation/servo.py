@@ -28,11 +28,69 @@
 # ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
 # POSSIBILITY OF SUCH DAMAGE.
 
-import atexit, logging, numpy, openravepy, threading, time
+import collections, logging, math, numpy, openravepy, threading, time
+from ..util import GetKinematicLimits
+
+logger = logging.getLogger(__name__)
+
+ServoStatistics = collections.namedtuple('ServoStatistics', [
+    'num_ticks', 'num_overruns', 'rate', 'jitter', 'max_latency'])
+"""
+Timing statistics of a ServoSimulator: the number of ticks, the number of
+deadlines that were missed, the achieved rate in Hz, the standard deviation
+of the tick period (jitter) and the largest delay of a tick past its
+deadline, both in seconds.
+"""
+
+
+class _ServoState(object):
+    def __init__(self, manip):
+        self.manip = manip
+        self.indices = numpy.array(manip.GetArmIndices(), dtype=int)
+        self.num_dofs = len(self.indices)
+        self.q_dot = numpy.zeros(self.num_dofs)
+        self.running = False
+        self.watchdog = time.time()
+        self.start_time = self.watchdog
+        self.lower = None
+        self.upper = None
+        self.velocity = None
+
+    def UpdateLimits(self):
+        limits = GetKinematicLimits(self.manip.GetRobot())
+        self.lower = limits.lower[self.indices]
+        self.upper = limits.upper[self.indices]
+        self.velocity = limits.velocity[self.indices]
+
 
 class ServoSimulator(object):
     def __init__(self, manip, rate, watchdog_timeout):
-        self.manip = manip
+        """
+        Simulate velocity control of one or more manipulators.
+
+        All manipulators are integrated in one thread, which wakes up at
+        absolute deadlines so the servo period does not drift. Deadlines that
+        are missed are skipped, rather than run back-to-back, and each tick
+        integrates over the time that actually elapsed since the previous
+        tick or, for a motion that just started, since its first velocity
+        command. Joint and velocity limits are read when a velocity is set,
+        not on every tick.
+
+        @param manip manipulator, or list of manipulators, to servo
+        @param rate servo rate, in Hz
+        @param watchdog_timeout stop a manipulator that has not received a
+                                velocity command for this long, in seconds
+        """
+        if isinstance(manip, (list, tuple)):
+            manips = list(manip)
+        else:
+            manips = [manip]
+
+        if not manips:
+            raise ValueError('There must be at least one manipulator.')
+
+        self.manip = manips[0]
+        self.manips = manips
 
         # enabling threading and the following lines causes robot (and hence 
         # the environment) to not be garbage collected. It seems that threading
@@ -40,22 +98,21 @@ class ServoSimulator(object):
         #self.robot = self.manip.GetRobot()
         #self.env = self.robot.GetEnv()
 
-        self.indices = self.manip.GetArmIndices()
-        self.num_dofs = len(self.indices)
-        self.q_dot = numpy.zeros(self.num_dofs)
+        self._states = [_ServoState(m) for m in manips]
+        self.indices = self._states[0].indices
+        self.num_dofs = self._states[0].num_dofs
 
-        self.running = False
-        self.watchdog = time.time()
         self.watchdog_timeout = watchdog_timeout
 
         self.period = 1.0 / rate
-        self.timer = None
         self.mutex = threading.Lock()
         self.event = threading.Event()
+        self.ResetStatistics()
 
         self.Start()
 
     def Start(self):
+        self.event.clear()
         self.thread = threading.Thread(target=self.Step)
         self.thread.daemon = True
         self.thread.start()
@@ -64,64 +121,186 @@ class ServoSimulator(object):
         self.event.set()
         self.thread.join()
 
-    def SetVelocity(self, q_dot):
-        with self.manip.GetRobot().GetEnv():
-            q_dot_limits = self.manip.GetRobot().GetDOFVelocityLimits(self.indices)
+    def _GetState(self, manip):
+        if manip is None:
+            return self._states[0]
+
+        for state in self._states:
+            if state.manip == manip:
+                return state
+
+        raise ValueError('Manipulator "{:s}" is not being servoed.'.format(
+            manip.GetName()))
+
+    def SetVelocity(self, q_dot, manip=None):
+        """
+        Set the joint velocity of a manipulator.
+
+        @param q_dot joint velocity of the manipulator's arm DOFs
+        @param manip manipulator; defaults to the first manipulator
+        """
+        state = self._GetState(manip)
+
+        with state.manip.GetRobot().GetEnv():
+            state.UpdateLimits()
 
-        if not (numpy.abs(q_dot) <= q_dot_limits).all():
+        if not (numpy.abs(q_dot) <= state.velocity).all():
             raise openravepy.openrave_exception('Desired velocity exceeds limits.')
 
         with self.mutex:
-            if (q_dot != numpy.zeros(self.num_dofs)).any():
-                self.q_dot = numpy.array(q_dot, dtype='float')
-                self.watchdog = time.time()
-                self.running = True
+            if (q_dot != numpy.zeros(state.num_dofs)).any():
+                state.q_dot = numpy.array(q_dot, dtype='float')
+                state.watchdog = time.time()
+                if not state.running:
+                    state.start_time = state.watchdog
+                state.running = True
             else:
-                self.running = False
+                state.running = False
+
+    def GetStatistics(self):
+        """
+        Get the timing statistics of the servo loop.
+
+        @return ServoStatistics
+        """
+        with self.mutex:
+            if self._num_periods > 0:
+                rate = 1.0 / self._mean_period
+            else:
+                rate = 0.
+
+            if self._num_periods > 1:
+                jitter = math.sqrt(self._m2_period / (self._num_periods - 1))
+            else:
+                jitter = 0.
+
+            return ServoStatistics(
+                num_ticks=self._num_ticks, num_overruns=self._num_overruns,
+                rate=rate, jitter=jitter, max_latency=self._max_latency)
+
+    def ResetStatistics(self):
+        with self.mutex:
+            self._num_ticks = 0
+            self._num_overruns = 0
+            self._num_periods = 0
+            self._mean_period = 0.
+            self._m2_period = 0.
+            self._max_latency = 0.
+
+    def _RecordTick(self, now, deadline, last_time):
+        with self.mutex:
+            self._num_ticks += 1
+            self._max_latency = max(self._max_latency, now - deadline)
+
+            # Welford's running mean and variance of the period.
+            if last_time is not None:
+                period = now - last_time
+                self._num_periods += 1
+                delta = period - self._mean_period
+                self._mean_period += delta / self._num_periods
+                self._m2_period += delta * (period - self._mean_period)
 
     def Step(self):
+        deadline = time.time()
+        last_time = None
+
         while True:
-            start_time = time.time()
+            now = time.time()
+            self._RecordTick(now, deadline, last_time)
+
+            commands = []
             with self.mutex:
-                # Copy the velocity for thread safety.
-                q_dot = self.q_dot.copy()
-                running = self.running
-
-                # Stop servoing when the watchdog times out.
-                if running and start_time - self.watchdog > self.watchdog_timeout:
-                    self.q_dot = numpy.zeros(self.num_dofs)
-                    self.running = False
-                    logging.warning('Servo motion timed out in %.3f seconds.', start_time - self.watchdog)
-
-            if running:
-                env = self.manip.GetRobot().GetEnv()
-                with env:
-                    try:
-                        q  = self.manip.GetDOFValues()
-                        q += self.period * q_dot
-                    except openravepy.openrave_exception as e:
-                        # Otherwise, the those threads may access the OpenRAVE
-                        # environment after it has been destroyed. This can
-                        # occur if an exception is thrown elsewhere in the code
-                        # and can generate very confusing error messages. We'll
-                        # catch the exception here and cleanly exit.
-                        if e.GetCode() == openravepy.ErrorCode.NotInitialized:
-                            self.event.set()
-                            break
+                for state in self._states:
+                    # Stop servoing when the watchdog times out.
+                    if (state.running
+                            and now - state.watchdog > self.watchdog_timeout):
+                        state.q_dot = numpy.zeros(state.num_dofs)
+                        state.running = False
+                        logger.warning(
+                            'Servo motion timed out in %.3f seconds.',
+                            now - state.watchdog)
+
+                    # Integrate from the previous tick, or from when the
+                    # motion started if that was later.
+                    if state.running:
+                        if last_time is None:
+                            dt = now - state.start_time
                         else:
-                            raise
+                            dt = now - max(last_time, state.start_time)
+                        dt = min(max(dt, 0.), self.watchdog_timeout)
+                        commands.append((state, dt * state.q_dot))
 
-                    # Check joint limits.
-                    sp = openravepy.Robot.SaveParameters
-                    with self.manip.GetRobot().CreateRobotStateSaver(sp.ActiveDOF | sp.ActiveManipulator):
-                        self.manip.SetActive()
-                        q_min, q_max = self.manip.GetRobot().GetActiveDOFLimits()
+            last_time = now
 
-                    if ((q_min <= q).all() and (q <= q_max).all()):
-                        self.manip.SetDOFValues(q)
+            if commands:
+                try:
+                    self._Integrate(commands)
+                except openravepy.openrave_exception as e:
+                    # Otherwise, the those threads may access the OpenRAVE
+                    # environment after it has been destroyed. This can
+                    # occur if an exception is thrown elsewhere in the code
+                    # and can generate very confusing error messages. We'll
+                    # catch the exception here and cleanly exit.
+                    if e.GetCode() == openravepy.ErrorCode.NotInitialized:
+                        self.event.set()
+                        break
                     else:
-                        self.running = False 
-                        logging.warning('Servo motion hit a joint limit.')
-            if self.event.wait(max(self.period - (time.time()-start_time), 0.)):
+                        raise
+
+            # Sleep until the next deadline. Skip the deadlines that have
+            # already passed instead of running the missed ticks in a burst.
+            deadline += self.period
+            now = time.time()
+            if now > deadline:
+                missed = int((now - deadline) / self.period) + 1
+                deadline += missed * self.period
+
+                with self.mutex:
+                    self._num_overruns += missed
+
+            if self.event.wait(max(deadline - time.time(), 0.)):
                 break
 
+    def _Integrate(self, commands):
+        # Apply the displacement of all manipulators of a robot with one read
+        # and one write of its DOF values.
+        robots = collections.OrderedDict()
+        for state, delta_q in commands:
+            robot = state.manip.GetRobot()
+            key = robot.GetEnvironmentId()
+            robots.setdefault(key, (robot, []))[1].append((state, delta_q))
+
+        stopped = []
+        for robot, robot_commands in robots.itervalues():
+            indices = numpy.concatenate(
+                [state.indices for state, _ in robot_commands])
+            delta_q = numpy.concatenate(
+                [delta_q for _, delta_q in robot_commands])
+            lower = numpy.concatenate(
+                [state.lower for state, _ in robot_commands])
+            upper = numpy.concatenate(
+                [state.upper for state, _ in robot_commands])
+
+            with robot.GetEnv():
+                q = robot.GetDOFValues(indices) + delta_q
+
+                # Check joint limits.
+                within_limits = (lower <= q) & (q <= upper)
+                update = numpy.zeros(len(indices), dtype=bool)
+                offset = 0
+                for state, _ in robot_commands:
+                    dofs = slice(offset, offset + state.num_dofs)
+                    if within_limits[dofs].all():
+                        update[dofs] = True
+                    else:
+                        stopped.append(state)
+                    offset += state.num_dofs
+
+                if update.any():
+                    robot.SetDOFValues(q[update], indices[update])
+
+        if stopped:
+            with self.mutex:
+                for state in stopped:
+                    state.running = False
+            logger.warning('Servo motion hit a joint limit.')
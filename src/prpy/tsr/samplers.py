@@ -0,0 +1,172 @@
+import numpy
+import numpy.random
+
+
+class TSRSampler(object):
+    """
+    Source of points in the unit hypercube used to sample TSRs.
+
+    A TSR maps each point onto its bounds Bw, so the sampler determines how
+    the samples are spread over the TSR. Samplers are stateful and are not
+    safe to share between threads.
+    """
+    def sample(self, num_dims):
+        """
+        Draw the next point.
+
+        @param num_dims dimension of the point
+        @return (num_dims,) array of values in [0, 1)
+        """
+        raise NotImplementedError()
+
+
+class UniformSampler(TSRSampler):
+    """
+    Independent, uniformly distributed samples.
+
+    Without a seed this draws from numpy's global random state, exactly like
+    the default TSR sampling. With a seed it uses its own random state, so
+    the samples are reproducible and independent of other users of numpy's
+    global random state.
+    """
+    def __init__(self, seed=None):
+        """
+        @param seed optional seed of the random stream
+        """
+        if seed is None:
+            self.rng = numpy.random
+        else:
+            self.rng = numpy.random.RandomState(seed)
+
+    def sample(self, num_dims):
+        return self.rng.random_sample(num_dims)
+
+
+class _SequenceSampler(TSRSampler):
+    def __init__(self, seed=None):
+        self.seed = seed
+        self._sequences = {}
+
+    def _CreateSequence(self, num_dims):
+        raise NotImplementedError()
+
+    def sample(self, num_dims):
+        if num_dims == 0:
+            return numpy.zeros(0)
+
+        if num_dims not in self._sequences:
+            sequence = self._CreateSequence(num_dims)
+
+            # Randomly shift the sequence modulo one (a Cranley-Patterson
+            # rotation). This preserves its low discrepancy.
+            if self.seed is not None:
+                rng = numpy.random.RandomState(self.seed)
+                shift = rng.random_sample(num_dims)
+            else:
+                shift = None
+
+            self._sequences[num_dims] = (sequence, shift)
+
+        sequence, shift = self._sequences[num_dims]
+        point = next(sequence)
+        if shift is not None:
+            point = numpy.mod(point + shift, 1.)
+        return point
+
+
+class HaltonSampler(_SequenceSampler):
+    """
+    Samples from the Halton low-discrepancy sequence, which covers the TSR
+    more evenly than independent uniform samples.
+    """
+    def __init__(self, seed=None):
+        """
+        @param seed optional seed of a random shift applied to the sequence;
+                    without a seed the sequence is deterministic
+        """
+        super(HaltonSampler, self).__init__(seed=seed)
+
+    def _CreateSequence(self, num_dims):
+        from prpy.util import HaltonSequence
+        return HaltonSequence(num_dims)
+
+
+class SobolSampler(_SequenceSampler):
+    """
+    Samples from the Sobol low-discrepancy sequence, which covers the TSR
+    more evenly than independent uniform samples. Supports at most 24
+    dimensions, i.e. chains of up to four fully unconstrained TSRs.
+    """
+    def __init__(self, seed=None):
+        """
+        @param seed optional seed of a random shift applied to the sequence;
+                    without a seed the sequence is deterministic
+        """
+        super(SobolSampler, self).__init__(seed=seed)
+
+    def _CreateSequence(self, num_dims):
+        from prpy.util import SobolSequence
+        return SobolSequence(num_dims)
+
+
+class StratifiedSampler(TSRSampler):
+    """
+    Latin hypercube samples. The unit interval of each dimension is divided
+    into num_strata strata; each block of num_strata consecutive samples
+    draws exactly one value, at a random offset, from every stratum of every
+    dimension.
+    """
+    def __init__(self, num_strata=16, seed=None):
+        """
+        @param num_strata number of strata per dimension
+        @param seed optional seed of the random stream
+        """
+        if num_strata < 1:
+            raise ValueError('There must be at least one stratum.')
+
+        self.num_strata = num_strata
+        self.rng = numpy.random.RandomState(seed)
+        self._blocks = {}
+
+    def sample(self, num_dims):
+        strata, index = self._blocks.get(num_dims, (None, self.num_strata))
+
+        if index == self.num_strata:
+            strata = numpy.array([self.rng.permutation(self.num_strata)
+                                  for _ in xrange(num_dims)]).reshape(
+                                      num_dims, self.num_strata)
+            index = 0
+
+        self._blocks[num_dims] = (strata, index + 1)
+
+        offsets = self.rng.random_sample(num_dims)
+        return (strata[:, index] + offsets) / self.num_strata
+
+
+SAMPLERS = {
+    'uniform': UniformSampler,
+    'halton': HaltonSampler,
+    'sobol': SobolSampler,
+    'stratified': StratifiedSampler,
+}
+
+
+def CreateSampler(sampler, seed=None):
+    """
+    Create a TSR sampler by name.
+
+    @param sampler name of the sampler (one of the keys of SAMPLERS) or a
+                   TSRSampler, which is returned unchanged
+    @param seed optional seed passed to the sampler's constructor
+    @return TSRSampler
+    """
+    if isinstance(sampler, TSRSampler):
+        return sampler
+
+    try:
+        sampler_type = SAMPLERS[sampler]
+    except KeyError:
+        raise ValueError('Unknown TSR sampler "{:s}"; expected one of: {:s}.'
+                         .format(sampler, ', '.join(sorted(SAMPLERS))))
+
+    return sampler_type(seed=seed)
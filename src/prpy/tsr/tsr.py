@@ -27,6 +27,7 @@
 # POSSIBILITY OF SUCH DAMAGE.
 
 import openravepy
+import copy
 import numpy
 import numpy.random
 import prpy.util
@@ -36,6 +37,18 @@ NANBW = numpy.ones(6)*float('nan')
 EPSILON = 0.001
 
 
+def _format_values(values, format='%.5f', compact=False):
+    """
+    Formats an array as a space-separated string with a single formatting
+    operation. The compact format uses the shortest string that converts
+    back to exactly the same double.
+    """
+    values = numpy.asarray(values, dtype=float).reshape(-1).tolist()
+    if compact:
+        return ' '.join(map(repr, values))
+    return ' '.join((format,) * len(values)) % tuple(values)
+
+
 class TSR(object):
     """ A Task-Space-Region (TSR) represents a motion constraint. """
     def __init__(self, T0_w=None, Tw_e=None, Bw=None,
@@ -47,17 +60,38 @@ class TSR(object):
         if Bw is None:
             Bw = numpy.zeros((6, 2))
 
-        self.T0_w = numpy.array(T0_w)
-        self.Tw_e = numpy.array(Tw_e)
-        self.Bw = numpy.array(Bw)
+        self._serialized = {}
+        self.T0_w = T0_w
+        self.Tw_e = Tw_e
+        self.Bw = Bw
+
+        if manip is None:
+            self.manipindex = -1
+        elif type(manip) == openravepy.openravepy_int.Robot:
+            self.manipindex = manip.GetActiveManipulatorIndex()
+        else:
+            self.manipindex = manip
+        self.bodyandlink = bodyandlink
 
-        if numpy.any(self.Bw[0:3, 0] > self.Bw[0:3, 1]):
+    @property
+    def Bw(self):
+        """
+        Bounds of the TSR in [x y z roll pitch yaw], one [min, max] row per
+        dimension. The array is read-only; assign new bounds to change them.
+        """
+        return self._Bw
+
+    @Bw.setter
+    def Bw(self, Bw):
+        Bw = numpy.array(Bw, dtype=float)
+
+        if numpy.any(Bw[0:3, 0] > Bw[0:3, 1]):
             raise ValueError('Bw translation bounds must be [min, max]', Bw)
 
         # We will now create a continuous version of the bound to maintain:
         # 1. Bw[i,1] > Bw[i,0] which is necessary for LBFGS-B
         # 2. signed rotations, necessary for expressiveness
-        Bw_cont = numpy.copy(self.Bw)
+        Bw_cont = numpy.copy(Bw)
 
         Bw_interval = Bw_cont[3:6, 1] - Bw_cont[3:6, 0]
         Bw_interval = numpy.minimum(Bw_interval, 2*pi)
@@ -66,15 +100,68 @@ class TSR(object):
         Bw_cont[3:6, 0] = wrap_to_interval(Bw_cont[3:6, 0])
         Bw_cont[3:6, 1] = Bw_cont[3:6, 0] + Bw_interval
 
+        Bw.flags.writeable = False
+        self._Bw = Bw
         self._Bw_cont = Bw_cont
+        self._serialized.clear()
 
-        if manip is None:
-            self.manipindex = -1
-        elif type(manip) == openravepy.openravepy_int.Robot:
-            self.manipindex = manip.GetActiveManipulatorIndex()
-        else:
-            self.manipindex = manip
-        self.bodyandlink = bodyandlink
+    @property
+    def T0_w(self):
+        """
+        Transform of the TSR's reference frame. The array is read-only; assign
+        a new transform to change it.
+        """
+        return self._T0_w
+
+    @T0_w.setter
+    def T0_w(self, T0_w):
+        self._T0_w = numpy.array(T0_w, dtype=float)
+        self._T0_w.flags.writeable = False
+        self._T0_w_inv = None
+        self._serialized.clear()
+
+    @property
+    def T0_w_inv(self):
+        """ Cached inverse of T0_w. """
+        if self._T0_w_inv is None:
+            self._T0_w_inv = TSR.invert_trans(self._T0_w)
+        return self._T0_w_inv
+
+    @property
+    def Tw_e(self):
+        """
+        Transform of the end-effector relative to the TSR's frame. The array
+        is read-only; assign a new transform to change it.
+        """
+        return self._Tw_e
+
+    @Tw_e.setter
+    def Tw_e(self, Tw_e):
+        self._Tw_e = numpy.array(Tw_e, dtype=float)
+        self._Tw_e.flags.writeable = False
+        self._Tw_e_inv = None
+        self._serialized.clear()
+
+    @property
+    def Tw_e_inv(self):
+        """ Cached inverse of Tw_e. """
+        if self._Tw_e_inv is None:
+            self._Tw_e_inv = TSR.invert_trans(self._Tw_e)
+        return self._Tw_e_inv
+
+    @staticmethod
+    def invert_trans(trans):
+        """
+        Inverts a rigid transformation matrix using the transpose of its
+        rotation, which is cheaper and more accurate than a general inverse.
+        @param trans 4x4 rigid transformation matrix
+        @return inv 4x4 read-only inverse transformation matrix
+        """
+        inv = numpy.eye(4)
+        inv[0:3, 0:3] = trans[0:3, 0:3].T
+        inv[0:3, 3] = -numpy.dot(inv[0:3, 0:3], trans[0:3, 3])
+        inv.flags.writeable = False
+        return inv
 
     @staticmethod
     def rot_to_rpy(rot):
@@ -154,6 +241,31 @@ class TSR(object):
         trans[0:3, 0:3] = rot
         return trans
 
+    @staticmethod
+    def xyzrpy_to_trans_batch(xyzrpy):
+        """
+        Converts an array of xyzrpy to transformation matrices
+        @param xyzrpy (n, 6) array of xyzrpy vectors
+        @return trans (n, 4, 4) array of transformation matrices
+        """
+        xyzrpy = numpy.asarray(xyzrpy, dtype=float)
+        cr, cp, cy = numpy.cos(xyzrpy[:, 3:6]).T
+        sr, sp, sy = numpy.sin(xyzrpy[:, 3:6]).T
+
+        trans = numpy.zeros((xyzrpy.shape[0], 4, 4))
+        trans[:, 0:3, 3] = xyzrpy[:, 0:3]
+        trans[:, 3, 3] = 1.0
+        trans[:, 0, 0] = cp*cy
+        trans[:, 1, 0] = cp*sy
+        trans[:, 2, 0] = -sp
+        trans[:, 0, 1] = sr*sp*cy - cr*sy
+        trans[:, 1, 1] = sr*sp*sy + cr*cy
+        trans[:, 2, 1] = sr*cp
+        trans[:, 0, 2] = cr*sp*cy + sr*sy
+        trans[:, 1, 2] = cr*sp*sy - sr*cy
+        trans[:, 2, 2] = cr*cp
+        return trans
+
     @staticmethod
     def xyz_within_bounds(xyz, Bw):
         """
@@ -276,17 +388,26 @@ class TSR(object):
         trans = reduce(numpy.dot, [self.T0_w, Tw, self.Tw_e])
         return trans
 
+    def to_transforms(self, xyzrpys):
+        """
+        Converts an array of [x y z roll pitch yaw] into end-effector
+        transforms. Unlike to_transform, the samples are not validated.
+
+        @param  xyzrpys (n, 6) array of [x y z roll pitch yaw]
+        @return trans (n, 4, 4) array of transforms
+        """
+        Tw = TSR.xyzrpy_to_trans_batch(xyzrpys)
+        return numpy.einsum('ij,njk,kl->nil', self.T0_w, Tw, self.Tw_e)
+
     def to_xyzrpy(self, trans):
         """
         Converts an end-effector transform to xyzrpy values
         @param  trans  4x4 transform
         @return xyzrpy 6x1 vector of Bw values
         """
-        Tw = reduce(numpy.dot, [numpy.linalg.inv(self.T0_w),
-                                trans,
-                                numpy.linalg.inv(self.Tw_e)])
+        Tw = reduce(numpy.dot, [self.T0_w_inv, trans, self.Tw_e_inv])
         xyz, rot = Tw[0:3, 3], Tw[0:3, 0:3]
-        rpycheck, rpy = TSR.rot_within_rpy_bounds(rot, self._Bw_cont)
+        rpycheck, rpy = TSR.rot_within_rpy_bounds(rot, self._Bw_cont[3:6, :])
         if not all(rpycheck):
             rpy = TSR.rot_to_rpy(rot)
         return numpy.hstack((xyz, rpy))
@@ -361,39 +482,75 @@ class TSR(object):
                                 bounds=bwbounds, approx_grad=True)
         return dist, bwopt
 
-    def sample_xyzrpy(self, xyzrpy=NANBW):
+    def sample_xyzrpy(self, xyzrpy=NANBW, sampler=None):
         """
         Samples from Bw to generate an xyzrpy sample
         Can specify some values optionally as NaN.
 
         @param xyzrpy   (optional) a 6-vector of Bw with float('nan') for
                         dimensions to sample uniformly.
+        @param sampler  (optional) TSRSampler that generates the samples;
+                        defaults to uniform samples from numpy.random
         @return         an xyzrpy sample
         """
+        if sampler is None:
+            check = self.is_valid(xyzrpy, ignoreNAN=True)
+            if not all(check):
+                raise ValueError('xyzrpy must be within bounds', check)
+
+            Bw_sample = numpy.array([self._Bw_cont[i, 0] +
+                                    (self._Bw_cont[i, 1] -
+                                     self._Bw_cont[i, 0]) *
+                                    numpy.random.random_sample()
+                                    if numpy.isnan(x) else x
+                                    for i, x in enumerate(xyzrpy)])
+            # Unwrap rpy to [-pi, pi]
+            from prpy.util import wrap_to_interval
+            Bw_sample[3:6] = wrap_to_interval(Bw_sample[3:6])
+            return Bw_sample
+
+        unit_sample = sampler.sample(int(numpy.isnan(xyzrpy).sum()))
+        return self._scale_xyzrpy(xyzrpy, unit_sample)
+
+    def _scale_xyzrpy(self, xyzrpy, unit_sample):
+        """
+        Fills in the NaN values of xyzrpy by scaling values in [0, 1) to Bw.
+        """
         check = self.is_valid(xyzrpy, ignoreNAN=True)
         if not all(check):
             raise ValueError('xyzrpy must be within bounds', check)
 
-        Bw_sample = numpy.array([self._Bw_cont[i, 0] +
-                                (self._Bw_cont[i, 1] - self._Bw_cont[i, 0]) *
-                                numpy.random.random_sample()
-                                if numpy.isnan(x) else x
-                                for i, x in enumerate(xyzrpy)])
+        Bw_sample = numpy.array(xyzrpy, dtype=float)
+        free = numpy.isnan(Bw_sample)
+        Bw_lower = self._Bw_cont[free, 0]
+        Bw_sample[free] = Bw_lower + (self._Bw_cont[free, 1] -
+                                      Bw_lower) * unit_sample
         # Unwrap rpy to [-pi, pi]
         from prpy.util import wrap_to_interval
         Bw_sample[3:6] = wrap_to_interval(Bw_sample[3:6])
         return Bw_sample
 
-    def sample(self, xyzrpy=NANBW):
+    def sample(self, xyzrpy=NANBW, sampler=None):
         """
         Samples from Bw to generate an end-effector transform.
         Can specify some Bw values optionally.
 
         @param xyzrpy   (optional) a 6-vector of Bw with float('nan') for
                         dimensions to sample uniformly.
+        @param sampler  (optional) TSRSampler that generates the samples;
+                        defaults to uniform samples from numpy.random
         @return         4x4 transform
         """
-        return self.to_transform(self.sample_xyzrpy(xyzrpy))
+        return self.to_transform(self.sample_xyzrpy(xyzrpy, sampler=sampler))
+
+    def copy(self):
+        """
+        Create a copy of this TSR. The read-only arrays are shared, so this is
+        much cheaper than constructing a new TSR.
+        """
+        tsr = copy.copy(self)
+        tsr._serialized = dict(self._serialized)
+        return tsr
 
     def to_dict(self):
         """ Convert this TSR to a python dict. """
@@ -448,6 +605,27 @@ class TSR(object):
         x_dict = yaml.safe_load(x, *args, **kw_args)
         return TSR.from_dict(x_dict)
 
+    def serialize(self, compact=False):
+        """
+        Serializes this TSR in the format used by the CBiRRT and OMPL
+        planners. The result is cached until the TSR is modified.
+
+        @param compact use the shortest representation that exactly preserves
+                       each value, instead of five decimal places
+        @return string
+        """
+        header = '%d %s' % (self.manipindex, self.bodyandlink)
+        cached = self._serialized.get(compact)
+        if cached is not None and cached[0] == header:
+            return cached[1]
+
+        serialized = ' '.join([
+            header,
+            _format_values(self.T0_w[0:3, :].T, compact=compact),
+            _format_values(self.Tw_e[0:3, :].T, compact=compact),
+            _format_values(self.Bw, compact=compact)])
+        self._serialized[compact] = (header, serialized)
+        return serialized
 
 class TSRChain(object):
 
@@ -480,6 +658,7 @@ class TSRChain(object):
         else:
             self.mimicbodyjoints = mimicbodyjoints
         self.TSRs = []
+        self._serialized = {}
         if TSR is not None:
             self.append(TSR)
         if TSRs is not None:
@@ -489,6 +668,17 @@ class TSRChain(object):
     def append(self, tsr):
         self.TSRs.append(tsr)
 
+    def copy(self):
+        """
+        Create a copy of this TSR chain and its TSRs, which can be modified
+        without affecting this chain.
+        """
+        chain = copy.copy(self)
+        chain.mimicbodyjoints = list(self.mimicbodyjoints)
+        chain.TSRs = [tsr.copy() for tsr in self.TSRs]
+        chain._serialized = dict(self._serialized)
+        return chain
+
     def to_dict(self):
         """ Construct a TSR chain from a python dict. """
         return {
@@ -544,6 +734,36 @@ class TSRChain(object):
         x_dict = yaml.safe_load(x, *args, **kw_args)
         return TSR.from_dict(x_dict)
 
+    def serialize(self, compact=False):
+        """
+        Serializes this TSR chain in the format used by the CBiRRT and OMPL
+        planners. The result is cached until the chain or its TSRs are
+        modified.
+
+        @param compact use the shortest representation that exactly preserves
+                       each value, instead of five decimal places
+        @return string
+        """
+        tsr_strings = tuple(tsr.serialize(compact) for tsr in self.TSRs)
+        key = (int(self.sample_start), int(self.sample_goal),
+               int(self.constrain), self.mimicbodyname,
+               tuple(self.mimicbodyjoints), tsr_strings)
+
+        cached = self._serialized.get(compact)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+
+        serialized = '%d %d %d %d %s %s' % (
+            key[0], key[1], key[2], len(tsr_strings), ' '.join(tsr_strings),
+            self.mimicbodyname)
+        if len(self.mimicbodyjoints) > 0:
+            serialized += ' %d %s' % (
+                len(self.mimicbodyjoints),
+                ' '.join('%d' % j for j in self.mimicbodyjoints))
+
+        self._serialized[compact] = (key, serialized)
+        return serialized
+
     def is_valid(self, xyzrpy_list, ignoreNAN=False):
         """
         Checks if a xyzrpy list is a valid sample from the TSR.
@@ -574,43 +794,79 @@ class TSRChain(object):
             if not all(check[idx]):
                 raise ValueError('Invalid xyzrpy_list', check)
 
+        # Each TSR after the first is rooted at the end-effector frame of the
+        # previous one. The TSRs are not modified.
         T_sofar = self.TSRs[0].T0_w
-        for idx in range(len(self.TSRs)):
-            tsr_current = self.TSRs[idx]
-            tsr_current.T0_w = T_sofar
-            T_sofar = tsr_current.to_transform(xyzrpy_list[idx])
+        for tsr_current, xyzrpy in zip(self.TSRs, xyzrpy_list):
+            T_sofar = reduce(numpy.dot, [T_sofar, TSR.xyzrpy_to_trans(xyzrpy),
+                                         tsr_current.Tw_e])
+
+        return T_sofar
+
+    def to_transforms(self, xyzrpy_lists):
+        """
+        Converts an array of xyzrpy lists into end-effector transforms.
+        Unlike to_transform, the samples are not validated.
+
+        @param  xyzrpy_lists (n, len(TSRs), 6) array of xyzrpy values
+        @return trans (n, 4, 4) array of transforms
+        """
+        xyzrpy_lists = numpy.asarray(xyzrpy_lists, dtype=float)
+        num_samples = xyzrpy_lists.shape[0]
+
+        T_sofar = numpy.tile(self.TSRs[0].T0_w, (num_samples, 1, 1))
+        for idx, tsr_current in enumerate(self.TSRs):
+            Tw = TSR.xyzrpy_to_trans_batch(xyzrpy_lists[:, idx, :])
+            T_sofar = numpy.einsum('nij,njk,kl->nil', T_sofar, Tw,
+                                   tsr_current.Tw_e)
 
         return T_sofar
 
-    def sample_xyzrpy(self, xyzrpy_list=None):
+    def sample_xyzrpy(self, xyzrpy_list=None, sampler=None):
         """
         Samples from Bw to generate a list of xyzrpy samples
         Can specify some values optionally as NaN.
 
         @param xyzrpy_list   (optional) a list of Bw with float('nan') for
                         dimensions to sample uniformly.
+        @param sampler  (optional) TSRSampler that generates the samples;
+                        one point is drawn for the NaN values of all TSRs
         @return sample  a list of sampled xyzrpy
         """
 
         if xyzrpy_list is None:
             xyzrpy_list = [NANBW]*len(self.TSRs)
 
+        if sampler is None:
+            sample = []
+            for idx in range(len(self.TSRs)):
+                sample.append(self.TSRs[idx].sample_xyzrpy(xyzrpy_list[idx]))
+            return sample
+
+        # Draw a single point for the whole chain, so low-discrepancy
+        # sequences are evenly spread over the joint space of the TSRs.
+        num_free = [int(numpy.isnan(xyzrpy).sum()) for xyzrpy in xyzrpy_list]
+        unit_sample = sampler.sample(sum(num_free))
+        offsets = numpy.cumsum([0] + num_free)
+
         sample = []
         for idx in range(len(self.TSRs)):
-            sample.append(self.TSRs[idx].sample_xyzrpy(xyzrpy_list[idx]))
-
+            sample.append(self.TSRs[idx]._scale_xyzrpy(
+                xyzrpy_list[idx], unit_sample[offsets[idx]:offsets[idx + 1]]))
         return sample
 
-    def sample(self, xyzrpy_list=None):
+    def sample(self, xyzrpy_list=None, sampler=None):
         """
         Samples from the Bw chain to generate an end-effector transform.
         Can specify some Bw values optionally.
 
         @param xyzrpy_list   (optional) a list of xyzrpy with float('nan') for
                              dimensions to sample uniformly.
+        @param sampler       (optional) TSRSampler that generates the samples
         @return T0_w         4x4 transform
         """
-        return self.to_transform(self.sample_xyzrpy(xyzrpy_list))
+        return self.to_transform(self.sample_xyzrpy(xyzrpy_list,
+                                                    sampler=sampler))
 
     def distance(self, trans):
         """
@@ -29,21 +29,32 @@
 
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
-import collections, functools, logging, numpy, os.path
+import collections, functools, logging, numpy, os.path, threading
 
 logger = logging.getLogger(__name__)
 
 
 class TSRFactory(object):
     
-    def __init__(self, robot_name, obj_name, action_name):
+    def __init__(self, robot_name, obj_name, action_name, cacheable=False):
+        """
+        Decorator that registers a TSR factory function with the TSRLibrary.
+        @param robot_name name of the robot
+        @param obj_name name of the object
+        @param action_name name of the action
+        @param cacheable the TSR chains only depend on the object's pose and
+                         the robot's active manipulator, so the TSRLibrary
+                         may reuse them until the object moves
+        """
         logger.debug('Loading %s, %s, %s' % (robot_name, obj_name, action_name))
         self.robot_name = robot_name
         self.obj_name = obj_name
         self.action_name = action_name
+        self.cacheable = cacheable
 
     def __call__(self, func):
-        TSRLibrary.add_factory(func, self.robot_name, self.obj_name, self.action_name)
+        TSRLibrary.add_factory(func, self.robot_name, self.obj_name,
+                               self.action_name, cacheable=self.cacheable)
 
         #functools.wrap
         from functools import wraps
@@ -53,17 +64,100 @@ class TSRFactory(object):
         return wrapped_func
 
 
+class TSRChainTemplate(object):
+    """
+    Precompiled description of a TSR chain whose TSRs are all rooted at an
+    object's pose. The arrays are parsed once and are read-only, so a
+    template can be instantiated many times without re-parsing its source.
+    """
+    def __init__(self, Tw_es, Bws, sample_start=False, sample_goal=False,
+                 constrain=False):
+        """
+        @param Tw_es list of 4x4 end-effector offsets, one per TSR
+        @param Bws list of 6x2 bounds, one per TSR
+        @param sample_start apply constraint to start configuration sampling
+        @param sample_goal apply constraint to goal configuration sampling
+        @param constrain apply constraint over the whole trajectory
+        """
+        if len(Tw_es) != len(Bws):
+            raise ValueError('There must be one Tw_e for each Bw.')
+
+        self.Tw_es = tuple(self._read_only(Tw_e, (4, 4)) for Tw_e in Tw_es)
+        self.Bws = tuple(self._read_only(Bw, (6, 2)) for Bw in Bws)
+        self.sample_start = sample_start
+        self.sample_goal = sample_goal
+        self.constrain = constrain
+
+    @staticmethod
+    def _read_only(value, shape):
+        array = numpy.array(value, dtype=float)
+        if array.shape != shape:
+            raise ValueError('Expected an array of shape {}, got {}.'.format(
+                shape, array.shape))
+        array.flags.writeable = False
+        return array
+
+    @classmethod
+    def from_dict(cls, chain):
+        """
+        Compile a template from a chain loaded from YAML.
+        @param chain dict with a list of TSRs, each with Tw_e and Bw, and
+                     optional sample_start, sample_goal and constrain flags
+        @return TSRChainTemplate
+        """
+        return cls(Tw_es=[tsr['Tw_e'] for tsr in chain['TSRs']],
+                   Bws=[tsr['Bw'] for tsr in chain['TSRs']],
+                   sample_start=bool(chain.get('sample_start', False)),
+                   sample_goal=bool(chain.get('sample_goal', False)),
+                   constrain=bool(chain.get('constrain', False)))
+
+    def instantiate(self, T0_w, manip=-1):
+        """
+        Create a TSR chain rooted at a pose.
+        @param T0_w 4x4 pose of the object
+        @param manip index of the manipulator the TSRs apply to
+        @return TSRChain
+        """
+        from prpy.tsr.tsr import TSR, TSRChain
+
+        T0_w = numpy.array(T0_w, dtype=float)
+        tsrs = [TSR(T0_w=T0_w, Tw_e=Tw_e, Bw=Bw, manip=manip)
+                for Tw_e, Bw in zip(self.Tw_es, self.Bws)]
+        return TSRChain(sample_start=self.sample_start,
+                        sample_goal=self.sample_goal,
+                        constrain=self.constrain, TSRs=tsrs)
+
+    def __call__(self, robot, obj):
+        return [self.instantiate(obj.GetTransform(),
+                                 robot.GetActiveManipulatorIndex())]
+
+
 class TSRLibrary(object):
     all_factories = collections.defaultdict(lambda: collections.defaultdict(dict))
+    cacheable_factories = set()
     generic_kinbody_key = "_*"  # Something that is unlikely to be an actual kinbody name
     
-    def __init__(self, robot, robot_name=None):
+    def __init__(self, robot, robot_name=None, max_cache_size=1000):
         """
         Create a TSRLibrary for a robot.
+
+        The object type of each KinBody is inferred once and remembered.
+        The TSR chains returned by cacheable factories (including those
+        loaded from YAML) are reused until the object moves.
+
         @param robot the robot to store TSRs for
         @param robot_name optional robot name, inferred from robot by default
+        @param max_cache_size maximum number of (object, action) pairs whose
+                              TSR chains are cached
         """
         self.robot = robot
+        self.max_cache_size = max_cache_size
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+        self._object_types = {}
+        self._chain_cache = collections.OrderedDict()
+        self._lock = threading.Lock()
 
         if robot_name is not None:
             self.robot_name = robot_name
@@ -82,8 +176,7 @@ class TSRLibrary(object):
         """
         kinbody_name = kw_args.get('kinbody_name', None)
         if kinbody_name is None and kinbody is not None:
-            kinbody_name = self.get_object_type(kinbody)
-            logger.debug('Inferred KinBody name "%s" for TSR.', kinbody_name)
+            kinbody_name = self._get_cached_object_type(kinbody)
 
         f = None
         try:
@@ -101,9 +194,74 @@ class TSRLibrary(object):
        
         if kinbody is None:
             return f(self.robot, *args, **kw_args)
+        elif f in self.cacheable_factories:
+            return self._call_cached(f, kinbody, action_name, args, kw_args)
         else:
             return f(self.robot, kinbody, *args, **kw_args)
 
+    def _get_cached_object_type(self, body):
+        key = (body.GetName(), body.GetEnvironmentId())
+
+        with self._lock:
+            kinbody_name = self._object_types.get(key)
+
+        if kinbody_name is None:
+            kinbody_name = self.get_object_type(body)
+            logger.debug('Inferred KinBody name "%s" for TSR.', kinbody_name)
+
+            with self._lock:
+                self._object_types[key] = kinbody_name
+
+        return kinbody_name
+
+    def _call_cached(self, f, kinbody, action_name, args, kw_args):
+        T0_w = kinbody.GetTransform()
+        key = (f, kinbody.GetName(), kinbody.GetEnvironmentId(), action_name,
+               self.robot.GetActiveManipulatorIndex(), args,
+               tuple(sorted(kw_args.items())))
+
+        try:
+            hash(key)
+        except TypeError:
+            return f(self.robot, kinbody, *args, **kw_args)
+
+        with self._lock:
+            cached = self._chain_cache.pop(key, None)
+
+            # Discard the TSR chains if the object has moved.
+            if cached is not None and numpy.array_equal(cached[0], T0_w):
+                self.cache_hits += 1
+                self._chain_cache[key] = cached
+                templates = cached[1]
+            else:
+                templates = None
+                self.cache_misses += 1
+
+        # TSR chains are mutable, so the cache keeps private copies and
+        # returns new copies of them.
+        if templates is not None:
+            return [chain.copy() for chain in templates]
+
+        chains = f(self.robot, kinbody, *args, **kw_args)
+        templates = tuple(chain.copy() for chain in chains)
+
+        with self._lock:
+            self._chain_cache[key] = (T0_w, templates)
+            while len(self._chain_cache) > self.max_cache_size:
+                self._chain_cache.popitem(last=False)
+
+        return chains
+
+    def clear_cache(self):
+        """
+        Discard the cached object types and TSR chains.
+        """
+        with self._lock:
+            self._object_types.clear()
+            self._chain_cache.clear()
+            self.cache_hits = 0
+            self.cache_misses = 0
+
     def load_yaml(self, yaml_file):
         """
         Load a set of simple TSRFactory's from a YAML file. Each TSRFactory
@@ -111,7 +269,6 @@ class TSRLibrary(object):
         @param yaml_file path to the input YAML file
         """
         import yaml
-        from prpy.tsr.tsr import TSR, TSRChain
 
         with open(yaml_file, 'r') as f:
             yaml_data = yaml.load(f)
@@ -122,41 +279,11 @@ class TSRLibrary(object):
                 kinbody_name = chain['kinbody']
                 action_name = chain['action']
 
-                sample_start = False
-                if 'sample_start' in chain:
-                    sample_start = bool(chain['sample_start'])
-                    
-                sample_goal = False
-                if 'sample_goal' in chain:
-                    sample_goal = bool(chain['sample_goal'])
-                        
-                constrain = False
-                if 'constrain' in chain:
-                    constrain = bool(chain['constrain'])
-
-
-                @TSRFactory(robot_name, kinbody_name, action_name)
-                def func(robot, obj):
-                    manip_idx = robot.GetActiveManipulatorIndex()
-
-                    all_tsrs = []
-                    for tsr in chain['TSRs']:
-                        T0_w = obj.GetTransform()
-                        Tw_e = numpy.array(tsr['Tw_e'])
-                        Bw = numpy.array(tsr['Bw'])
-                    
-                        yaml_tsr = TSR(T0_w = T0_w, 
-                                       Tw_e = Tw_e, 
-                                       Bw = Bw, 
-                                       manip = manip_idx)
-                        all_tsrs.append(yaml_tsr)
-
-                    yaml_chain = TSRChain(sample_start=sample_start,
-                                          sample_goal = sample_goal, 
-                                          constrain = constrain, 
-                                          TSRs = all_tsrs)
-
-                    return [yaml_chain]
+                # Parse the TSRs once; the factory only instantiates them at
+                # the object's pose.
+                template = TSRChainTemplate.from_dict(chain)
+                TSRLibrary.add_factory(template, robot_name, kinbody_name,
+                                       action_name, cacheable=True)
 
             except Exception, e:
                 logger.error('Failed to load TSRChain: %s - (Chain: %s)' % (str(e), chain))
@@ -164,7 +291,8 @@ class TSRLibrary(object):
         
 
     @classmethod
-    def add_factory(cls, func, robot_name, object_name, action_name):
+    def add_factory(cls, func, robot_name, object_name, action_name,
+                    cacheable=False):
         """
         Register a TSR factory function for a particular robot, object, and
         action. The function must take a robot and a KinBody and return a list
@@ -174,6 +302,8 @@ class TSRLibrary(object):
         @param robot_name name of the robot
         @param object_name name of the object
         @param action_name name of the action
+        @param cacheable the TSR chains only depend on the object's pose and
+                         the robot's active manipulator
         """
         logger.debug('Adding TSRLibrary factory for robot "%s", object "%s", action "%s".',
             robot_name, object_name, action_name)
@@ -186,7 +316,12 @@ class TSRLibrary(object):
                            ' with robot "%s" and object "%s"',
                 action_name, robot_name, object_name)
 
+        previous = cls.all_factories[robot_name][object_name].get(action_name)
+        cls.cacheable_factories.discard(previous)
+
         cls.all_factories[robot_name][object_name][action_name] = func
+        if cacheable:
+            cls.cacheable_factories.add(func)
 
     @staticmethod
     def get_object_type(body):
@@ -29,6 +29,7 @@
 # ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
 # POSSIBILITY OF SUCH DAMAGE.
 
+import collections
 import logging
 import math
 import numpy
@@ -142,27 +143,77 @@ def GetTrajectoryIndices(traj):
         return list()
 
 
-def WaitForControllers(controllers, timeout=None, rate=20):
+def WaitForControllers(controllers, timeout=None, rate=20,
+                       min_period=0.001):
+    """
+    Wait for controllers to finish executing.
+
+    Controllers that support AddDoneCallback, e.g. the controllers in
+    prpy.controllers, wake this function up as soon as they finish. Other
+    controllers, e.g. plain OpenRAVE controllers, are polled with IsDone().
+    The polling period starts at min_period and doubles up to 1 / rate.
+    Waits are never longer than 1 / rate, so the wait can be interrupted,
+    e.g. by KeyboardInterrupt.
+
+    @param controllers controllers to wait for
+    @param timeout maximum time to wait, in seconds, or None to wait forever
+    @param rate slowest rate, in Hz, at which to poll controllers
+    @param min_period initial polling period, in seconds
+    @return True if all controllers finished, False if timeout elapsed
+    """
     running_controllers = set(controllers)
     start_time = time.time()
-    timestep = 1.0 / rate
+    max_period = 1.0 / rate
+    period = min(min_period, max_period)
+    event = threading.Event()
+
+    def wake(controller):
+        event.set()
+
+    polled_controllers = set()
+    for controller in running_controllers:
+        add_done_callback = getattr(controller, 'AddDoneCallback', None)
+        if add_done_callback is None or not add_done_callback(wake):
+            polled_controllers.add(controller)
+
+    while True:
+        # Clear the event before checking the controllers, so a controller
+        # that finishes after the check still wakes us up.
+        event.clear()
+
+        running_controllers = set(
+            controller for controller in running_controllers
+            if not controller.IsDone())
+        if not running_controllers:
+            return True
 
-    while running_controllers:
         # Check for a timeout.
-        now_time = time.time()
-        if timeout is not None and now_time - start_time > timeout:
-            return False
+        if timeout is not None:
+            remaining = timeout - (time.time() - start_time)
+            if remaining <= 0.:
+                # Don't leave callbacks behind on controllers that are still
+                # running.
+                for controller in running_controllers - polled_controllers:
+                    remove_done_callback = getattr(
+                        controller, 'RemoveDoneCallback', None)
+                    if remove_done_callback is not None:
+                        remove_done_callback(wake)
+                return False
+        else:
+            remaining = None
 
-        # Check if the trajectory is done.
-        done_controllers = set()
-        for controller in running_controllers:
-            if controller.IsDone():
-                done_controllers.add(controller)
+        if running_controllers & polled_controllers:
+            wait_time = period
+            period = min(2. * period, max_period)
+        else:
+            wait_time = max_period
 
-        running_controllers -= done_controllers
-        time.sleep(timestep)
+        # Event.wait can not be interrupted in Python 2, so always wait for a
+        # bounded time.
+        if remaining is not None:
+            wait_time = min(wait_time, remaining)
 
-    return True
+        event.wait(wait_time)
 
 
 def SetCameraFromXML(viewer, xml):
@@ -379,69 +430,77 @@ def SimplifyTrajectory(traj, robot):
     """
     Re-interpolate trajectory as minimal set of linear segments.
 
-    This function attempts to extract linear segments from the given
-    trajectory by iteratively finding extrema waypoints until a set of
-    linear segments until all of the original trajectory waypoints are
-    within the robot's joint resolutions of the interpolated segments.
+    This function extracts linear segments from the given trajectory using
+    the Ramer-Douglas-Peucker algorithm: starting from a single segment
+    between the first and last waypoints, each segment is split at the
+    waypoint that deviates furthest from it until all of the original
+    waypoints are within the robot's joint resolutions of the interpolated
+    segments. Deviations are measured per joint, from the closest point on
+    the segment.
 
     Currently, only untimed trajectories are supported!
 
     @param robot the robot that should be used for the interpolation
     @param traj input trajectory that will be simplified
-    @returns output trajectory of timed linear segments
+    @returns output trajectory of untimed linear segments
     """
-    from scipy import interpolate
-
     if traj.GetDuration() != 0.0:
         raise ValueError("Cannot handle timed trajectories yet!")
 
-    if traj.GetNumWaypoints() < 2:
+    num_waypoints = traj.GetNumWaypoints()
+    if num_waypoints < 2:
         return traj
 
     cspec = traj.GetConfigurationSpecification()
     dofs = robot.GetActiveDOFIndices()
-    idxs = range(traj.GetNumWaypoints())
-    joints = [robot.GetJointFromDOFIndex(d) for d in dofs]
-
-    times = numpy.array(
-        idxs if not traj.GetDuration() else
-        numpy.cumsum([cspec.ExtractDeltaTime(traj.GetWaypoint(i),
-                                             robot, dofs) for i in idxs]))
-    values = numpy.array(
-        [cspec.ExtractJointValues(traj.GetWaypoint(i), robot, dofs)
-         for i in idxs])
-    resolutions = numpy.array([j.GetResolution(0) for j in joints])
-
-    # Start with an extrema set of the first to the last waypoint.
-    mask = numpy.zeros(times.shape, dtype=bool)
+
+    waypoints = numpy.reshape(traj.GetWaypoints(0, num_waypoints),
+                              (num_waypoints, cspec.GetDOF()))
+    values = numpy.array([cspec.ExtractJointValues(w, robot, dofs)
+                          for w in waypoints])
+
+    # Measure deviations in units of joint resolution, so a waypoint must be
+    # kept if any joint deviates by more than one unit.
+    resolutions = GetKinematicLimits(robot).resolution[dofs]
+    values = values / resolutions
+
+    mask = numpy.zeros(num_waypoints, dtype=bool)
     mask[[0, -1]] = True
 
-    for _ in idxs:
-        # Create new interpolation set from current extrema.
-        f = interpolate.interp1d(times[mask], values[mask, :],
-                                 axis=0, kind='linear')
-        errors = numpy.abs(f(times) - values)
+    segments = [(0, num_waypoints - 1)]
+    while segments:
+        first, last = segments.pop()
+        if last - first < 2:
+            continue
+
+        # Find the closest point on the segment to each interior waypoint.
+        start = values[first]
+        delta = values[last] - start
+        offsets = values[first + 1:last] - start
 
-        # TODO: Can this be a single call?
-        # Find the extrema in the remaining waypoints.
-        max_err_idx = numpy.argmax(errors, axis=0)
-        max_err_vals = numpy.max(errors, axis=0)
+        length_sq = numpy.dot(delta, delta)
+        if length_sq > 0.:
+            alphas = numpy.clip(numpy.dot(offsets, delta) / length_sq, 0., 1.)
+        else:
+            alphas = numpy.zeros(len(offsets))
 
-        # Add any extrema that deviated more than joint resolution.
-        max_err_idx = max_err_idx[max_err_vals > resolutions]
-        mask[max_err_idx] = True
+        errors = numpy.max(
+            numpy.abs(offsets - alphas[:, numpy.newaxis] * delta), axis=1)
 
-        # If none deviated more than joint resolution, the set is complete.
-        if len(max_err_idx) < 0:
-            break
+        # Split the segment at the worst waypoint if it is not within joint
+        # resolution; otherwise the segment is complete.
+        max_err_idx = numpy.argmax(errors)
+        if errors[max_err_idx] > 1.:
+            split = first + 1 + max_err_idx
+            mask[split] = True
+            segments.append((first, split))
+            segments.append((split, last))
 
     # Return a new reduced trajectory.
-    import openravepy
     reduced_traj = openravepy.RaveCreateTrajectory(traj.GetEnv(),
                                                    traj.GetXMLId())
     reduced_traj.Init(cspec)
-    for (new_idx, old_idx) in enumerate(mask.nonzero()[0]):
-        reduced_traj.Insert(new_idx, traj.GetWaypoint(old_idx))
+    reduced_traj.Insert(0, waypoints[mask, :].ravel())
     return reduced_traj
 
 
@@ -715,7 +774,10 @@ def ComputeJointVelocityFromTwist(
 
     # Check for joint limits
     q_curr = robot.GetActiveDOFValues()
-    q_min, q_max = robot.GetActiveDOFLimits()
+    limits = GetKinematicLimits(robot)
+    active_dof_indices = robot.GetActiveDOFIndices()
+    q_min = limits.lower[active_dof_indices]
+    q_max = limits.upper[active_dof_indices]
     dq_bounds = [
         (0., max) if q_curr[i] <= q_min[i] + joint_limit_tolerance else
         (min, 0.) if q_curr[i] >= q_max[i] - joint_limit_tolerance else
@@ -836,54 +898,145 @@ def GetEuclideanDistanceBetweenTransforms(T0, T1):
     return GetEuclideanDistanceBetweenPoints(p0, p1)
 
 
-def GetMinDistanceBetweenTransformAndWorkspaceTraj(T, traj, dt=0.01):
+class WorkspaceTrajectoryIndex(object):
+    """
+    Index of the segments of a timed workspace trajectory for fast
+    closest-point queries.
+
+    The positions of the trajectory are treated as a polyline with one
+    segment between consecutive waypoints, which is exact for trajectories
+    with linear interpolation. Other trajectories are sampled at a fixed
+    resolution. Each segment is bounded by a sphere, so a query only solves
+    for the closest point on segments that could be closer than the segment
+    that contained the previous closest point.
+    """
+    def __init__(self, traj, dt=0.01):
+        """
+        @param openravepy.Trajectory traj: A timed workspace trajectory.
+        @param float dt: Resolution at which to sample along the trajectory,
+                         if it does not use linear interpolation.
+        """
+        if not IsTimedTrajectory(traj):
+            raise ValueError("Trajectory must have timing information.")
+
+        if not IsTrajectoryTypeIkParameterizationTransform6D(traj):
+            raise ValueError("Trajectory is not a workspace trajectory, it "
+                             "must have configuration specification of "
+                             "openravepy.IkParameterizationType.Transform6D")
+
+        self.traj = traj
+
+        cspec = traj.GetConfigurationSpecification()
+        group = cspec.GetGroupFromName('ikparam_values')
+        self._pose_slice = slice(group.offset, group.offset + 7)
+
+        if group.interpolation == 'linear':
+            num_waypoints = traj.GetNumWaypoints()
+            waypoints = numpy.reshape(traj.GetWaypoints(0, num_waypoints),
+                                      (num_waypoints, cspec.GetDOF()))
+            deltatime_group = cspec.GetGroupFromName('deltatime')
+            times = numpy.cumsum(waypoints[:, deltatime_group.offset])
+            positions = waypoints[:, self._pose_slice][:, 4:7]
+        else:
+            duration = traj.GetDuration()
+            times = numpy.append(numpy.arange(0., duration, dt), duration)
+            positions = numpy.array([traj.Sample(t)[self._pose_slice][4:7]
+                                     for t in times])
+
+        if positions.shape[0] == 1:
+            times = numpy.repeat(times, 2)
+            positions = numpy.repeat(positions, 2, axis=0)
+
+        self.start_times = times[:-1]
+        self.end_times = times[1:]
+        self.starts = positions[:-1]
+        self.directions = positions[1:] - positions[:-1]
+        self.centers = self.starts + 0.5 * self.directions
+
+        lengths = numpy.sqrt(numpy.sum(self.directions ** 2, axis=1))
+        self.radii = 0.5 * lengths
+        self._lengths_sq = lengths ** 2
+        self._last_segment = 0
+
+    def __len__(self):
+        return self.start_times.shape[0]
+
+    def _ClosestPoints(self, segments, x):
+        offsets = x - self.starts[segments]
+        projections = numpy.sum(offsets * self.directions[segments], axis=1)
+        lengths_sq = self._lengths_sq[segments]
+
+        u = numpy.zeros(segments.shape[0])
+        nonzero = lengths_sq > 0.
+        u[nonzero] = numpy.clip(
+            projections[nonzero] / lengths_sq[nonzero], 0., 1.)
+
+        closest = (self.starts[segments]
+                   + u[:, numpy.newaxis] * self.directions[segments])
+        distances = numpy.sqrt(numpy.sum((closest - x) ** 2, axis=1))
+        return u, distances
+
+    def GetMinDistance(self, T):
+        """
+        Find the location on the trajectory which is closest to the specified
+        transform.
+
+        The search is warm-started from the segment that contained the
+        previous closest point, which is usually the closest segment when
+        the queries follow the trajectory.
+
+        @param numpy.matrix T: A 4x4 transformation matrix.
+
+        @return (float,float) (min_dist, t_loc, T_loc) The minimum distance,
+                                             the time value along the timed
+                                             trajectory, and the transform.
+        """
+        x = numpy.asarray(T)[0:3, 3]
+
+        _, warm_distance = self._ClosestPoints(
+            numpy.array([self._last_segment]), x)
+
+        # Only segments whose bounding spheres are closer than the warm
+        # start can contain a closer point.
+        lower_bounds = (numpy.sqrt(numpy.sum((self.centers - x) ** 2, axis=1))
+                        - self.radii)
+        candidates = numpy.flatnonzero(lower_bounds <= warm_distance[0])
+        u, distances = self._ClosestPoints(candidates, x)
+
+        best = numpy.argmin(distances)
+        segment = candidates[best]
+        self._last_segment = segment
+
+        t_loc = (self.start_times[segment] + u[best] *
+                 (self.end_times[segment] - self.start_times[segment]))
+        T_loc = openravepy.matrixFromPose(
+            self.traj.Sample(t_loc)[self._pose_slice])
+        return (distances[best], t_loc, T_loc)
+
+
+def GetMinDistanceBetweenTransformAndWorkspaceTraj(T, traj, dt=0.01,
+                                                   index=None):
     """
     Find the location on a workspace trajectory which is closest
     to the specified transform.
 
+    Pass a WorkspaceTrajectoryIndex of the trajectory to answer repeated
+    queries without rebuilding the index.
+
     @param numpy.matrix T: A 4x4 transformation matrix.
     @param openravepy.Trajectory traj: A timed workspace trajectory.
-    @param float dt: Resolution at which to sample along the trajectory.
+    @param float dt: Resolution at which to sample along the trajectory,
+                     if it does not use linear interpolation.
+    @param WorkspaceTrajectoryIndex index: Optional index of traj.
 
     @return (float,float) (min_dist, t_loc, T_loc) The minimum distance,
                                          the time value along the timed
                                          trajectory, and the transform.
     """
-    if not IsTimedTrajectory(traj):
-        raise ValueError("Trajectory must have timing information.")
-
-    if not IsTrajectoryTypeIkParameterizationTransform6D(traj):
-        raise ValueError("Trajectory is not a workspace trajectory, it "
-                         "must have configuration specification of "
-                         "openravepy.IkParameterizationType.Transform6D")
-
-    def _GetError(t):
-        T_curr = openravepy.matrixFromPose(traj.Sample(t)[0:7])
-        error = GetEuclideanDistanceBetweenTransforms(T, T_curr)
-        return error
-
-    min_dist = numpy.inf
-    t_loc = 0.0
-    T_loc = None
+    if index is None:
+        index = WorkspaceTrajectoryIndex(traj, dt=dt)
 
-    # Iterate over the trajectory
-    t = 0.0
-    duration = traj.GetDuration()
-    while t < duration:
-        error = _GetError(t)
-        if error < min_dist:
-            min_dist = error
-            t_loc = t
-        t = t + dt
-    # Also check the end-point
-    error = _GetError(duration)
-    if error < min_dist:
-        min_dist = error
-        t_loc = t
-
-    T_loc = openravepy.matrixFromPose(traj.Sample(t_loc)[0:7])
-
-    return (min_dist, t_loc, T_loc)
+    return index.GetMinDistance(T)
 
 
 def FindCatkinResource(package, relative_path):
@@ -1022,7 +1175,7 @@ def IsAtConfiguration(robot, goal_config, dof_indices=None):
     # Get current position of joints
     with robot.GetEnv():
         joint_values = robot.GetDOFValues(dof_indices)
-        dof_resolutions = robot.GetDOFResolutions(dof_indices)
+        dof_resolutions = GetKinematicLimits(robot).resolution[dof_indices]
 
     # If any joint is not at the goal position, return False
     for i in xrange(0, len(goal_config)):
@@ -1227,26 +1380,31 @@ def ComputeUnitTiming(robot, traj, env=None):
     new_traj = RaveCreateTrajectory(env, '')
     new_traj.Init(new_cspec)
 
-    dof_values_prev = None
-    for i in range(traj.GetNumWaypoints()):
-        old_waypoint = traj.GetWaypoint(i)
-        dof_values = old_cspec.ExtractJointValues(
-            old_waypoint, robot, dof_indices)
-
-        if i == 0:
-            deltatime = 0.
-        else:
-            deltatime = numpy.linalg.norm(dof_values - dof_values_prev)
-
-        dof_values_prev = dof_values
-
-        new_waypoint = numpy.zeros(new_cspec.GetDOF())
-
-        new_cspec.InsertJointValues(new_waypoint, dof_values,
-                                    robot, dof_indices, 0)
-        new_cspec.InsertDeltaTime(new_waypoint, deltatime)
-        new_traj.Insert(i, new_waypoint)
-
+    num_waypoints = traj.GetNumWaypoints()
+    if num_waypoints == 0:
+        return new_traj
+
+    # Find the columns of the DOFs in both specifications by extracting
+    # their column numbers, then copy all of the waypoints at once.
+    def GetColumns(cspec):
+        columns = numpy.arange(cspec.GetDOF(), dtype=float)
+        return cspec.ExtractJointValues(
+            columns, robot, dof_indices).astype(int)
+
+    waypoints = numpy.reshape(traj.GetWaypoints(0, num_waypoints),
+                              (num_waypoints, old_cspec.GetDOF()))
+    dof_values = waypoints[:, GetColumns(old_cspec)]
+
+    deltatimes = numpy.zeros(num_waypoints)
+    deltatimes[1:] = numpy.sqrt(
+        numpy.sum(numpy.diff(dof_values, axis=0) ** 2, axis=1))
+
+    new_waypoints = numpy.zeros((num_waypoints, new_cspec.GetDOF()))
+    new_waypoints[:, GetColumns(new_cspec)] = dof_values
+    new_waypoints[:, new_cspec.GetGroupFromName('deltatime').offset] = \
+        deltatimes
+
+    new_traj.Insert(0, new_waypoints.ravel())
     return new_traj
 
 
@@ -1292,37 +1450,142 @@ def ComputeGeodesicUnitTiming(traj, env=None, alpha=1.0):
     new_cspec.AddDeltaTimeGroup()
     new_traj.Init(new_cspec)
 
-    # Get the current pose of the end effector
-    # Note: OpenRAVE pose is [qx,qy,qz,qw, tx,ty,tz]
-    #       The 8th value is velocity.
-    P_ee_prev = traj.GetWaypoint(0)[range(7)]
+    # Note: OpenRAVE pose is [qw,qx,qy,qz, tx,ty,tz]
+    cspec = traj.GetConfigurationSpecification()
+    offset = cspec.GetGroupFromName('ikparam_values').offset
+    waypoints = numpy.reshape(traj.GetWaypoints(0, num_waypoints),
+                              (num_waypoints, cspec.GetDOF()))
+    poses = waypoints[:, offset:offset + 7]
+
+    # Compute the translation and orientation deltas of all segments
+    delta_translation = numpy.sqrt(
+        numpy.sum(numpy.diff(poses[:, 4:7], axis=0) ** 2, axis=1))
+    dots = numpy.sum(poses[:-1, 0:4] * poses[1:, 0:4], axis=1)
+    delta_angle = numpy.arccos(
+        numpy.clip(2.0 * dots ** 2 - 1.0, -1.0, 1.0))
+
+    deltatimes = numpy.zeros(num_waypoints)
+    deltatimes[1:] = numpy.sqrt(
+        delta_translation ** 2 + (alpha ** 2) * (delta_angle ** 2))
+
+    # Insert all waypoints (1x7 pose, velocity) at once
+    new_traj.Insert(0, numpy.column_stack((poses, deltatimes)).ravel())
 
-    for i in range(num_waypoints):
-        P_ee = traj.GetWaypoint(i)[range(7)]  # Get 7 pose values
+    return new_traj
+
+
+KinematicLimits = collections.namedtuple('KinematicLimits', [
+    'lower', 'upper', 'velocity', 'acceleration', 'resolution', 'weights'])
+"""
+Read-only arrays of a robot's per-DOF position limits, velocity limits,
+acceleration limits, resolutions and weights, indexed by DOF index.
+"""
 
-        # Compute the translation delta
-        p0 = P_ee_prev[4:7]  # Get the x,y,z translation
-        p1 = P_ee[4:7]
-        delta_translation = numpy.sqrt(numpy.sum((p0 - p1)**2))
 
-        # Compute the orientation delta
-        q0 = P_ee_prev[0:4]  # Get qx,qy,qz,qw rotation
-        q1 = P_ee[0:4]
-        delta_angle = AngleBetweenQuaternions(q0, q1)
+def ComputeKinematicLimits(robot):
+    """
+    Query a robot's kinematic limits from OpenRAVE.
+
+    Prefer GetKinematicLimits(), which reuses the table cached by a prpy
+    Robot.
+
+    @param openravepy.robot robot: The robot.
+
+    @returns KinematicLimits: The robot's limits.
+    """
+    lower, upper = robot.GetDOFLimits()
+    arrays = [lower, upper, robot.GetDOFVelocityLimits(),
+              robot.GetDOFAccelerationLimits(), robot.GetDOFResolutions(),
+              robot.GetDOFWeights()]
+
+    for array in arrays:
+        array.flags.writeable = False
+
+    return KinematicLimits(*arrays)
+
+
+class KinematicLimitsCache(object):
+    """
+    Cache of a robot's KinematicLimits table.
 
-        dist = numpy.sqrt(delta_translation**2 + (alpha**2) * (delta_angle**2))
-        if i == 0:
-            deltatime = 0.0
+    Invalidate() only increments a version counter, so it is cheap enough to
+    call whenever the limits may have changed, e.g. from an OpenRAVE change
+    callback. The table is recomputed on the next Get() after that.
+    """
+    def __init__(self):
+        self.version = 0
+        self._cached = (None, None)
+
+    def Invalidate(self):
+        self.version += 1
+
+    def Get(self, robot):
+        """
+        Get the cached table, computing it if it was invalidated.
+
+        @param openravepy.robot robot: The robot.
+
+        @returns KinematicLimits: The robot's limits.
+        """
+        version, limits = self._cached
+        if version != self.version:
+            # If the limits change while we query them, the table is stored
+            # under the old version and recomputed on the next call.
+            version = self.version
+            limits = ComputeKinematicLimits(robot)
+            self._cached = (version, limits)
+        return limits
+
+
+class _QueriedKinematicLimits(object):
+    """
+    KinematicLimits of a robot that is not bound to prpy. Each array is
+    queried from OpenRAVE when it is first accessed, so callers that only
+    need one array make a single query.
+    """
+    _queries = {
+        'velocity': lambda robot: robot.GetDOFVelocityLimits(),
+        'acceleration': lambda robot: robot.GetDOFAccelerationLimits(),
+        'resolution': lambda robot: robot.GetDOFResolutions(),
+        'weights': lambda robot: robot.GetDOFWeights(),
+    }
+
+    def __init__(self, robot):
+        self._robot = robot
+
+    def __getattr__(self, name):
+        if name in ('lower', 'upper'):
+            self.lower, self.upper = self._robot.GetDOFLimits()
+            self.lower.flags.writeable = False
+            self.upper.flags.writeable = False
+        elif name in self._queries:
+            array = self._queries[name](self._robot)
+            array.flags.writeable = False
+            setattr(self, name, array)
         else:
-            deltatime = dist
+            raise AttributeError(name)
 
-        P_ee_prev = P_ee
+        return getattr(self, name)
 
-        # Insert a new waypoint (1x7 pose, velocity)
-        values = numpy.append(P_ee, [deltatime])
-        new_traj.Insert(i, values)
 
-    return new_traj
+def GetKinematicLimits(robot):
+    """
+    Get a robot's kinematic limits, using the cached table of a prpy Robot
+    if possible. The limits must not be modified.
+
+    For other robots, only the arrays that are accessed are queried from
+    OpenRAVE.
+
+    @param openravepy.robot robot: The robot.
+
+    @returns KinematicLimits: The robot's limits.
+    """
+    from prpy.base.robot import Robot
+
+    if isinstance(robot, Robot):
+        return robot.GetKinematicLimits()
+    else:
+        return _QueriedKinematicLimits(robot)
 
 
 def CheckJointLimits(robot, q):
@@ -1337,8 +1600,10 @@ def CheckJointLimits(robot, q):
     """
     from prpy.planning.exceptions import JointLimitError
 
-    q_limit_min, q_limit_max = robot.GetActiveDOFLimits()
+    limits = GetKinematicLimits(robot)
     active_dof_indices = robot.GetActiveDOFIndices()
+    q_limit_min = limits.lower[active_dof_indices]
+    q_limit_max = limits.upper[active_dof_indices]
 
     if len(q) != len(active_dof_indices):
         raise ValueError('The number of joints in the configuration q '
@@ -1470,6 +1735,144 @@ def VanDerCorputSequence(lower=0.0, upper=1.0, include_endpoints=True):
     return (scale * val + lower for val in chain(endpoints, raw_seq))
 
 
+def RadicalInverse(index, base=2):
+    """
+    Compute the radical inverse of a non-negative integer, i.e. reflect its
+    digits in the given base about the radix point.
+
+    In base 2, RadicalInverse(1), RadicalInverse(2), ... is the Van der
+    Corput sequence [0.5, 0.25, 0.75, 0.125, ...] that is generated by
+    VanDerCorputSequence().
+
+    @param int index: The number to invert.
+    @param int base:  The base to invert the number in.
+
+    @returns float: A value in [0, 1).
+    """
+    result = 0.0
+    scale = 1.0 / base
+    while index > 0:
+        index, digit = divmod(index, base)
+        result += digit * scale
+        scale /= base
+    return result
+
+
+def _FirstPrimes(n):
+    primes = []
+    candidate = 2
+    while len(primes) < n:
+        if all(candidate % p != 0 for p in primes):
+            primes.append(candidate)
+        candidate += 1
+    return primes
+
+
+def HaltonSequence(num_dims, skip=1):
+    """
+    Generate the Halton sequence, a low-discrepancy sequence of points in the
+    unit hypercube whose i-th coordinates are the Van der Corput sequence in
+    the base of the i-th prime number.
+
+    @param int num_dims: The dimension of the points.
+    @param int skip:     The number of initial points to skip. By default,
+                         the first point, which is at the origin, is skipped.
+
+    @returns generator: A sequence of numpy arrays of shape (num_dims,).
+    """
+    from itertools import count
+
+    primes = _FirstPrimes(num_dims)
+    for index in count(skip):
+        yield numpy.array([RadicalInverse(index, p) for p in primes])
+
+
+# Primitive polynomials and initial direction numbers of dimensions 2, 3, ...
+# of the Sobol sequence, from S. Joe and F. Y. Kuo, "Constructing Sobol
+# sequences with better two-dimensional projections", SIAM J. Sci. Comput.
+# 30, 2635-2654 (2008). Each polynomial is encoded as an integer including
+# its leading and constant terms.
+_SOBOL_DIRECTIONS = [
+    (3, (1,)),
+    (7, (1, 3)),
+    (11, (1, 3, 1)),
+    (13, (1, 1, 1)),
+    (19, (1, 1, 3, 3)),
+    (25, (1, 3, 5, 13)),
+    (37, (1, 1, 5, 5, 17)),
+    (41, (1, 1, 5, 5, 5)),
+    (47, (1, 1, 7, 11, 19)),
+    (55, (1, 1, 5, 1, 1)),
+    (59, (1, 1, 1, 3, 11)),
+    (61, (1, 3, 5, 5, 31)),
+    (67, (1, 3, 3, 9, 7, 49)),
+    (91, (1, 1, 1, 15, 21, 21)),
+    (97, (1, 3, 1, 13, 27, 49)),
+    (103, (1, 1, 1, 15, 7, 5)),
+    (109, (1, 3, 1, 15, 13, 25)),
+    (115, (1, 1, 5, 5, 19, 61)),
+    (131, (1, 3, 7, 11, 23, 15, 103)),
+    (137, (1, 3, 7, 13, 13, 15, 69)),
+    (143, (1, 1, 3, 13, 7, 35, 63)),
+    (145, (1, 3, 5, 9, 1, 25, 53)),
+    (157, (1, 3, 1, 13, 9, 35, 107)),
+]
+
+
+def SobolSequence(num_dims, skip=1):
+    """
+    Generate the Sobol sequence, a low-discrepancy sequence of points in the
+    unit hypercube. The first dimension is the Van der Corput sequence.
+
+    @param int num_dims: The dimension of the points; at most 24.
+    @param int skip:     The number of initial points to skip. By default,
+                         the first point, which is at the origin, is skipped.
+
+    @returns generator: A sequence of numpy arrays of shape (num_dims,).
+    """
+    num_bits = 32
+
+    if num_dims > len(_SOBOL_DIRECTIONS) + 1:
+        raise ValueError('The Sobol sequence is only implemented for up to'
+                         ' {:d} dimensions.'.format(len(_SOBOL_DIRECTIONS)
+                                                    + 1))
+
+    # Compute the direction numbers of each dimension, scaled to integers.
+    directions = numpy.zeros((num_dims, num_bits), dtype=numpy.uint64)
+    directions[0, :] = [1 << (num_bits - 1 - k) for k in xrange(num_bits)]
+
+    for dim in xrange(1, num_dims):
+        polynomial, m = _SOBOL_DIRECTIONS[dim - 1]
+        degree = polynomial.bit_length() - 1
+        v = [m[k] << (num_bits - 1 - k) for k in xrange(degree)]
+
+        for k in xrange(degree, num_bits):
+            value = v[k - degree] ^ (v[k - degree] >> degree)
+            for i in xrange(1, degree):
+                if (polynomial >> (degree - i)) & 1:
+                    value ^= v[k - i]
+            v.append(value)
+
+        directions[dim, :] = v
+
+    # Generate the points in Gray code order, which changes a single bit of
+    # the index between consecutive points.
+    point = numpy.zeros(num_dims, dtype=numpy.uint64)
+    index = 0
+    scale = 1.0 / (1 << num_bits)
+    while True:
+        if index >= skip:
+            yield point * scale
+
+        # Find the lowest zero bit of the index.
+        bit = 0
+        while (index >> bit) & 1:
+            bit += 1
+
+        point = point ^ directions[:, bit]
+        index += 1
+
+
 def SampleTimeGenerator(start, end, step=1):
     """
     Generate a linear sequence of values from start to end, with
@@ -1577,7 +1980,7 @@ def GetCollisionCheckPts(robot, traj, include_start=True, start_time=0.,
 
     cspec = traj.GetConfigurationSpecification()
     dof_indices, _ = cspec.ExtractUsedIndices(robot)
-    q_resolutions = robot.GetDOFResolutions()[dof_indices]
+    q_resolutions = GetKinematicLimits(robot).resolution[dof_indices]
     duration = traj.GetDuration()
 
     if not (0. <= start_time < duration + epsilon):
@@ -1694,7 +2097,7 @@ def GetLinearCollisionCheckPts(robot, traj, norm_order=2, sampling_func=None):
     temp_traj.Insert(0, waypoint)
 
     # Get the resolution (in radians) for each joint
-    q_resolutions = robot.GetDOFResolutions()[dof_indices]
+    q_resolutions = GetKinematicLimits(robot).resolution[dof_indices]
 
     # Iterate over each segment in the trajectory and set
     # the timing of each waypoint in the temporary trajectory
@@ -1752,44 +2155,215 @@ def GetLinearCollisionCheckPts(robot, traj, norm_order=2, sampling_func=None):
         yield t, q
 
 
-def IsInCollision(traj, robot, selfcoll_only=False):
-    report = openravepy.CollisionReport()
-
-    # Get trajectory length.
-    NN = traj.GetNumWaypoints()
-    ii = 0
-    total_dist = 0.0
-    for ii in range(NN - 1):
-        point1 = traj.GetWaypoint(ii)
-        point2 = traj.GetWaypoint(ii + 1)
-        dist = 0.0
-        total_dof = robot.GetActiveDOF()
-        for jj in range(total_dof):
-            dist += pow(point1[jj] - point2[jj], 2)
-        total_dist += numpy.sqrt(dist)
-
-    step_dist = 0.04
-
-    if traj.GetDuration() < 0.001:
-        openravepy.planningutils.RetimeActiveDOFTrajectory(traj, robot)
-    total_time = traj.GetDuration()
-    step_time = total_time * step_dist / total_dist
-
-    for t in numpy.arange(0.0, total_time, step_time):
-        point = traj.Sample(t)
-        collision = False
-        with robot.GetEnv():
-            robot.SetActiveDOFValues(point)
-            if robot.CheckSelfCollision(report):
-                collision = True
-            if not collision:
-                if ((not selfcoll_only) and
-                        robot.GetEnv().CheckCollision(robot, report)):
-                    collision = True
-        if collision:
-            return True
+def GetBisectionOrder(num_samples):
+    """
+    Order the indices of a sequence of samples by recursive bisection.
 
-    return False
+    The first and last indices are returned first, followed by the midpoint
+    of the range, then the midpoints of the two halves, and so on. Checking
+    samples in this order finds a collision anywhere along a path after only
+    a few checks.
+
+    For example, for 7 samples the order is [0, 6, 3, 1, 4, 2, 5].
+
+    @param int num_samples: The number of samples.
+    @returns list: A permutation of range(num_samples).
+    """
+    from collections import deque
+
+    if num_samples <= 0:
+        return []
+    elif num_samples == 1:
+        return [0]
+
+    order = [0, num_samples - 1]
+    intervals = deque([(0, num_samples - 1)])
+
+    while intervals:
+        lower, upper = intervals.popleft()
+        if upper - lower < 2:
+            continue
+
+        middle = (lower + upper) // 2
+        order.append(middle)
+        intervals.append((lower, middle))
+        intervals.append((middle, upper))
+
+    return order
+
+
+def GetResolutionCollisionCheckPts(robot, traj):
+    """
+    Generate all of the configurations needed to collision check a path or
+    trajectory at DOF resolution.
+
+    Timed trajectories are sampled with GetCollisionCheckPts. Un-timed paths
+    are assumed to be piece-wise linear; each segment is subdivided so that
+    no DOF moves more than its resolution between consecutive samples. The
+    samples of an un-timed path are parameterized by their arclength, as in
+    ComputeUnitTiming. The input trajectory is not modified.
+
+    @param openravepy.Robot robot: The robot.
+    @param openravepy.Trajectory traj: A path or trajectory.
+    @returns (times, configurations, dof_indices): An array of sample times,
+             an array of DOF values with one row per sample, and the DOF
+             indices of the columns.
+    """
+    cspec = traj.GetConfigurationSpecification()
+    dof_indices, _ = cspec.ExtractUsedIndices(robot)
+    num_waypoints = traj.GetNumWaypoints()
+
+    if num_waypoints == 0:
+        raise ValueError('Trajectory has 0 waypoints!')
+
+    if IsTimedTrajectory(traj):
+        checks = list(GetCollisionCheckPts(robot, traj))
+        times = numpy.array([t for t, _ in checks])
+        configurations = numpy.array([q for _, q in checks])
+        return times, configurations, dof_indices
+
+    waypoints = numpy.reshape(traj.GetWaypoints(0, num_waypoints),
+                              (num_waypoints, cspec.GetDOF()))
+    values = numpy.array([cspec.ExtractJointValues(w, robot, dof_indices)
+                          for w in waypoints])
+
+    if num_waypoints == 1:
+        return numpy.zeros(1), values, dof_indices
+
+    resolutions = GetKinematicLimits(robot).resolution[dof_indices]
+    deltas = numpy.diff(values, axis=0)
+    lengths = numpy.sqrt(numpy.sum(deltas ** 2, axis=1))
+    arclengths = numpy.concatenate(([0.], numpy.cumsum(lengths)))
+
+    # Number of samples needed along each segment, excluding its start.
+    num_steps = numpy.ceil(
+        numpy.max(numpy.abs(deltas) / resolutions, axis=1)).astype(int)
+    num_steps = numpy.maximum(num_steps, 1)
+
+    segments = numpy.repeat(numpy.arange(num_waypoints - 1), num_steps)
+    offsets = numpy.repeat(numpy.cumsum(num_steps) - num_steps, num_steps)
+    steps = numpy.arange(len(segments)) - offsets + 1
+    alphas = steps.astype(float) / num_steps[segments]
+
+    times = numpy.concatenate(
+        ([0.], arclengths[segments] + alphas * lengths[segments]))
+    configurations = numpy.vstack((
+        values[0:1, :],
+        values[segments, :] + alphas[:, numpy.newaxis] * deltas[segments, :]))
+    return times, configurations, dof_indices
+
+
+def FindTrajectoryCollision(traj, robot, selfcoll_only=False, envs=None,
+                            earliest=True):
+    """
+    Find a colliding configuration along a path or trajectory.
+
+    The trajectory is sampled at DOF resolution (see
+    GetResolutionCollisionCheckPts) and the samples are checked in bisection
+    order, so that a collision anywhere along the trajectory is found quickly.
+    If earliest is True, checking continues on the samples before the first
+    collision found so that the earliest colliding sample is returned.
+
+    If a list of environments is passed in envs, robot's environment is cloned
+    into each of them and the samples are divided between one thread per
+    environment. The caller must not hold the lock of any of these
+    environments.
+
+    Neither the trajectory nor the robot's state are modified.
+
+    @param openravepy.Trajectory traj: A path or trajectory.
+    @param openravepy.Robot robot: The robot.
+    @param bool selfcoll_only: Only check for self-collision.
+    @param list envs: Optional environments to check collisions in parallel.
+    @param bool earliest: Return the earliest colliding sample, not just the
+                          first one found.
+    @returns (t, report) The time of the colliding sample and its collision
+             report, or None if the trajectory is collision free. For an
+             un-timed path, t is the arclength of the sample.
+    """
+    from .clone import Clone
+
+    times, configurations, dof_indices = GetResolutionCollisionCheckPts(
+        robot, traj)
+    order = GetBisectionOrder(len(times))
+
+    state = {'index': None, 'report': None}
+    state_lock = threading.Lock()
+
+    def check_samples(robot, indices):
+        env = robot.GetEnv()
+        report = openravepy.CollisionReport()
+
+        with env, robot.CreateRobotStateSaver():
+            robot.SetActiveDOFs(dof_indices)
+
+            for index in indices:
+                with state_lock:
+                    found_index = state['index']
+
+                if found_index is not None and (not earliest or
+                                                index > found_index):
+                    if not earliest:
+                        return
+                    continue
+
+                robot.SetActiveDOFValues(configurations[index])
+
+                if (robot.CheckSelfCollision(report) or
+                        (not selfcoll_only and
+                         env.CheckCollision(robot, report))):
+                    with state_lock:
+                        if state['index'] is None or index < state['index']:
+                            state['index'] = index
+                            state['report'] = report
+                    report = openravepy.CollisionReport()
+
+    if not envs:
+        check_samples(robot, order)
+    else:
+        clones = [Clone(robot.GetEnv(), clone_env=env, lock=False)
+                  for env in envs]
+        try:
+            threads = []
+            for i, clone in enumerate(clones):
+                cloned_env = clone.__enter__()
+                cloned_robot = cloned_env.Cloned(robot)
+                threads.append(threading.Thread(
+                    target=check_samples,
+                    args=(cloned_robot, order[i::len(clones)])))
+
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            for clone in reversed(clones):
+                clone.__exit__(None, None, None)
+
+    if state['index'] is None:
+        return None
+    else:
+        return times[state['index']], state['report']
+
+
+def IsInCollision(traj, robot, selfcoll_only=False, envs=None):
+    """
+    Check whether a path or trajectory is in collision.
+
+    This is a convenience wrapper around FindTrajectoryCollision that stops
+    at the first collision found. Neither the trajectory nor the robot's
+    state are modified.
+
+    @param openravepy.Trajectory traj: A path or trajectory.
+    @param openravepy.Robot robot: The robot.
+    @param bool selfcoll_only: Only check for self-collision.
+    @param list envs: Optional environments to check collisions in parallel.
+    @returns bool: True if any sample is in collision.
+    """
+    collision = FindTrajectoryCollision(traj, robot,
+                                        selfcoll_only=selfcoll_only,
+                                        envs=envs, earliest=False)
+    return collision is not None
 
 
 OPENRAVE_JOINT_DERIVATIVES = {
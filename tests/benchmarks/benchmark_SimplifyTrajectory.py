@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+"""
+Benchmark SimplifyTrajectory on long, densely sampled paths.
+
+Each path is a random walk through the WAM's configuration space with steps
+smaller than the joint resolutions, similar to the raw output of a sampling
+based planner that has been densified for collision checking.
+
+Usage: benchmark_SimplifyTrajectory.py [num_waypoints] [num_trials]
+"""
+from __future__ import print_function
+import numpy
+import openravepy
+import sys
+import time
+from prpy.util import SimplifyTrajectory
+
+
+def create_path(robot, num_waypoints, rng):
+    dof_indices = robot.GetActiveDOFIndices()
+    resolutions = robot.GetDOFResolutions()[dof_indices]
+
+    steps = 0.5 * resolutions * rng.standard_normal(
+        (num_waypoints, len(dof_indices)))
+    values = numpy.cumsum(steps, axis=0)
+
+    cspec = robot.GetActiveConfigurationSpecification('linear')
+    path = openravepy.RaveCreateTrajectory(robot.GetEnv(), '')
+    path.Init(cspec)
+
+    waypoints = numpy.zeros((num_waypoints, cspec.GetDOF()))
+    for waypoint, q in zip(waypoints, values):
+        cspec.InsertJointValues(waypoint, q, robot, dof_indices, False)
+    path.Insert(0, waypoints.ravel())
+    return path
+
+
+if __name__ == '__main__':
+    num_waypoints = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    num_trials = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+
+    openravepy.RaveInitialize(True)
+    openravepy.RaveSetDebugLevel(openravepy.DebugLevel.Fatal)
+
+    env = openravepy.Environment()
+    with env:
+        env.Load('data/wamtest2.env.xml')
+        robot = env.GetRobot('BarrettWAM')
+        robot.SetActiveManipulator('arm')
+        robot.SetActiveDOFs(range(7))
+
+    rng = numpy.random.RandomState(0)
+
+    durations = []
+    num_outputs = []
+    for _ in range(num_trials):
+        path = create_path(robot, num_waypoints, rng)
+
+        start_time = time.time()
+        with env:
+            output = SimplifyTrajectory(path, robot)
+        durations.append(time.time() - start_time)
+        num_outputs.append(output.GetNumWaypoints())
+
+    print('{:d} waypoints: median {:.3f} s, max {:.3f} s,'
+          ' median {:.0f} output waypoints'.format(
+              num_waypoints, numpy.median(durations), numpy.max(durations),
+              numpy.median(num_outputs)))
+
+    env.Destroy()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+"""
+Benchmark the time SnapPlanner takes to reject a colliding edge.
+
+Each sampling order is run on the same set of edges, all of which end in a
+configuration that is in collision with the environment. The edge is checked
+directly in the planning environment so that cloning is not included in the
+reported times.
+
+Usage: benchmark_SnapPlanner.py [num_trials]
+"""
+from __future__ import print_function
+import numpy
+import openravepy
+import sys
+import time
+from prpy.clone import Clone
+from prpy.planning.base import PlanningError
+from prpy.planning.snap import SnapPlanner
+from prpy.util import SampleTimeGenerator, VanDerCorputSampleGenerator
+
+config_start = numpy.array([
+    +2.35061574,  0.61043555,  0.85000000,  1.80684444, -0.08639935,
+    -0.69750474,  1.31656172
+])
+config_goal = numpy.array([
+    +3.63026273e-01,  -1.54688036e+00,  -1.30000000e+00,
+    +2.34703418e+00,   3.28152338e-01,  -1.10662864e+00,
+    -2.07807269e-01
+])
+
+planners = [
+    ('linear', SnapPlanner(sampling_func=SampleTimeGenerator)),
+    ('van der corput', SnapPlanner(sampling_func=VanDerCorputSampleGenerator)),
+    ('goal first', SnapPlanner(goal_first=True)),
+]
+
+
+def time_to_reject(planner, robot, goal):
+    with Clone(robot.GetEnv(), clone_env=planner.env) as cloned_env:
+        cloned_robot = cloned_env.Cloned(robot)
+
+        start_time = time.time()
+        try:
+            planner._Snap(cloned_robot, goal)
+        except PlanningError:
+            return time.time() - start_time
+
+    raise AssertionError('Edge was not rejected.')
+
+
+if __name__ == '__main__':
+    num_trials = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+
+    openravepy.RaveInitialize(True)
+    openravepy.RaveSetDebugLevel(openravepy.DebugLevel.Fatal)
+
+    env = openravepy.Environment()
+    with env:
+        env.Load('data/wamtest2.env.xml')
+        env.Remove(env.GetKinBody('floor'))
+        robot = env.GetRobot('BarrettWAM')
+        robot.SetActiveManipulator('arm')
+        robot.SetActiveDOFs(range(7))
+
+    # Interpolate the start of each edge towards the goal, so the colliding
+    # section covers a varying fraction of the edge.
+    starts = [config_start + alpha * (config_goal - config_start)
+              for alpha in numpy.linspace(0., 0.5, num_trials)]
+
+    for name, planner in planners:
+        durations = []
+        for start in starts:
+            with env:
+                robot.SetActiveDOFValues(start)
+            durations.append(time_to_reject(planner, robot, config_goal))
+
+        print('{:>16s}: median {:.3f} ms, max {:.3f} ms'.format(
+            name, 1e3 * numpy.median(durations), 1e3 * numpy.max(durations)))
+
+    env.Destroy()
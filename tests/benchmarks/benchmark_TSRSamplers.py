@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+"""
+Benchmark the rate of IK successes obtained with each TSR sampler.
+
+Each sampler draws poses from the same TSR around a reachable end-effector
+pose of the WAM for a fixed amount of time. A pose is a success if it has a
+collision-free IK solution. The TSR is wider than the arm's workspace, so
+samplers that cover it evenly find the reachable region more consistently.
+
+Usage: benchmark_TSRSamplers.py [duration_per_sampler]
+"""
+from __future__ import print_function
+import numpy
+import openravepy
+import sys
+import time
+from prpy.tsr import TSR, TSRChain
+from prpy.tsr.samplers import CreateSampler
+
+config_goal = numpy.array([
+    +3.63026273e-01,  -1.54688036e+00,  -1.30000000e+00,
+    +2.34703418e+00,   3.28152338e-01,  -1.10662864e+00,
+    -2.07807269e-01
+])
+
+samplers = ['uniform', 'halton', 'sobol', 'stratified']
+
+
+def count_ik_successes(manipulator, tsrchain, sampler, duration):
+    ikfo = openravepy.IkFilterOptions
+    num_samples = 0
+    num_successes = 0
+
+    end_time = time.time() + duration
+    while time.time() < end_time:
+        pose = tsrchain.sample(sampler=sampler)
+        ik_param = openravepy.IkParameterization(
+            pose, openravepy.IkParameterizationType.Transform6D)
+        solution = manipulator.FindIKSolution(
+            ik_param, ikfo.CheckEnvCollisions, ikreturn=False,
+            releasegil=True)
+
+        num_samples += 1
+        if solution is not None:
+            num_successes += 1
+
+    return num_samples, num_successes
+
+
+if __name__ == '__main__':
+    duration = float(sys.argv[1]) if len(sys.argv) > 1 else 5.
+
+    openravepy.RaveInitialize(True)
+    openravepy.RaveSetDebugLevel(openravepy.DebugLevel.Fatal)
+
+    env = openravepy.Environment()
+    with env:
+        env.Load('data/wamtest2.env.xml')
+        robot = env.GetRobot('BarrettWAM')
+        manipulator = robot.SetActiveManipulator('arm')
+        robot.SetActiveDOFs(range(7))
+
+        robot.SetActiveDOFValues(config_goal)
+        goal_pose = manipulator.GetEndEffectorTransform()
+
+    # Positions within 30 cm and any rotation about the approach axis.
+    Bw = numpy.zeros((6, 2))
+    Bw[0:3, :] = [[-0.3, 0.3], [-0.3, 0.3], [-0.3, 0.3]]
+    Bw[5, :] = [-numpy.pi, numpy.pi]
+    tsrchain = TSRChain(sample_goal=True,
+                        TSR=TSR(T0_w=goal_pose, Bw=Bw))
+
+    for name in samplers:
+        sampler = CreateSampler(name, seed=0)
+        with env:
+            num_samples, num_successes = count_ik_successes(
+                manipulator, tsrchain, sampler, duration)
+
+        print('{:>12s}: {:.1f} IK successes/s ({:d} of {:d} samples)'.format(
+            name, num_successes / duration, num_successes, num_samples))
+
+    env.Destroy()
@@ -0,0 +1,74 @@
+import numpy
+from planning_helpers import BasePlannerTest
+from prpy.planning.collision import CollisionCache
+from prpy.planning.exceptions import CollisionPlanningError
+from prpy.planning.snap import SnapPlanner
+from unittest import TestCase
+
+
+class CollisionCacheTest(BasePlannerTest, TestCase):
+    planner_factory = SnapPlanner
+
+    def setUp(self):
+        super(CollisionCacheTest, self).setUp()
+
+        self.cache = CollisionCache()
+        self.cache.Update(self.env, self.robot)
+
+    def test_CheckCollision_RepeatedConfiguration_IsCacheHit(self):
+        with self.env:
+            self.robot.SetActiveDOFValues(self.config_feasible_start)
+            self.cache.CheckCollision(self.robot)
+            self.cache.CheckCollision(self.robot)
+
+        self.assertEqual(self.cache.misses, 1)
+        self.assertEqual(self.cache.hits, 1)
+        self.assertEqual(self.cache.GetHitRate(), 0.5)
+
+    def test_CheckCollision_CachedCollision_Throws(self):
+        with self.env:
+            self.robot.SetActiveDOFValues(self.config_env_collision)
+
+            for _ in xrange(2):
+                with self.assertRaises(CollisionPlanningError):
+                    self.cache.CheckCollision(self.robot)
+
+        self.assertEqual(self.cache.hits, 1)
+
+    def test_Update_RobotMoved_DoesNotInvalidate(self):
+        with self.env:
+            self.robot.SetActiveDOFValues(self.config_feasible_start)
+            self.cache.CheckCollision(self.robot)
+            self.robot.SetActiveDOFValues(self.config_feasible_goal)
+
+            self.assertFalse(self.cache.Update(self.env, self.robot))
+
+        self.assertEqual(len(self.cache), 1)
+
+    def test_Update_BodyMoved_Invalidates(self):
+        with self.env:
+            self.robot.SetActiveDOFValues(self.config_feasible_start)
+            self.cache.CheckCollision(self.robot)
+
+            body = next(b for b in self.env.GetBodies() if not b.IsRobot())
+            pose = body.GetTransform()
+            pose[0, 3] += 0.1
+            body.SetTransform(pose)
+
+            self.assertTrue(self.cache.Update(self.env, self.robot))
+
+        self.assertEqual(len(self.cache), 0)
+        self.assertEqual(self.cache.invalidations, 1)
+
+    def test_SnapPlanner_SharedCache_ReusesChecks(self):
+        self.planner.collision_cache = self.cache
+
+        with self.env:
+            self.robot.SetActiveDOFValues(self.waypoint1)
+
+        self.planner.PlanToConfiguration(self.robot, self.waypoint2)
+        misses = self.cache.misses
+        self.planner.PlanToConfiguration(self.robot, self.waypoint2)
+
+        self.assertEqual(self.cache.misses, misses)
+        self.assertGreater(self.cache.hits, 0)
@@ -0,0 +1,141 @@
+import numpy
+import openravepy
+from planning_helpers import BasePlannerTest
+from prpy.ik_cache import IKCache
+from prpy.planning.snap import SnapPlanner
+from unittest import TestCase
+
+
+class IKCacheTest(BasePlannerTest, TestCase):
+    planner_factory = SnapPlanner
+
+    def setUp(self):
+        super(IKCacheTest, self).setUp()
+
+        self.cache = IKCache()
+
+        with self.env:
+            self.robot.SetActiveDOFValues(self.config_feasible_goal)
+            self.goal_pose = self.manipulator.GetEndEffectorTransform()
+            self.robot.SetActiveDOFValues(self.config_feasible_start)
+
+    def test_FindIKSolutions_RepeatedPose_IsCacheHit(self):
+        ikfo = openravepy.IkFilterOptions
+
+        with self.env:
+            first = self.cache.FindIKSolutions(
+                self.manipulator, self.goal_pose, ikfo.CheckEnvCollisions)
+            second = self.cache.FindIKSolutions(
+                self.manipulator, self.goal_pose, ikfo.CheckEnvCollisions)
+
+        self.assertGreater(first.shape[0], 0)
+        numpy.testing.assert_array_equal(first, second)
+        self.assertEqual(self.cache.misses, 1)
+        self.assertEqual(self.cache.hits, 1)
+        self.assertEqual(self.cache.GetHitRate(), 0.5)
+
+    def test_FindIKSolutions_MatchesOpenRAVE(self):
+        ikfo = openravepy.IkFilterOptions
+
+        with self.env:
+            ik_param = openravepy.IkParameterization(
+                self.goal_pose, openravepy.IkParameterizationType.Transform6D)
+            expected = self.manipulator.FindIKSolutions(
+                ik_param, ikfo.CheckEnvCollisions)
+            actual = self.cache.FindIKSolutions(
+                self.manipulator, self.goal_pose, ikfo.CheckEnvCollisions)
+
+        self.assertEqual(actual.shape, expected.shape)
+
+    def test_FindIKSolutions_ObstacleAdded_RevalidatesSolutions(self):
+        ikfo = openravepy.IkFilterOptions
+
+        with self.env:
+            self.cache.FindIKSolutions(
+                self.manipulator, self.goal_pose, ikfo.CheckEnvCollisions)
+
+            # Put a box around the end-effector at the goal pose.
+            box = openravepy.RaveCreateKinBody(self.env, '')
+            box.SetName('box')
+            box.InitFromBoxes(numpy.array([[0., 0., 0., 0.1, 0.1, 0.1]]))
+            box.SetTransform(self.goal_pose)
+            self.env.Add(box)
+
+            solutions = self.cache.FindIKSolutions(
+                self.manipulator, self.goal_pose, ikfo.CheckEnvCollisions)
+
+        self.assertEqual(solutions.shape[0], 0)
+        self.assertEqual(self.cache.hits, 1)
+
+    def test_FindIKSolution_ReachesGoalPose(self):
+        ikfo = openravepy.IkFilterOptions
+
+        with self.env:
+            solution = self.cache.FindIKSolution(
+                self.manipulator, self.goal_pose, ikfo.CheckEnvCollisions)
+            self.robot.SetActiveDOFValues(solution)
+            pose = self.manipulator.GetEndEffectorTransform()
+
+        self.assertTransformClose(pose, self.goal_pose)
+
+    def test_FindIKSolutions_LimitsChanged_Invalidates(self):
+        ikfo = openravepy.IkFilterOptions
+
+        with self.env:
+            self.cache.FindIKSolutions(
+                self.manipulator, self.goal_pose, ikfo.CheckEnvCollisions)
+
+            lower, upper = self.robot.GetDOFLimits()
+            upper[self.manipulator.GetArmIndices()[0]] -= 0.1
+            self.robot.SetDOFLimits(lower, upper)
+
+            self.cache.FindIKSolutions(
+                self.manipulator, self.goal_pose, ikfo.CheckEnvCollisions)
+
+        self.assertEqual(self.cache.invalidations, 1)
+        self.assertEqual(self.cache.misses, 2)
+
+    def test_FindIKSolution_NewPose_IsNotCached(self):
+        ikfo = openravepy.IkFilterOptions
+
+        with self.env:
+            ik_param = openravepy.IkParameterization(
+                self.goal_pose, openravepy.IkParameterizationType.Transform6D)
+            expected = self.manipulator.FindIKSolution(
+                ik_param, ikfo.CheckEnvCollisions)
+            actual = self.cache.FindIKSolution(
+                self.manipulator, self.goal_pose, ikfo.CheckEnvCollisions)
+
+        numpy.testing.assert_array_almost_equal(actual, expected)
+        self.assertEqual(len(self.cache), 0)
+        self.assertEqual(self.cache.misses, 1)
+
+    def test_FindIKSolution_FillCache_RepeatedPose_IsCacheHit(self):
+        ikfo = openravepy.IkFilterOptions
+
+        with self.env:
+            for _ in xrange(2):
+                solution = self.cache.FindIKSolution(
+                    self.manipulator, self.goal_pose, ikfo.CheckEnvCollisions,
+                    fill_cache=True)
+            self.robot.SetActiveDOFValues(solution)
+            pose = self.manipulator.GetEndEffectorTransform()
+
+        self.assertTransformClose(pose, self.goal_pose)
+        self.assertEqual(len(self.cache), 1)
+        self.assertEqual(self.cache.misses, 1)
+        self.assertEqual(self.cache.hits, 1)
+
+    def test_FindIKSolution_RepeatedPose_IsCacheHit(self):
+        ikfo = openravepy.IkFilterOptions
+
+        with self.env:
+            self.cache.FindIKSolutions(
+                self.manipulator, self.goal_pose, ikfo.CheckEnvCollisions)
+            solution = self.cache.FindIKSolution(
+                self.manipulator, self.goal_pose, ikfo.CheckEnvCollisions)
+            self.robot.SetActiveDOFValues(solution)
+            pose = self.manipulator.GetEndEffectorTransform()
+
+        self.assertTransformClose(pose, self.goal_pose)
+        self.assertEqual(self.cache.hits, 1)
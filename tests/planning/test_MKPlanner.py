@@ -0,0 +1,35 @@
+import numpy
+from methods import PlanToEndEffectorOffsetTest
+from planning_helpers import BasePlannerTest
+from prpy.planning.mk import MKPlanner
+from unittest import TestCase
+
+
+class MKPlannerTest(BasePlannerTest,
+                    PlanToEndEffectorOffsetTest,
+                    TestCase):
+    planner_factory = MKPlanner
+
+    def test_PlanToEndEffectorOffset_AdaptiveSteps_UsesFewerWaypoints(self):
+        with self.env:
+            self.robot.SetActiveDOFValues(self.config_feasible_start)
+            start_pose = self.manipulator.GetEndEffectorTransform()
+
+        fixed = self.planner.PlanToEndEffectorOffset(
+            self.robot, direction=self.direction, distance=self.distance)
+        adaptive = self.planner.PlanToEndEffectorOffset(
+            self.robot, direction=self.direction, distance=self.distance,
+            max_step_size=0.02)
+
+        self.ValidatePath(adaptive)
+        self.assertLess(adaptive.GetNumWaypoints(), fixed.GetNumWaypoints())
+
+        with self.env:
+            cspec = self.robot.GetActiveConfigurationSpecification()
+            last = adaptive.GetWaypoint(adaptive.GetNumWaypoints() - 1, cspec)
+            self.robot.SetActiveDOFValues(last)
+            end_pose = self.manipulator.GetEndEffectorTransform()
+
+        distance = numpy.dot(end_pose[0:3, 3] - start_pose[0:3, 3],
+                             self.direction)
+        self.assertGreaterEqual(distance, self.distance)
@@ -0,0 +1,78 @@
+import time
+from unittest import TestCase
+from planning_helpers import MetaPlannerTests, SuccessPlanner
+from prpy.planning.base import PlannerPool, PlanningError
+
+
+def PlanTest(planner, robot):
+    return planner.PlanTest(robot)
+
+
+def FailTest(planner, robot):
+    raise PlanningError('FailTest')
+
+
+def SlowFailTest(planner, robot):
+    time.sleep(0.1)
+    raise PlanningError('SlowFailTest')
+
+
+class PlannerPoolTests(MetaPlannerTests,
+                       TestCase):
+    def setUp(self):
+        super(PlannerPoolTests, self).setUp()
+
+        self.planners = [SuccessPlanner(self.traj) for _ in xrange(2)]
+        self.pool = PlannerPool(self.planners)
+
+    def test_AllAttemptsSucceed_ReturnsFirst(self):
+        index, traj, errors = self.pool.PlanRanked(
+            self.robot, [PlanTest, PlanTest, PlanTest])
+
+        self.assertEqual(index, 0)
+        self.assertEqual(traj.GetEnv(), self.env)
+        self.assertEqual(errors, {})
+
+    def test_FirstAttemptFails_ReturnsSecond(self):
+        index, traj, errors = self.pool.PlanRanked(
+            self.robot, [FailTest, PlanTest])
+
+        self.assertEqual(index, 1)
+        self.assertEqual(traj.GetEnv(), self.env)
+        self.assertEqual(errors.keys(), [0])
+
+    def test_AllAttemptsFail_ReturnsNone(self):
+        index, traj, errors = self.pool.PlanRanked(
+            self.robot, [FailTest, FailTest, FailTest])
+
+        self.assertIsNone(index)
+        self.assertIsNone(traj)
+        self.assertEqual(sorted(errors.keys()), [0, 1, 2])
+
+    def test_PlanRanked_ReleasesPlanners(self):
+        for _ in xrange(3):
+            self.pool.PlanRanked(self.robot, [FailTest, FailTest])
+        index, traj, errors = self.pool.PlanRanked(
+            self.robot, [PlanTest, SlowFailTest, SlowFailTest])
+        self.assertEqual(index, 0)
+
+        # The attempts that lost finish in the background and then return
+        # their planners.
+        deadline = time.time() + 1.
+        with self.pool._condition:
+            while len(self.pool._free) < len(self.pool):
+                remaining = deadline - time.time()
+                if remaining <= 0.:
+                    break
+                self.pool._condition.wait(remaining)
+
+            self.assertEqual(sorted(self.pool._free), range(len(self.pool)))
+
+        slots = [self.pool._Acquire(blocking=False)
+                 for _ in xrange(len(self.pool))]
+        self.assertNotIn(None, slots)
+        self.assertEqual(sorted(slots), range(len(self.pool)))
+
+    def test_EmptyPool_Throws(self):
+        with self.assertRaises(ValueError):
+            PlannerPool([])
@@ -0,0 +1,70 @@
+import numpy
+import os
+import shutil
+import tempfile
+from planning_helpers import BasePlannerTest
+from prpy.planning.snap import SnapPlanner
+from prpy.reachability import ReachabilityMap
+from unittest import TestCase
+
+
+class ReachabilityMapTest(BasePlannerTest, TestCase):
+    planner_factory = SnapPlanner
+
+    def setUp(self):
+        super(ReachabilityMapTest, self).setUp()
+
+        with self.env:
+            self.reachability_map = ReachabilityMap.Build(
+                self.manipulator, num_samples=5000, position_resolution=0.2,
+                num_polar_bins=2, num_azimuth_bins=2,
+                rng=numpy.random.RandomState(0))
+
+    def test_GetScore_SampledPose_IsReachable(self):
+        with self.env:
+            self.robot.SetActiveDOFValues(self.config_feasible_goal)
+            pose = self.manipulator.GetEndEffectorTransform()
+
+            self.assertTrue(
+                self.reachability_map.IsReachable(self.manipulator, pose))
+
+    def test_GetScore_DistantPose_IsUnreachable(self):
+        with self.env:
+            pose = self.manipulator.GetBase().GetTransform()
+            pose[0:3, 3] += numpy.array([10., 0., 0.])
+
+            self.assertEqual(
+                self.reachability_map.GetScore(self.manipulator, pose), 0.)
+
+    def test_GetScores_MatchesGetScore(self):
+        with self.env:
+            poses = []
+            for q in [self.config_feasible_start, self.config_feasible_goal]:
+                self.robot.SetActiveDOFValues(q)
+                poses.append(self.manipulator.GetEndEffectorTransform())
+
+            scores = self.reachability_map.GetScores(
+                self.manipulator, numpy.array(poses))
+
+            for pose, score in zip(poses, scores):
+                self.assertEqual(
+                    self.reachability_map.GetScore(self.manipulator, pose),
+                    score)
+
+    def test_SaveLoad_RoundTrip(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'map.npz')
+            self.reachability_map.Save(path)
+
+            with self.env:
+                loaded = ReachabilityMap.Load(path, self.manipulator)
+        finally:
+            shutil.rmtree(directory)
+
+        numpy.testing.assert_array_equal(
+            loaded.scores, self.reachability_map.scores)
+        numpy.testing.assert_allclose(
+            loaded.origin, self.reachability_map.origin)
+        self.assertEqual(loaded.manipulator_name,
+                         self.reachability_map.manipulator_name)
@@ -1,10 +1,12 @@
+from functools import partial
 from methods import (
     PlanToConfigurationTest,
     PlanToConfigurationStraightLineTest,
 )
 from methods.PlanToConfiguration import PlanToConfigurationTestCollisionTest
 from planning_helpers import BasePlannerTest
-from prpy.planning.snap import SnapPlanner
+from prpy.planning.snap import GoalFirstSampleGenerator, SnapPlanner
+from prpy.util import SampleTimeGenerator, VanDerCorputSampleGenerator
 from unittest import TestCase
 
 
@@ -18,3 +20,27 @@ class SnapPlannerTest(BasePlannerTest,
     def setUp(self):
         super(SnapPlannerTest, self).setUp()
 
+
+class SnapPlannerGoalFirstTest(BasePlannerTest,
+                               PlanToConfigurationTest,
+                               PlanToConfigurationStraightLineTest,
+                               PlanToConfigurationTestCollisionTest,
+                               TestCase):
+    planner_factory = partial(SnapPlanner, goal_first=True)
+
+    def setUp(self):
+        super(SnapPlannerGoalFirstTest, self).setUp()
+
+
+class GoalFirstSampleGeneratorTest(TestCase):
+    def test_GoalFirst_Linear(self):
+        seq = list(GoalFirstSampleGenerator(SampleTimeGenerator)(0, 5.0))
+        self.assertEqual(seq, [5.0, 0.0, 1.0, 2.0, 3.0, 4.0])
+
+    def test_GoalFirst_VanDerCorput(self):
+        seq = list(GoalFirstSampleGenerator(VanDerCorputSampleGenerator)(
+            0, 13.7, step=2))
+        self.assertEqual(seq[0], 13.7)
+        self.assertEqual(seq[1], 0.0)
+        self.assertEqual(seq.count(13.7), 1)
+        self.assertEqual(sorted(seq[2:]), [2.0, 4.0, 6.0, 8.0, 10.0, 12.0])
@@ -0,0 +1,137 @@
+import numpy
+import openravepy
+import unittest
+from prpy.controllers import (CreateExecutedTrajectory, FeedbackBuffer,
+                              FeedbackSample)
+
+
+class FakeStamp(object):
+    def __init__(self, secs):
+        self.secs = secs
+
+    def to_sec(self):
+        return self.secs
+
+
+class FakeMessage(object):
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+def CreateFeedbackMessage(time, joint_names, positions, velocities, errors,
+                          efforts=()):
+    """Create an object shaped like control_msgs/FollowJointTrajectoryFeedback
+    """
+    return FakeMessage(
+        header=FakeMessage(stamp=FakeStamp(time)),
+        joint_names=joint_names,
+        actual=FakeMessage(positions=positions, velocities=velocities,
+                           effort=efforts),
+        error=FakeMessage(positions=errors))
+
+
+class FakeFeedbackController(object):
+    def __init__(self, dof_indices, feedback):
+        self.dof_indices = dof_indices
+        self.feedback = feedback
+
+    def GetControlDOFIndices(self):
+        return self.dof_indices
+
+    def GetFeedback(self):
+        return self.feedback
+
+
+class FeedbackBufferTest(unittest.TestCase):
+    def test_Append_Full_DropsOldest(self):
+        feedback = FeedbackBuffer(capacity=3)
+        for i in xrange(5):
+            feedback.Append(FeedbackSample(i, [i], [0.], [0.]))
+
+        self.assertEqual(len(feedback), 3)
+        self.assertEqual(feedback.num_dropped, 2)
+        self.assertEqual([sample.time for sample in feedback.GetSamples()],
+                         [2, 3, 4])
+        self.assertEqual(feedback.GetLatest().time, 4)
+
+    def test_AddCallback_CalledWithEachSample(self):
+        feedback = FeedbackBuffer()
+        samples = []
+        feedback.AddCallback(samples.append)
+
+        sample = FeedbackSample(0., [1.], [0.], [0.])
+        feedback.Append(sample)
+        self.assertEqual(samples, [sample])
+
+    def test_Clear_RemovesSamples(self):
+        feedback = FeedbackBuffer()
+        feedback.Append(FeedbackSample(0., [1.], [0.], [0.]))
+        feedback.Clear()
+
+        self.assertEqual(len(feedback), 0)
+        self.assertIsNone(feedback.GetLatest())
+
+    def test_GetArrays_Empty(self):
+        times, positions, _, _ = FeedbackBuffer().GetArrays()
+        self.assertEqual(times.shape, (0,))
+
+    def test_FromMessage_ReordersJoints(self):
+        msg = CreateFeedbackMessage(
+            2.5, ['j2', 'j1'], [2., 1.], [0.2, 0.1], [0.02, 0.01])
+        sample = FeedbackSample.FromMessage(msg, ['j1', 'j2'])
+
+        self.assertEqual(sample.time, 2.5)
+        numpy.testing.assert_array_equal(sample.position, [1., 2.])
+        numpy.testing.assert_array_equal(sample.velocity, [0.1, 0.2])
+        numpy.testing.assert_array_equal(sample.error, [0.01, 0.02])
+        self.assertEqual(len(sample.effort), 0)
+
+    def test_FromMessage_ReadsEfforts(self):
+        msg = CreateFeedbackMessage(
+            2.5, ['j2', 'j1'], [2., 1.], [0.2, 0.1], [0.02, 0.01],
+            efforts=[20., 10.])
+        sample = FeedbackSample.FromMessage(msg, ['j1', 'j2'])
+
+        numpy.testing.assert_array_equal(sample.effort, [10., 20.])
+
+
+class CreateExecutedTrajectoryTest(unittest.TestCase):
+    def setUp(self):
+        self.env = openravepy.Environment()
+        self.env.Load('wamtest1.env.xml')
+        self.robot = self.env.GetRobot('BarrettWAM')
+
+    def tearDown(self):
+        self.env.Destroy()
+
+    def test_CreateExecutedTrajectory_MergesControllers(self):
+        feedback1 = FeedbackBuffer()
+        feedback2 = FeedbackBuffer()
+        for t in [10., 10.5, 11.]:
+            feedback1.Append(FeedbackSample(t, [t - 10.], [1.], [0.]))
+        for t in [10.25, 10.75]:
+            feedback2.Append(FeedbackSample(t, [2. * (t - 10.)], [2.], [0.]))
+
+        controllers = [
+            FakeFeedbackController([0], feedback1),
+            FakeFeedbackController([1], feedback2),
+            object(),
+        ]
+
+        with self.env:
+            traj = CreateExecutedTrajectory(self.robot, controllers)
+
+        self.assertEqual(traj.GetNumWaypoints(), 5)
+        self.assertAlmostEqual(traj.GetDuration(), 1.)
+
+        cspec = traj.GetConfigurationSpecification()
+        values = cspec.ExtractJointValues(traj.Sample(0.5), self.robot, [0, 1])
+        numpy.testing.assert_array_almost_equal(values, [0.5, 1.])
+
+    def test_CreateExecutedTrajectory_NoFeedback_ReturnsNone(self):
+        controllers = [FakeFeedbackController([0], FeedbackBuffer())]
+        self.assertIsNone(CreateExecutedTrajectory(self.robot, controllers))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import threading
+import unittest
+from prpy.futures import Future, defer
+
+
+class FutureTest(unittest.TestCase):
+    def test_add_done_callback_CalledOnCompletion(self):
+        future = Future()
+        calls = []
+        future.add_done_callback(calls.append)
+        self.assertEqual(calls, [])
+
+        future.set_result(1)
+        self.assertEqual(calls, [future])
+
+    def test_add_done_callback_AlreadyDone_CalledImmediately(self):
+        future = Future()
+        future.set_result(1)
+
+        calls = []
+        future.add_done_callback(calls.append)
+        self.assertEqual(calls, [future])
+
+    def test_add_done_callback_Duplicate_Raises(self):
+        future = Future()
+        callback = lambda _: None
+        future.add_done_callback(callback)
+
+        with self.assertRaises(ValueError):
+            future.add_done_callback(callback)
+
+    def test_add_done_callback_CallbackRaises_IsLogged(self):
+        def callback(_):
+            raise RuntimeError()
+
+        future = Future()
+        future.add_done_callback(callback)
+        future.set_result(1)
+        self.assertEqual(future.result(), 1)
+
+    def test_defer_ReturnsResult(self):
+        event = threading.Event()
+        future = defer(event.wait, args=(10.,))
+        event.set()
+        self.assertTrue(future.result(timeout=10.))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import numpy
+import unittest
+from numpy.testing import assert_allclose, assert_array_equal
+from prpy.ik_ranking import (JointLimitAvoidanceRanker, NominalConfiguration,
+                             TopKSolutions, WeightedRanker)
+
+
+class IKRankingTest(unittest.TestCase):
+    def setUp(self):
+        self.lower_limits = numpy.array([-1., -1.])
+        self.upper_limits = numpy.array([1., 1.])
+        self.ik_solutions = numpy.array([
+            [0., 0.],
+            [0.9, 0.],
+            [0.5, -0.5],
+            [3., 3.],
+        ])
+
+    def test_JointLimitAvoidanceRanker_PrefersCenter(self):
+        ranker = JointLimitAvoidanceRanker(self.lower_limits,
+                                           self.upper_limits)
+        scores = ranker(None, self.ik_solutions)
+
+        assert_allclose(scores, [-2., -1.01, -0.5, -8.])
+
+    def test_NominalConfiguration_MaxDeviation_IsInfeasible(self):
+        ranker = NominalConfiguration(numpy.zeros(2), max_deviation=1.)
+        scores = ranker(None, self.ik_solutions)
+
+        assert_allclose(scores[0:3], [0., 0.9, numpy.sqrt(0.5)])
+        self.assertTrue(numpy.isposinf(scores[3]))
+
+    def test_WeightedRanker_SumsScores(self):
+        joint_limits = JointLimitAvoidanceRanker(self.lower_limits,
+                                                 self.upper_limits)
+        nominal = NominalConfiguration(numpy.zeros(2), max_deviation=1.)
+        ranker = WeightedRanker([joint_limits, nominal], [0.5, 2.])
+
+        scores = ranker(None, self.ik_solutions)
+        expected = (0.5 * joint_limits(None, self.ik_solutions[0:3])
+                    + 2. * nominal(None, self.ik_solutions[0:3]))
+
+        assert_allclose(scores[0:3], expected)
+        self.assertTrue(numpy.isposinf(scores[3]))
+
+    def test_TopKSolutions_MatchesSort(self):
+        rng = numpy.random.RandomState(0)
+        ik_solutions = rng.uniform(-2., 2., size=(100, 2))
+        ranker = NominalConfiguration(numpy.zeros(2), max_deviation=1.5)
+
+        top_solutions = TopKSolutions(None, ranker, 5)
+        for batch in numpy.array_split(ik_solutions, 7):
+            top_solutions.Add(batch)
+        scores, solutions = top_solutions.GetSolutions()
+
+        all_scores = ranker(None, ik_solutions)
+        order = numpy.argsort(all_scores)[0:5]
+
+        assert_allclose(scores, all_scores[order])
+        assert_array_equal(solutions, ik_solutions[order])
+        self.assertEqual(top_solutions.num_added, 100)
+        self.assertEqual(top_solutions.num_feasible,
+                         numpy.sum(~numpy.isposinf(all_scores)))
+
+
+if __name__ == '__main__':
+    unittest.main()
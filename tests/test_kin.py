@@ -0,0 +1,143 @@
+import numpy
+import unittest
+from numpy.testing import assert_allclose
+from prpy import kin
+
+
+def RandomQuaternions(rng, n):
+    quats = rng.randn(n, 4)
+    quats /= numpy.linalg.norm(quats, axis=1)[:, numpy.newaxis]
+
+    # Include rotations of 180 degrees, which use the other branches of the
+    # quaternion extraction, and the yaw-pitch-roll singularities.
+    s = numpy.sqrt(0.5)
+    special = numpy.array([
+        [1., 0., 0., 0.],
+        [0., 1., 0., 0.],
+        [0., 0., 1., 0.],
+        [0., s, 0., s],
+        [0., -s, 0., s],
+        [0., 0., 0., 1.],
+    ])
+    return numpy.vstack((quats, special))
+
+
+class KinBatchEquivalenceTest(unittest.TestCase):
+    """
+    Checks that each *_batch function agrees with its scalar version.
+    """
+    def setUp(self):
+        self.rng = numpy.random.RandomState(0)
+        self.quats = RandomQuaternions(self.rng, 100)
+        self.n = self.quats.shape[0]
+        self.poses = numpy.column_stack(
+            (self.rng.randn(self.n, 3), self.quats))
+        self.xyzypr = numpy.column_stack(
+            (self.rng.randn(self.n, 3),
+             self.rng.uniform(-numpy.pi, numpy.pi, (self.n, 3))))
+        self.H = kin.pose_to_H_batch(self.poses)
+
+    def assertBatchEqual(self, batch_fn, scalar_fn, *args):
+        actual = batch_fn(*args)
+        expected = numpy.array([scalar_fn(*x) for x in zip(*args)])
+        assert_allclose(actual, expected, atol=1e-12)
+
+    def test_R_to_quat(self):
+        self.assertBatchEqual(kin.R_to_quat_batch, kin.R_to_quat,
+                              self.H[:, 0:3, 0:3])
+
+    def test_R_from_quat(self):
+        self.assertBatchEqual(kin.R_from_quat_batch, kin.R_from_quat,
+                              self.quats)
+
+    def test_pose_to_H(self):
+        self.assertBatchEqual(kin.pose_to_H_batch, kin.pose_to_H,
+                              self.poses)
+
+    def test_pose_from_H(self):
+        self.assertBatchEqual(kin.pose_from_H_batch, kin.pose_from_H, self.H)
+
+    def test_quat_to_ypr(self):
+        self.assertBatchEqual(kin.quat_to_ypr_batch, kin.quat_to_ypr,
+                              self.quats)
+
+    def test_quat_from_ypr(self):
+        self.assertBatchEqual(kin.quat_from_ypr_batch, kin.quat_from_ypr,
+                              self.xyzypr[:, 3:6])
+
+    def test_pose_from_xyzypr(self):
+        self.assertBatchEqual(kin.pose_from_xyzypr_batch,
+                              kin.pose_from_xyzypr, self.xyzypr)
+
+    def test_pose_to_xyzypr(self):
+        self.assertBatchEqual(kin.pose_to_xyzypr_batch, kin.pose_to_xyzypr,
+                              self.poses)
+
+    def test_H_from_op_diff(self):
+        directions = self.rng.randn(self.n, 3)
+        directions[0:10, 0] *= 10.  # Close to the x-axis.
+        self.assertBatchEqual(kin.H_from_op_diff_batch, kin.H_from_op_diff,
+                              self.poses[:, 0:3], directions)
+
+    def test_invert_H(self):
+        self.assertBatchEqual(kin.invert_H_batch, kin.invert_H, self.H)
+
+    def test_xyzt_to_H(self):
+        self.assertBatchEqual(kin.xyzt_to_H_batch, kin.xyzt_to_H,
+                              self.xyzypr[:, 0:4])
+
+    def test_xyzypr_to_H(self):
+        self.assertBatchEqual(kin.xyzypr_to_H_batch, kin.xyzypr_to_H,
+                              self.xyzypr)
+
+    def test_transform_comparison(self):
+        H2 = self.H[::-1]
+        position, rotation = kin.transform_comparison_batch(self.H, H2)
+
+        for i in xrange(self.n):
+            expected = kin.transform_comparison(self.H[i], H2[i])
+            assert_allclose((position[i], rotation[i]), expected, atol=1e-12)
+
+
+class KinTest(unittest.TestCase):
+    def setUp(self):
+        self.rng = numpy.random.RandomState(0)
+        self.quats = RandomQuaternions(self.rng, 100)
+
+    def test_R_to_quat_RoundTrip(self):
+        R = kin.R_from_quat_batch(self.quats)
+        assert_allclose(kin.R_from_quat_batch(kin.R_to_quat_batch(R)), R,
+                        atol=1e-12)
+
+    def test_R_to_quat_HalfTurn(self):
+        R = numpy.diag([1., -1., -1.])
+        assert_allclose(kin.R_to_quat(R), [1., 0., 0., 0.])
+
+    def test_quat_to_ypr_RoundTrip(self):
+        ypr = self.rng.uniform(-1.5, 1.5, (100, 3))
+        quats = kin.quat_from_ypr_batch(ypr)
+        assert_allclose(kin.quat_to_ypr_batch(quats), ypr, atol=1e-12)
+
+    def test_invert_H_IsInverse(self):
+        H = kin.pose_to_H_batch(numpy.column_stack(
+            (self.rng.randn(self.quats.shape[0], 3), self.quats)))
+        for H_i, H_inv in zip(H, kin.invert_H_batch(H)):
+            assert_allclose(numpy.dot(H_i, H_inv), numpy.eye(4), atol=1e-12)
+
+    def test_H_from_op_diff_ZAxisAlongDirection(self):
+        directions = numpy.vstack((self.rng.randn(50, 3), numpy.eye(3)))
+        H = kin.H_from_op_diff_batch(numpy.zeros((53, 3)), directions)
+
+        for H_i, direction in zip(H, directions):
+            assert_allclose(numpy.dot(H_i[0:3, 0:3].T, H_i[0:3, 0:3]),
+                            numpy.eye(3), atol=1e-12)
+            assert_allclose(H_i[0:3, 2],
+                            direction / numpy.linalg.norm(direction))
+
+    def test_tsr_kin_IsAlias(self):
+        from prpy.tsr import kin as tsr_kin
+        self.assertIs(tsr_kin.R_to_quat, kin.R_to_quat)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,425 @@
+import numpy
+import openravepy
+import threading
+import time
+import unittest
+from prpy.perception.base import (PerceptionException, PerceptionModule,
+                                  PerceptionMethod)
+from prpy.perception.meta import RunAll
+from prpy.perception.scene import DetectedObject, SceneUpdater
+
+
+class StubService(object):
+    """Local stand-in for a detection service"""
+    def __init__(self, result=None, delay=0.):
+        self.result = result
+        self.delay = delay
+        self.num_calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            self.num_calls += 1
+        time.sleep(self.delay)
+        return self.result
+
+
+class StubModule(PerceptionModule):
+    def __init__(self, service, **kw_args):
+        super(StubModule, self).__init__(**kw_args)
+        self.service = service
+
+    @PerceptionMethod
+    def DetectObjects(self, robot, names=()):
+        return self._GetCachedDetections(('detect', tuple(names)),
+                                         self.service)
+
+
+class PerceptionModuleTest(unittest.TestCase):
+    def test_GetHandle_CreatesOnce(self):
+        module = StubModule(StubService())
+        handles = []
+
+        def factory():
+            handles.append(object())
+            return handles[-1]
+
+        first = module._GetHandle('detector', factory)
+        second = module._GetHandle('detector', factory)
+
+        self.assertEqual(len(handles), 1)
+        self.assertIs(first, second)
+
+    def test_ResetHandle_CreatesAgain(self):
+        module = StubModule(StubService())
+        first = module._GetHandle('detector', object)
+        module._ResetHandle('detector')
+        second = module._GetHandle('detector', object)
+
+        self.assertIsNot(first, second)
+
+    def test_GetCachedDetections_ConcurrentCallers_ShareOneDetection(self):
+        service = StubService(result=[('block', None)], delay=0.1)
+        module = StubModule(service)
+        results = []
+
+        def detect():
+            results.append(module.DetectObjects(None))
+
+        threads = [threading.Thread(target=detect) for _ in xrange(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(service.num_calls, 1)
+        self.assertEqual(results, [[('block', None)]] * 4)
+
+    def test_GetCachedDetections_WithinTimeout_ReusesResult(self):
+        service = StubService(result=[])
+        module = StubModule(service, detection_cache_timeout=10.)
+
+        module.DetectObjects(None)
+        module.DetectObjects(None)
+        self.assertEqual(service.num_calls, 1)
+
+        module.DetectObjects(None, names=['block'])
+        self.assertEqual(service.num_calls, 2)
+
+    def test_GetCachedDetections_NoTimeout_DetectsAgain(self):
+        service = StubService(result=[])
+        module = StubModule(service)
+
+        module.DetectObjects(None)
+        module.DetectObjects(None)
+        self.assertEqual(service.num_calls, 2)
+
+    def test_GetCachedDetections_Raises_IsNotCached(self):
+        def fail():
+            raise RuntimeError()
+
+        module = StubModule(fail, detection_cache_timeout=10.)
+        with self.assertRaises(RuntimeError):
+            module.DetectObjects(None)
+
+        module.service = StubService(result=[])
+        self.assertEqual(module.DetectObjects(None), [])
+
+    def test_ClearDetectionCache_DetectsAgain(self):
+        service = StubService(result=[])
+        module = StubModule(service, detection_cache_timeout=10.)
+
+        module.DetectObjects(None)
+        module.ClearDetectionCache()
+        module.DetectObjects(None)
+        self.assertEqual(service.num_calls, 2)
+
+    def test_DetectObjectsAsync_ReturnsFuture(self):
+        service = StubService(result=[('block', None)])
+        module = StubModule(service)
+
+        future = module.DetectObjectsAsync(None, names=['block'])
+        self.assertEqual(future.result(timeout=1.), [('block', None)])
+        self.assertTrue(module.has_perception_method('DetectObjectsAsync'))
+
+
+class SceneUpdaterTest(unittest.TestCase):
+    def setUp(self):
+        self.env = openravepy.Environment()
+        self.updater = SceneUpdater(self.env)
+        self.created = []
+
+    def tearDown(self):
+        self.env.Destroy()
+
+    def CreateBox(self, detection):
+        box = openravepy.RaveCreateKinBody(self.env, '')
+        box.SetName('box')
+        box.InitFromBoxes(numpy.array([[0., 0., 0., 0.05, 0.05, 0.05]]),
+                          True)
+        self.created.append(box)
+        return box
+
+    def Translation(self, x, y=0., z=0.):
+        T = numpy.eye(4)
+        T[0:3, 3] = [x, y, z]
+        return T
+
+    def test_Update_NewDetections_AddsBodies(self):
+        update = self.updater.Update([
+            DetectedObject('fuze_bottle', 'fuze_bottle', self.Translation(1.)),
+            DetectedObject(None, 'block', self.Translation(2.)),
+        ], self.CreateBox)
+
+        self.assertEqual(len(self.created), 2)
+        self.assertEqual(update.added, update.bodies)
+        self.assertEqual(update.bodies[0].GetName(), 'fuze_bottle')
+        numpy.testing.assert_array_almost_equal(
+            update.bodies[1].GetTransform(), self.Translation(2.))
+
+    def test_Update_Unchanged_ReusesBodies(self):
+        detections = [
+            DetectedObject('fuze_bottle', 'fuze_bottle', self.Translation(1.)),
+            DetectedObject(None, 'block', self.Translation(2.)),
+        ]
+        first = self.updater.Update(detections, self.CreateBox)
+        second = self.updater.Update(detections, self.CreateBox)
+
+        self.assertEqual(len(self.created), 2)
+        self.assertEqual(second.bodies, first.bodies)
+        self.assertEqual(second.added, [])
+        self.assertEqual(second.moved, [])
+
+    def test_Update_Moved_OnlyMovesMovedBodies(self):
+        first = self.updater.Update([
+            DetectedObject(None, 'block', self.Translation(1.)),
+            DetectedObject(None, 'block', self.Translation(2.)),
+        ], self.CreateBox)
+
+        # Detections are matched by position, not by order.
+        second = self.updater.Update([
+            DetectedObject(None, 'block', self.Translation(2.001)),
+            DetectedObject(None, 'block', self.Translation(1.02)),
+        ], self.CreateBox)
+
+        self.assertEqual(len(self.created), 2)
+        self.assertEqual(second.bodies, first.bodies[::-1])
+        self.assertEqual(second.moved, [first.bodies[0]])
+        numpy.testing.assert_array_almost_equal(
+            first.bodies[0].GetTransform(), self.Translation(1.02))
+        numpy.testing.assert_array_almost_equal(
+            first.bodies[1].GetTransform(), self.Translation(2.))
+
+    def test_Update_FarAway_AddsBody(self):
+        first = self.updater.Update(
+            [DetectedObject(None, 'block', self.Translation(1.))],
+            self.CreateBox)
+        second = self.updater.Update(
+            [DetectedObject(None, 'block', self.Translation(2.))],
+            self.CreateBox)
+
+        self.assertEqual(len(self.created), 2)
+        self.assertNotEqual(second.bodies, first.bodies)
+
+    def test_Update_DifferentType_NotReused(self):
+        self.updater.Update(
+            [DetectedObject(None, 'block', self.Translation(1.))],
+            self.CreateBox)
+        update = self.updater.Update(
+            [DetectedObject(None, 'bowl', self.Translation(1.))],
+            self.CreateBox)
+
+        self.assertEqual(len(self.created), 2)
+        self.assertEqual(update.added, update.bodies)
+
+    def test_Update_ExistingBody_IsAdopted(self):
+        with self.env:
+            body = self.CreateBox(None)
+            body.SetName('fuze_bottle')
+            self.env.Add(body)
+
+        detection = DetectedObject('fuze_bottle', 'fuze_bottle',
+                                   self.Translation(1.))
+        update = self.updater.Update([detection], self.CreateBox)
+
+        self.assertEqual(update.bodies, [body])
+        self.assertEqual(update.moved, [body])
+
+    def test_Update_RemoveMissing_RemovesUndetectedBodies(self):
+        first = self.updater.Update([
+            DetectedObject(None, 'block', self.Translation(1.)),
+            DetectedObject(None, 'block', self.Translation(2.)),
+        ], self.CreateBox)
+        second = self.updater.Update(
+            [DetectedObject(None, 'block', self.Translation(1.))],
+            self.CreateBox, remove_missing=True)
+
+        self.assertEqual(second.removed, [first.bodies[1]])
+        self.assertIsNone(self.env.GetKinBody(first.bodies[1].GetName()))
+        self.assertIsNotNone(self.env.GetKinBody(first.bodies[0].GetName()))
+
+
+class FakeRobot(object):
+    def __init__(self, env):
+        self.env = env
+
+    def GetEnv(self):
+        return self.env
+
+
+class FixedModule(PerceptionModule):
+    """Detects a fixed set of objects after a delay"""
+    def __init__(self, poses, delay=0., error=None):
+        super(FixedModule, self).__init__()
+        self.poses = poses
+        self.delay = delay
+        self.error = error
+
+    @PerceptionMethod
+    def GetDetections(self, robot, **kw_args):
+        time.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+
+        return [DetectedObject(name, 'box', pose)
+                for name, pose in self.poses]
+
+    def _CreateKinBody(self, env, detection):
+        body = openravepy.RaveCreateKinBody(env, '')
+        body.InitFromBoxes(numpy.array([[0., 0., 0., 0.05, 0.05, 0.05]]),
+                           True)
+        return body
+
+
+class BodyModule(PerceptionModule):
+    """Adds a fixed set of objects to the environment, like a module that
+    does not implement GetDetections"""
+    def __init__(self, poses):
+        super(BodyModule, self).__init__()
+        self.poses = poses
+
+    @PerceptionMethod
+    def DetectObjects(self, robot, **kw_args):
+        env = robot.GetEnv()
+        bodies = []
+        with env:
+            for name, pose in self.poses:
+                body = env.GetKinBody(name)
+                if body is None:
+                    body = openravepy.RaveCreateKinBody(env, '')
+                    body.InitFromBoxes(
+                        numpy.array([[0., 0., 0., 0.05, 0.05, 0.05]]), True)
+                    body.SetName(name)
+                    env.Add(body)
+                body.SetTransform(pose)
+                bodies.append(body)
+        return bodies
+
+
+class RunAllTest(unittest.TestCase):
+    def setUp(self):
+        self.env = openravepy.Environment()
+        self.robot = FakeRobot(self.env)
+
+    def tearDown(self):
+        self.env.Destroy()
+
+    def Translation(self, x):
+        T = numpy.eye(4)
+        T[0, 3] = x
+        return T
+
+    def test_DetectObjects_RunsModulesConcurrently(self):
+        module = RunAll([
+            FixedModule([('fuze_bottle', self.Translation(1.))], delay=0.2),
+            FixedModule([('pop_tarts', self.Translation(2.))], delay=0.2),
+        ])
+
+        start_time = time.time()
+        bodies = module.DetectObjects(self.robot)
+        duration = time.time() - start_time
+
+        self.assertEqual([body.GetName() for body in bodies],
+                         ['fuze_bottle', 'pop_tarts'])
+        self.assertLess(duration, 0.35)
+
+    def test_DetectObjects_Timeout_ReturnsCompletedModules(self):
+        module = RunAll([
+            FixedModule([('fuze_bottle', self.Translation(1.))], delay=1.),
+            FixedModule([('pop_tarts', self.Translation(2.))]),
+        ], timeout=0.1)
+
+        start_time = time.time()
+        bodies = module.DetectObjects(self.robot)
+        duration = time.time() - start_time
+
+        self.assertEqual([body.GetName() for body in bodies], ['pop_tarts'])
+        self.assertLess(duration, 0.5)
+
+    def test_DetectObjects_LateModule_DoesNotChangeEnvironment(self):
+        module = RunAll([
+            FixedModule([('fuze_bottle', self.Translation(1.))]),
+            FixedModule([('fuze_bottle', self.Translation(2.))], delay=0.2),
+        ], timeout=0.1)
+
+        bodies = module.DetectObjects(self.robot)
+
+        # Wait for the low-priority module to finish in the background.
+        time.sleep(0.3)
+        numpy.testing.assert_array_almost_equal(
+            bodies[0].GetTransform(), self.Translation(1.))
+
+    def test_DetectObjects_Failure_IsIgnored(self):
+        module = RunAll([
+            FixedModule([], error=RuntimeError()),
+            FixedModule([('pop_tarts', self.Translation(2.))]),
+        ])
+
+        bodies = module.DetectObjects(self.robot)
+        self.assertEqual([body.GetName() for body in bodies], ['pop_tarts'])
+
+    def test_DetectObjects_Conflict_PrefersHigherPriority(self):
+        module = RunAll([
+            FixedModule([('fuze_bottle', self.Translation(1.))], delay=0.1),
+            FixedModule([('fuze_bottle', self.Translation(2.))]),
+        ])
+
+        bodies = module.DetectObjects(self.robot)
+
+        self.assertEqual(len(bodies), 1)
+        numpy.testing.assert_array_almost_equal(
+            bodies[0].GetTransform(), self.Translation(1.))
+
+    def test_DetectObjects_Conflict_CustomResolution(self):
+        def Average(name, candidates):
+            pose = numpy.mean([d.pose for _, d in candidates], axis=0)
+            return candidates[0][1]._replace(pose=pose)
+
+        module = RunAll([
+            FixedModule([('fuze_bottle', self.Translation(1.))]),
+            FixedModule([('fuze_bottle', self.Translation(2.))]),
+        ], resolve_conflict=Average)
+
+        bodies = module.DetectObjects(self.robot)
+        numpy.testing.assert_array_almost_equal(
+            bodies[0].GetTransform(), self.Translation(1.5))
+
+    def test_DetectObjects_ModuleWithoutGetDetections_CallsDetectObjects(self):
+        module = RunAll([
+            BodyModule([('fuze_bottle', self.Translation(1.))]),
+            FixedModule([('pop_tarts', self.Translation(2.)),
+                         ('fuze_bottle', self.Translation(3.))]),
+            BodyModule([('plastic_bowl', self.Translation(4.))]),
+        ])
+
+        bodies = module.DetectObjects(self.robot)
+
+        self.assertEqual([body.GetName() for body in bodies],
+                         ['fuze_bottle', 'pop_tarts', 'plastic_bowl'])
+        self.assertIs(bodies[0], self.env.GetKinBody('fuze_bottle'))
+        numpy.testing.assert_array_almost_equal(
+            bodies[0].GetTransform(), self.Translation(1.))
+        numpy.testing.assert_array_almost_equal(
+            bodies[2].GetTransform(), self.Translation(4.))
+
+    def test_DetectObject_ModuleWithoutGetDetections_CallsDetectObjects(self):
+        module = RunAll([
+            FixedModule([('pop_tarts', self.Translation(1.))]),
+            BodyModule([('fuze_bottle', self.Translation(2.))]),
+        ])
+
+        body = module.DetectObject(self.robot, 'fuze_bottle')
+        self.assertIs(body, self.env.GetKinBody('fuze_bottle'))
+
+    def test_DetectObject_ReturnsHighestPrioritySuccess(self):
+        module = RunAll([
+            FixedModule([('pop_tarts', self.Translation(1.))]),
+            FixedModule([('fuze_bottle', self.Translation(2.))]),
+        ])
+
+        body = module.DetectObject(self.robot, 'fuze_bottle')
+        self.assertEqual(body.GetName(), 'fuze_bottle')
+        self.assertIsNone(self.env.GetKinBody('pop_tarts'))
+
+        with self.assertRaises(PerceptionException):
+            module.DetectObject(self.robot, 'plastic_bowl')
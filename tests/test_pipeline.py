@@ -0,0 +1,174 @@
+import numpy
+import openravepy
+import prpy
+import threading
+import time
+import unittest
+from prpy.exceptions import TrajectoryNotExecutable
+from prpy.pipeline import MotionPipeline
+from prpy.planning.exceptions import PlanningError
+
+
+class FakeRobot(openravepy.Robot):
+    """
+    Robot that plans straight-line paths and executes them instantaneously
+    after a delay
+    """
+    def __init__(self, log):
+        self.log = log
+        self.plan_delay = 0.
+        self.execute_delay = 0.
+        self.diverge = False
+
+    def CloneBindings(self, parent):
+        self.log = parent.log
+        self.plan_delay = parent.plan_delay
+        self.execute_delay = parent.execute_delay
+        self.diverge = parent.diverge
+
+    def _Record(self, event, **kw_args):
+        with self.log['lock']:
+            self.log['events'].append((event, time.time(), kw_args))
+
+    def PlanToConfiguration(self, goal, execute=True, fail=False):
+        start = self.GetActiveDOFValues()
+        self._Record('plan_start', start=start)
+        time.sleep(self.plan_delay)
+        self._Record('plan_end')
+
+        if fail:
+            raise PlanningError('Planning failed.')
+
+        path = openravepy.RaveCreateTrajectory(self.GetEnv(), '')
+        path.Init(self.GetActiveConfigurationSpecification('linear'))
+        path.Insert(0, start)
+        path.Insert(1, goal)
+        return path
+
+    def PostProcessPath(self, path, **kw_args):
+        return path
+
+    def ExecuteTrajectory(self, traj, **kw_args):
+        self._Record('execute_start')
+        time.sleep(self.execute_delay)
+
+        if not self.diverge:
+            cspec = traj.GetConfigurationSpecification()
+            waypoint = traj.GetWaypoint(traj.GetNumWaypoints() - 1)
+            with self.GetEnv():
+                self.SetActiveDOFValues(cspec.ExtractJointValues(
+                    waypoint, self, self.GetActiveDOFIndices()))
+
+        self._Record('execute_end')
+        return traj
+
+
+class MotionPipelineTest(unittest.TestCase):
+    def setUp(self):
+        self.env = openravepy.Environment()
+        self.env.Load('wamtest1.env.xml')
+        self.robot = self.env.GetRobot('BarrettWAM')
+        self.manipulator = self.robot.GetManipulator('arm')
+
+        self.log = {'events': [], 'lock': threading.Lock()}
+        prpy.bind_subclass(self.robot, FakeRobot, self.log)
+
+        with self.env:
+            self.robot.SetActiveDOFs(self.manipulator.GetArmIndices())
+            self.q0 = self.robot.GetActiveDOFValues()
+
+        self.pipeline = MotionPipeline(self.robot)
+
+    def tearDown(self):
+        self.env.Destroy()
+
+    def _GetEvents(self, name):
+        return [(t, kw_args) for event, t, kw_args in self.log['events']
+                if event == name]
+
+    def test_Run_PlansNextMotionDuringExecution(self):
+        self.robot.plan_delay = 0.1
+        self.robot.execute_delay = 0.1
+
+        goals = [self.q0 + 0.1, self.q0 + 0.2]
+        futures = [self.pipeline.Enqueue('PlanToConfiguration', goal)
+                   for goal in goals]
+        executed = self.pipeline.Run()
+
+        self.assertEqual(len(executed), 2)
+        for future in futures:
+            self.assertTrue(future.done())
+            self.assertFalse(future.cancelled())
+
+        # The second motion was planned from the end of the first one,
+        # while the first one was executing.
+        plan_starts = self._GetEvents('plan_start')
+        execute_ends = self._GetEvents('execute_end')
+        self.assertLess(plan_starts[1][0], execute_ends[0][0])
+        numpy.testing.assert_array_almost_equal(
+            plan_starts[1][1]['start'], goals[0])
+
+        with self.env:
+            numpy.testing.assert_array_almost_equal(
+                self.robot.GetActiveDOFValues(), goals[1])
+
+    def test_Run_PlanningFails_CancelsQueuedMotions(self):
+        first = self.pipeline.Enqueue('PlanToConfiguration', self.q0 + 0.1)
+        second = self.pipeline.Enqueue('PlanToConfiguration', self.q0 + 0.2,
+                                       fail=True)
+        third = self.pipeline.Enqueue('PlanToConfiguration', self.q0 + 0.3)
+
+        with self.assertRaises(PlanningError):
+            self.pipeline.Run()
+
+        self.assertIsNotNone(first.result())
+        self.assertIsInstance(second.exception(), PlanningError)
+        self.assertTrue(third.cancelled())
+        self.assertEqual(len(self.pipeline), 0)
+
+    def test_Run_RobotDiverges_Raises(self):
+        self.robot.diverge = True
+
+        first = self.pipeline.Enqueue('PlanToConfiguration', self.q0 + 0.1)
+        second = self.pipeline.Enqueue('PlanToConfiguration', self.q0 + 0.2)
+
+        with self.assertRaises(TrajectoryNotExecutable):
+            self.pipeline.Run()
+
+        self.assertIsInstance(first.exception(), TrajectoryNotExecutable)
+        self.assertTrue(second.cancelled())
+        self.assertEqual(len(self._GetEvents('execute_start')), 1)
+
+    def test_Run_EnqueuedDuringLastExecution_IsExecuted(self):
+        self.robot.execute_delay = 0.2
+
+        first = self.pipeline.Enqueue('PlanToConfiguration', self.q0 + 0.1)
+        futures = []
+        timer = threading.Timer(0.1, lambda: futures.append(
+            self.pipeline.Enqueue('PlanToConfiguration', self.q0 + 0.2)))
+        timer.start()
+        self.addCleanup(timer.join)
+
+        executed = self.pipeline.Run()
+
+        self.assertEqual(len(executed), 2)
+        self.assertTrue(first.done())
+        self.assertTrue(futures[0].done())
+        self.assertFalse(futures[0].cancelled())
+        numpy.testing.assert_array_almost_equal(
+            self._GetEvents('plan_start')[1][1]['start'], self.q0 + 0.1)
+
+    def test_Run_SeveralPipelines_SharePlanningEnvironment(self):
+        self.pipeline.Enqueue('PlanToConfiguration', self.q0 + 0.1)
+        self.pipeline.Run()
+        num_plan_envs = len(MotionPipeline._plan_envs)
+
+        pipeline = MotionPipeline(self.robot)
+        pipeline.Enqueue('PlanToConfiguration', self.q0 + 0.2)
+        pipeline.Run()
+
+        self.assertEqual(len(MotionPipeline._plan_envs), num_plan_envs)
+
+
+if __name__ == '__main__':
+    unittest.main()
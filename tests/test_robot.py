@@ -0,0 +1,178 @@
+import numpy
+import openravepy
+import prpy
+import threading
+import time
+import unittest
+from prpy.base.robot import Robot
+from prpy.planning.base import BasePlanner, ClonedPlanningMethod, CopyPlanner
+from prpy.planning.base import Tags
+from prpy.planning.exceptions import PlanningError
+from prpy.util import GetTrajectoryTags, IsTimedTrajectory
+
+
+class FakeRetimer(BasePlanner):
+    """Times a path with a fixed delta time between waypoints"""
+    def __init__(self, delta_time=1., delay=0., error=None, stats=None):
+        super(FakeRetimer, self).__init__()
+        self.delta_time = delta_time
+        self.delay = delay
+        self.error = error
+
+        # Shared by all copies of this planner.
+        self.stats = stats if stats is not None else {
+            'running': 0, 'max_running': 0, 'lock': threading.Lock()}
+
+    @ClonedPlanningMethod
+    def RetimeTrajectory(self, robot, path, **kw_args):
+        stats = self.stats
+        with stats['lock']:
+            stats['running'] += 1
+            stats['max_running'] = max(stats['max_running'],
+                                       stats['running'])
+        try:
+            time.sleep(self.delay)
+        finally:
+            with stats['lock']:
+                stats['running'] -= 1
+
+        if self.error is not None:
+            raise self.error
+
+        cspec = openravepy.ConfigurationSpecification(
+            path.GetConfigurationSpecification())
+        cspec.AddDeltaTimeGroup()
+
+        traj = openravepy.RaveCreateTrajectory(self.env, '')
+        traj.Init(cspec)
+        for i in xrange(path.GetNumWaypoints()):
+            waypoint = numpy.zeros(cspec.GetDOF())
+            cspec.InsertJointValues(
+                waypoint, path.GetConfigurationSpecification()
+                    .ExtractJointValues(path.GetWaypoint(i), robot,
+                                        robot.GetActiveDOFIndices()),
+                robot, robot.GetActiveDOFIndices(), False)
+            cspec.InsertDeltaTime(waypoint, self.delta_time if i else 0.)
+            traj.Insert(i, waypoint)
+        return traj
+
+
+class PostProcessPathTest(unittest.TestCase):
+    def setUp(self):
+        self.env = openravepy.Environment()
+        self.env.Load('wamtest1.env.xml')
+        self.robot = self.env.GetRobot('BarrettWAM')
+        self.manipulator = self.robot.GetManipulator('arm')
+        prpy.bind_subclass(self.robot, Robot)
+
+        with self.env:
+            self.robot.SetActiveDOFs(self.manipulator.GetArmIndices())
+            cspec = self.robot.GetActiveConfigurationSpecification('linear')
+
+            self.path = openravepy.RaveCreateTrajectory(self.env, '')
+            self.path.Init(cspec)
+            q0 = self.robot.GetActiveDOFValues()
+            for i, q in enumerate([q0, q0 + 0.1, q0 + 0.2]):
+                self.path.Insert(i, q)
+
+        self.robot.simplifier = None
+
+    def tearDown(self):
+        self.env.Destroy()
+
+    def test_CopyPlanner_HasOwnEnvironment(self):
+        planner = FakeRetimer()
+        planner_copy = CopyPlanner(planner)
+
+        self.assertIsNot(planner_copy.env, planner.env)
+        self.assertIs(planner_copy.stats, planner.stats)
+
+    def test_PostProcessPath_Speculative_RunsPipelinesConcurrently(self):
+        self.robot.smoother = FakeRetimer(delta_time=1., delay=0.2)
+        self.robot.retimer = FakeRetimer(delta_time=2., delay=0.2)
+
+        start_time = time.time()
+        traj = self.robot.PostProcessPath(self.path, speculative=True)
+        duration = time.time() - start_time
+
+        # The two smoothing pipelines share the smoother, so they only
+        # overlap if they use separate copies of it.
+        self.assertEqual(self.robot.smoother.stats['max_running'], 2)
+        self.assertLess(duration, 0.35)
+        self.assertTrue(IsTimedTrajectory(traj))
+        self.assertEqual(traj.GetEnv(), self.env)
+
+    def test_PostProcessPath_Speculative_ReturnsFastestTrajectory(self):
+        self.robot.smoother = FakeRetimer(delta_time=2.)
+        self.robot.retimer = FakeRetimer(delta_time=1.)
+
+        traj = self.robot.PostProcessPath(self.path, speculative=True,
+                                          speculative_timelimits=[1.])
+        tags = GetTrajectoryTags(traj)
+
+        self.assertAlmostEqual(traj.GetDuration(), 2.)
+        self.assertEqual(tags[Tags.POSTPROCESS_PIPELINE], 'retime')
+        self.assertEqual(set(tags[Tags.POSTPROCESS_PIPELINE_TIMES]),
+                         set(['shortcut_smooth', 'smooth', 'retime',
+                              'shortcut_smooth_1']))
+
+    def test_PostProcessPath_Speculative_IgnoresFailedPipelines(self):
+        self.robot.smoother = FakeRetimer(error=PlanningError('failed'))
+        self.robot.retimer = FakeRetimer(delta_time=3.)
+
+        traj = self.robot.PostProcessPath(self.path, speculative=True)
+
+        self.assertAlmostEqual(traj.GetDuration(), 6.)
+        self.assertEqual(GetTrajectoryTags(traj)[Tags.POSTPROCESS_PIPELINE],
+                         'retime')
+
+    def test_PostProcessPath_Speculative_AllFail_Raises(self):
+        self.robot.smoother = FakeRetimer(error=PlanningError('failed'))
+        self.robot.retimer = self.robot.smoother
+
+        with self.assertRaises(PlanningError):
+            self.robot.PostProcessPath(self.path, speculative=True)
+
+    def test_PostProcessPath_SpeculativeConstrained_OnlyRetimes(self):
+        self.robot.smoother = FakeRetimer(error=PlanningError('failed'))
+        self.robot.retimer = FakeRetimer(delta_time=1.)
+
+        traj = self.robot.PostProcessPath(self.path, speculative=True,
+                                          constrained=True)
+
+        self.assertAlmostEqual(traj.GetDuration(), 2.)
+        self.assertNotIn(Tags.POSTPROCESS_PIPELINE, GetTrajectoryTags(traj))
+
+
+class GetKinematicLimitsTest(unittest.TestCase):
+    def setUp(self):
+        self.env = openravepy.Environment()
+        self.env.Load('wamtest1.env.xml')
+        self.robot = self.env.GetRobot('BarrettWAM')
+        prpy.bind_subclass(self.robot, Robot)
+
+    def tearDown(self):
+        self.env.Destroy()
+
+    def test_GetKinematicLimits_IsReused(self):
+        with self.env:
+            first = self.robot.GetKinematicLimits()
+            second = self.robot.GetKinematicLimits()
+
+        self.assertIs(first, second)
+
+    def test_GetKinematicLimits_JointLimitsChanged_IsRecomputed(self):
+        with self.env:
+            self.robot.GetKinematicLimits()
+
+            joint = self.robot.GetJointFromDOFIndex(0)
+            lower, upper = joint.GetLimits()
+            joint.SetLimits(lower, upper - 0.1)
+            joint.SetVelocityLimits(joint.GetVelocityLimits()[1] * 0.5)
+
+            limits = self.robot.GetKinematicLimits()
+
+            numpy.testing.assert_array_equal(
+                limits.upper, self.robot.GetDOFLimits()[1])
+            numpy.testing.assert_array_equal(
+                limits.velocity, self.robot.GetDOFVelocityLimits())
@@ -0,0 +1,73 @@
+import numpy
+import openravepy
+import time
+import unittest
+from prpy.simulation import ServoSimulator
+
+
+class ServoSimulatorTest(unittest.TestCase):
+    def setUp(self):
+        self.env = openravepy.Environment()
+        self.env.Load('wamtest1.env.xml')
+        self.robot = self.env.GetRobot('BarrettWAM')
+        self.manipulator = self.robot.GetManipulator('arm')
+        self.indices = self.manipulator.GetArmIndices()
+
+        with self.env:
+            self.robot.SetDOFValues(numpy.zeros(len(self.indices)),
+                                    self.indices)
+
+        self.servo = ServoSimulator(self.manipulator, rate=200.,
+                                    watchdog_timeout=0.1)
+
+    def tearDown(self):
+        self.servo.Stop()
+        self.env.Destroy()
+
+    def test_SetVelocity_IntegratesOverElapsedTime(self):
+        q_dot = numpy.zeros(len(self.indices))
+        q_dot[0] = 0.1
+
+        start_time = time.time()
+        self.servo.SetVelocity(q_dot)
+        time.sleep(0.05)
+        with self.env:
+            q = self.robot.GetDOFValues(self.indices)
+        elapsed = time.time() - start_time
+
+        self.assertGreater(q[0], 0.)
+        # Allow one servo period of slack for timing jitter.
+        self.assertLessEqual(q[0], 0.1 * (elapsed + self.servo.period) + 1e-6)
+        numpy.testing.assert_array_equal(q[1:], numpy.zeros(len(q) - 1))
+
+    def test_SetVelocity_WatchdogTimeout_Stops(self):
+        q_dot = numpy.zeros(len(self.indices))
+        q_dot[0] = 0.1
+        self.servo.SetVelocity(q_dot)
+        time.sleep(0.2)
+
+        with self.env:
+            q_before = self.robot.GetDOFValues(self.indices)
+        time.sleep(0.05)
+        with self.env:
+            q_after = self.robot.GetDOFValues(self.indices)
+
+        numpy.testing.assert_array_equal(q_before, q_after)
+
+    def test_SetVelocity_ExceedsLimits_Raises(self):
+        q_dot = self.robot.GetDOFVelocityLimits()[self.indices] * 2.
+
+        with self.assertRaises(openravepy.openrave_exception):
+            self.servo.SetVelocity(q_dot)
+
+    def test_GetStatistics_ReportsRate(self):
+        time.sleep(0.1)
+        statistics = self.servo.GetStatistics()
+
+        self.assertGreater(statistics.num_ticks, 1)
+        self.assertGreater(statistics.rate, 0.)
+        self.assertGreaterEqual(statistics.jitter, 0.)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -11,6 +11,8 @@ import numpy # allclose, zeros
 import numpy.testing # assert_array_almost_equal
 import exceptions # Exception
 import itertools # islice
+import threading # Timer
+from prpy.futures import Future
 from prpy.planning.exceptions import JointLimitError
 
 
@@ -179,6 +181,46 @@ class Tests(unittest.TestCase):
         dofvals = traj_arclen.Sample(0.99, cspec)
         self.assertAlmostEqual(dofvals[0], 0.99)
 
+    def test_ComputeUnitTiming_MultipleWaypoints(self):
+        cspec = self.robot.GetActiveConfigurationSpecification()
+        traj = openravepy.RaveCreateTrajectory(self.env, '')
+        traj.Init(cspec)
+        waypoints = numpy.array([[0., 0., 0., 0., 0., 0., 0.],
+                                 [1., 0., 0., 0., 0., 0., 0.],
+                                 [1., 0., 0.5, 0., 0., 0., 0.],
+                                 [1., 0., 0.5, 0., 0., 0., -1.]])
+        for i, waypoint in enumerate(waypoints):
+            traj.Insert(i, waypoint)
+
+        traj_arclen = prpy.util.ComputeUnitTiming(self.robot, traj)
+
+        self.assertEqual(traj_arclen.GetNumWaypoints(), len(waypoints))
+        self.assertAlmostEqual(traj_arclen.GetDuration(), 2.5)
+        numpy.testing.assert_array_almost_equal(
+            traj_arclen.Sample(1.25, cspec), [1., 0., 0.25, 0., 0., 0., 0.])
+
+
+    # GetKinematicLimits()
+
+    def test_GetKinematicLimits_MatchesOpenRAVE(self):
+        with self.env:
+            limits = prpy.util.GetKinematicLimits(self.robot)
+            lower, upper = self.robot.GetDOFLimits()
+
+            numpy.testing.assert_array_equal(limits.lower, lower)
+            numpy.testing.assert_array_equal(limits.upper, upper)
+            numpy.testing.assert_array_equal(
+                limits.velocity, self.robot.GetDOFVelocityLimits())
+            numpy.testing.assert_array_equal(
+                limits.resolution, self.robot.GetDOFResolutions())
+
+    def test_GetKinematicLimits_IsReadOnly(self):
+        with self.env:
+            limits = prpy.util.GetKinematicLimits(self.robot)
+
+        with self.assertRaises(ValueError):
+            limits.lower[0] = 0.
+
 
     # CheckJointLimits()
     #
@@ -463,6 +505,38 @@ class Tests(unittest.TestCase):
                                                 verbose=True)
 
 
+    # RadicalInverse(), HaltonSequence() and SobolSequence()
+
+    def test_RadicalInverse_MatchesVanDerCorputSequence(self):
+        vdc = prpy.util.VanDerCorputSequence(include_endpoints=False)
+        expected = list(itertools.islice(vdc, 15))
+        actual = [prpy.util.RadicalInverse(i) for i in xrange(1, 16)]
+        numpy.testing.assert_array_almost_equal(actual, expected, decimal=12)
+
+    def test_RadicalInverse_Base3(self):
+        expected = [1./3, 2./3, 1./9, 4./9, 7./9]
+        actual = [prpy.util.RadicalInverse(i, 3) for i in xrange(1, 6)]
+        numpy.testing.assert_array_almost_equal(actual, expected, decimal=12)
+
+    def test_HaltonSequence_FirstPoints(self):
+        expected = [[1./2, 1./3, 1./5], [1./4, 2./3, 2./5],
+                    [3./4, 1./9, 3./5]]
+        halton = prpy.util.HaltonSequence(3)
+        actual = list(itertools.islice(halton, 3))
+        numpy.testing.assert_array_almost_equal(actual, expected, decimal=12)
+
+    def test_SobolSequence_FirstPoints(self):
+        expected = [[0.5, 0.5, 0.5], [0.75, 0.25, 0.25],
+                    [0.25, 0.75, 0.75], [0.375, 0.375, 0.625]]
+        sobol = prpy.util.SobolSequence(3)
+        actual = list(itertools.islice(sobol, 4))
+        numpy.testing.assert_array_almost_equal(actual, expected, decimal=12)
+
+    def test_SobolSequence_TooManyDimensions_Raises(self):
+        with self.assertRaises(ValueError):
+            next(prpy.util.SobolSequence(25))
+
+
     # VanDerCorputSampleGenerator()
     # (This function wraps VanDerCorputSequence() and is used
     #  for getting sample points to be collision-checked.)
@@ -1089,6 +1163,287 @@ class Tests(unittest.TestCase):
         numpy.testing.assert_array_almost_equal(T_loc, expected_T_loc, decimal=7, \
                                                 err_msg=error, verbose=True)
 
+    def _CreateLinearWorkspaceTrajectory(self, positions):
+        workspace_traj = openravepy.RaveCreateTrajectory(self.env, '')
+        spec = openravepy.IkParameterization.\
+                    GetConfigurationSpecificationFromType(
+                        openravepy.IkParameterizationType.Transform6D,'linear')
+        workspace_traj.Init(spec)
+        for i, position in enumerate(positions):
+            T = numpy.eye(4)
+            T[0:3, 3] = position
+            workspace_traj.Insert(i, openravepy.poseFromMatrix(T))
+        return prpy.util.ComputeGeodesicUnitTiming(workspace_traj)
+
+    def test_GetMinDistanceBetweenTransformAndWorkspaceTraj_PastEnd(self):
+        workspace_traj = self._CreateLinearWorkspaceTrajectory(
+            [[0., 0., 0.], [5., 0., 0.]])
+
+        T = numpy.eye(4)
+        T[0:3, 3] = [7., 0., 0.]
+        (min_dist, t_loc, T_loc) = \
+            prpy.util.GetMinDistanceBetweenTransformAndWorkspaceTraj(
+                T, workspace_traj)
+
+        numpy.testing.assert_almost_equal(min_dist, 2.0)
+        numpy.testing.assert_almost_equal(t_loc, workspace_traj.GetDuration())
+        numpy.testing.assert_array_almost_equal(T_loc[0:3, 3], [5., 0., 0.])
+
+    def test_WorkspaceTrajectoryIndex_MatchesSampling(self):
+        positions = [[0., 0., 0.], [1., 0., 0.], [1., 1., 0.],
+                     [0., 1., 0.5], [0., 0., 1.]]
+        workspace_traj = self._CreateLinearWorkspaceTrajectory(positions)
+        index = prpy.util.WorkspaceTrajectoryIndex(workspace_traj)
+        self.assertEqual(len(index), len(positions) - 1)
+
+        duration = workspace_traj.GetDuration()
+        times = numpy.linspace(0., duration, 2001)
+        sampled = numpy.array([workspace_traj.Sample(t)[4:7] for t in times])
+
+        rng = numpy.random.RandomState(0)
+        for _ in xrange(20):
+            T = numpy.eye(4)
+            T[0:3, 3] = rng.uniform(-0.5, 1.5, 3)
+            (min_dist, t_loc, T_loc) = index.GetMinDistance(T)
+
+            # The exact solution is never worse than a dense sampling.
+            distances = numpy.sqrt(numpy.sum((sampled - T[0:3, 3]) ** 2,
+                                             axis=1))
+            self.assertLessEqual(min_dist, numpy.min(distances) + 1e-9)
+            self.assertGreater(min_dist, numpy.min(distances) - 1e-2)
+
+            numpy.testing.assert_almost_equal(
+                numpy.linalg.norm(T_loc[0:3, 3] - T[0:3, 3]), min_dist)
+            self.assertTrue(0. <= t_loc <= duration)
+
+    def test_WorkspaceTrajectoryIndex_WarmStart(self):
+        positions = [[float(i), 0., 0.] for i in xrange(11)]
+        workspace_traj = self._CreateLinearWorkspaceTrajectory(positions)
+        index = prpy.util.WorkspaceTrajectoryIndex(workspace_traj)
+
+        # Follow the trajectory, then jump back to its start.
+        for x in [0.2, 3.7, 3.9, 8.5, 0.1]:
+            T = numpy.eye(4)
+            T[0:3, 3] = [x, 0.1, 0.]
+            (min_dist, t_loc, T_loc) = index.GetMinDistance(T)
+
+            numpy.testing.assert_almost_equal(min_dist, 0.1)
+            numpy.testing.assert_almost_equal(T_loc[0, 3], x)
+
+
+    # GetBisectionOrder()
+
+    def test_GetBisectionOrder(self):
+        self.assertEqual(prpy.util.GetBisectionOrder(0), [])
+        self.assertEqual(prpy.util.GetBisectionOrder(1), [0])
+        self.assertEqual(prpy.util.GetBisectionOrder(7),
+                         [0, 6, 3, 1, 4, 2, 5])
+        self.assertEqual(sorted(prpy.util.GetBisectionOrder(100)),
+                         range(100))
+
+
+    # FindTrajectoryCollision() and IsInCollision()
+
+    def AddBoxAtConfiguration(self, q):
+        T_ee = prpy.util.GetForwardKinematics(self.robot, q)
+
+        with self.env:
+            box = openravepy.RaveCreateKinBody(self.env, '')
+            box.SetName('box')
+            box.InitFromBoxes(numpy.array([[0., 0., 0., 0.05, 0.05, 0.05]]),
+                              True)
+            box.SetTransform(T_ee)
+            self.env.Add(box)
+
+        return box
+
+    def test_GetResolutionCollisionCheckPts_RespectsDOFResolution(self):
+        q0 = numpy.zeros(7)
+        q1 = q0 + 10.5 * self.dof_resolutions
+        traj = self.CreateTrajectory(q0, q1)
+
+        times, configs, _ = prpy.util.GetResolutionCollisionCheckPts(
+            self.robot, traj)
+
+        self.assertEqual(len(times), 12)
+        numpy.testing.assert_array_almost_equal(configs[0], q0)
+        numpy.testing.assert_array_almost_equal(configs[-1], q1)
+        steps = numpy.abs(numpy.diff(configs, axis=0))
+        self.assertTrue((steps <= self.dof_resolutions + 1e-9).all())
+
+    def test_FindTrajectoryCollision_FreePath_ReturnsNone(self):
+        q0 = numpy.zeros(7)
+        q1 = q0 + 20 * self.dof_resolutions
+        traj = self.CreateTrajectory(q0, q1)
+
+        self.assertIsNone(prpy.util.FindTrajectoryCollision(traj, self.robot))
+        self.assertFalse(prpy.util.IsInCollision(traj, self.robot))
+
+    def test_FindTrajectoryCollision_CollisionMidPath_ReturnsEarliest(self):
+        q0 = numpy.zeros(7)
+        q1 = numpy.array([1.0, 1.0, 0.0, 1.0, 0.0, 0.0, 0.0])
+        traj = self.CreateTrajectory(q0, q1)
+        self.AddBoxAtConfiguration(0.5 * (q0 + q1))
+
+        with self.env:
+            q_before = self.robot.GetActiveDOFValues()
+
+        # Find the first colliding sample with a linear scan.
+        times, configs, dof_indices = prpy.util.GetResolutionCollisionCheckPts(
+            self.robot, traj)
+        expected = None
+        with self.env, self.robot.CreateRobotStateSaver():
+            self.robot.SetActiveDOFs(dof_indices)
+            for t_sample, q in zip(times, configs):
+                self.robot.SetActiveDOFValues(q)
+                if (self.robot.CheckSelfCollision()
+                        or self.env.CheckCollision(self.robot)):
+                    expected = t_sample
+                    break
+
+        t, report = prpy.util.FindTrajectoryCollision(traj, self.robot)
+
+        self.assertIsNotNone(expected)
+        self.assertLess(expected, times[-1])
+        self.assertEqual(t, expected)
+        self.assertIsNotNone(report.plink1)
+        self.assertTrue(prpy.util.IsInCollision(traj, self.robot))
+
+        # Neither the trajectory nor the robot are modified.
+        self.assertFalse(prpy.util.IsTimedTrajectory(traj))
+        with self.env:
+            numpy.testing.assert_array_almost_equal(
+                self.robot.GetActiveDOFValues(), q_before)
+
+    def test_FindTrajectoryCollision_Parallel_MatchesSerial(self):
+        q0 = numpy.zeros(7)
+        q1 = numpy.array([1.0, 1.0, 0.0, 1.0, 0.0, 0.0, 0.0])
+        traj = self.CreateTrajectory(q0, q1)
+        self.AddBoxAtConfiguration(0.5 * (q0 + q1))
+
+        envs = [openravepy.Environment() for _ in xrange(3)]
+        try:
+            t_serial, _ = prpy.util.FindTrajectoryCollision(traj, self.robot)
+            t_parallel, _ = prpy.util.FindTrajectoryCollision(
+                traj, self.robot, envs=envs)
+        finally:
+            for env in envs:
+                env.Destroy()
+
+        self.assertEqual(t_serial, t_parallel)
+
+
+    # SimplifyTrajectory()
+
+    def CreatePath(self, configs):
+        cspec = self.robot.GetActiveConfigurationSpecification('linear')
+        path = openravepy.RaveCreateTrajectory(self.env, '')
+        path.Init(cspec)
+
+        for i, q in enumerate(configs):
+            waypoint = numpy.zeros(cspec.GetDOF())
+            cspec.InsertJointValues(waypoint, q, self.robot,
+                                    self.active_dof_indices, False)
+            path.Insert(i, waypoint)
+
+        return path
+
+    def test_SimplifyTrajectory_StraightLine_KeepsEndpoints(self):
+        q0 = numpy.zeros(7)
+        q1 = numpy.array([0.5, 0.5, 0.0, 0.5, 0.0, 0.0, 0.0])
+        configs = [q0 + alpha * (q1 - q0)
+                   for alpha in numpy.linspace(0., 1., 100)]
+
+        output = prpy.util.SimplifyTrajectory(self.CreatePath(configs),
+                                              self.robot)
+
+        self.assertEqual(output.GetNumWaypoints(), 2)
+        numpy.testing.assert_array_almost_equal(
+            output.GetWaypoint(0), configs[0])
+        numpy.testing.assert_array_almost_equal(
+            output.GetWaypoint(1), configs[-1])
+
+    def test_SimplifyTrajectory_Corner_KeepsCorner(self):
+        q0 = numpy.zeros(7)
+        q1 = numpy.array([0.5, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0])
+        q2 = numpy.array([0.5, 0.5, 0.0, 0.0, 0.0, 0.0, 0.0])
+        configs = ([q0 + alpha * (q1 - q0)
+                    for alpha in numpy.linspace(0., 1., 50)] +
+                   [q1 + alpha * (q2 - q1)
+                    for alpha in numpy.linspace(0., 1., 50)[1:]])
+
+        output = prpy.util.SimplifyTrajectory(self.CreatePath(configs),
+                                              self.robot)
+
+        self.assertEqual(output.GetNumWaypoints(), 3)
+        numpy.testing.assert_array_almost_equal(output.GetWaypoint(1), q1)
+
+    def test_SimplifyTrajectory_Timed_Throws(self):
+        q0 = numpy.zeros(7)
+        q1 = q0 + 10 * self.dof_resolutions
+        path = self.CreatePath([q0, q1])
+        traj = prpy.util.ComputeUnitTiming(self.robot, path)
+
+        with self.assertRaises(ValueError):
+            prpy.util.SimplifyTrajectory(traj, self.robot)
+
+
+class FakeController(object):
+    def __init__(self):
+        self.future = Future()
+
+    def IsDone(self):
+        return self.future.done()
+
+
+class FakeCallbackController(FakeController):
+    def __init__(self):
+        super(FakeCallbackController, self).__init__()
+        self.callbacks = {}
+
+    def AddDoneCallback(self, fn):
+        self.callbacks[fn] = lambda _: fn(self)
+        self.future.add_done_callback(self.callbacks[fn])
+        return True
+
+    def RemoveDoneCallback(self, fn):
+        self.future.remove_done_callback(self.callbacks.pop(fn))
+
+
+class Test_WaitForControllers(unittest.TestCase):
+    def _FinishLater(self, controller, delay=0.05):
+        timer = threading.Timer(delay, controller.future.set_result, [None])
+        timer.start()
+        self.addCleanup(timer.join)
+
+    def test_WaitForControllers_Callback_ReturnsTrue(self):
+        controller = FakeCallbackController()
+        self._FinishLater(controller)
+        self.assertTrue(prpy.util.WaitForControllers([controller]))
+        self.assertTrue(controller.IsDone())
+
+    def test_WaitForControllers_Polled_ReturnsTrue(self):
+        controllers = [FakeController(), FakeCallbackController()]
+        for controller in controllers:
+            self._FinishLater(controller)
+
+        self.assertTrue(prpy.util.WaitForControllers(controllers))
+
+    def test_WaitForControllers_Timeout_ReturnsFalse(self):
+        controllers = [FakeController(), FakeCallbackController()]
+        self.assertFalse(
+            prpy.util.WaitForControllers(controllers, timeout=0.05))
+
+    def test_WaitForControllers_Timeout_RemovesCallbacks(self):
+        controller = FakeCallbackController()
+        self.assertFalse(
+            prpy.util.WaitForControllers([controller], timeout=0.05))
+        self.assertEqual(controller.callbacks, {})
+        self.assertEqual(controller.future._callbacks, [])
+
+    def test_WaitForControllers_NoControllers_ReturnsTrue(self):
+        self.assertTrue(prpy.util.WaitForControllers([]))
+
 
 class Test_GetPointFrom(unittest.TestCase):
     """
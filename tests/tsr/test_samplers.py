@@ -0,0 +1,67 @@
+import numpy
+from numpy import pi
+from prpy.tsr import TSR, TSRChain
+from prpy.tsr.samplers import (CreateSampler, HaltonSampler, SobolSampler,
+                               StratifiedSampler, UniformSampler)
+from unittest import TestCase
+
+
+class TsrSamplerTest(TestCase):
+    def setUp(self):
+        self.Bw = numpy.array([[-0.1, 0.1],
+                               [0.0, 0.0],
+                               [0.0, 0.2],
+                               [-1.0, 1.0],
+                               [0.0, 0.0],
+                               [-pi, pi]])
+        self.tsr = TSR(Bw=self.Bw)
+        self.samplers = [UniformSampler(seed=0), HaltonSampler(),
+                         SobolSampler(), StratifiedSampler(seed=0)]
+
+    def test_sample_xyzrpy_WithinBounds(self):
+        for sampler in self.samplers:
+            for _ in xrange(100):
+                xyzrpy = self.tsr.sample_xyzrpy(sampler=sampler)
+                self.assertTrue(all(self.tsr.is_valid(xyzrpy)))
+
+    def test_sample_xyzrpy_KeepsFixedValues(self):
+        xyzrpy = numpy.array([0.05, 0., numpy.nan, numpy.nan, 0., 0.5])
+        sample = self.tsr.sample_xyzrpy(xyzrpy, sampler=SobolSampler())
+
+        numpy.testing.assert_allclose(sample[[0, 1, 4, 5]],
+                                      xyzrpy[[0, 1, 4, 5]])
+
+    def test_UniformSampler_Seeded_IsReproducible(self):
+        first = [UniformSampler(seed=3).sample(6) for _ in xrange(2)]
+        numpy.testing.assert_array_equal(first[0], first[1])
+
+    def test_HaltonSampler_Seeded_ShiftsSequence(self):
+        unshifted = HaltonSampler().sample(3)
+        shifted = HaltonSampler(seed=1).sample(3)
+        shift = numpy.random.RandomState(1).random_sample(3)
+
+        numpy.testing.assert_allclose(shifted,
+                                      numpy.mod(unshifted + shift, 1.))
+
+    def test_StratifiedSampler_CoversEachStratumOnce(self):
+        sampler = StratifiedSampler(num_strata=8, seed=0)
+        samples = numpy.array([sampler.sample(4) for _ in xrange(8)])
+
+        for column in samples.T:
+            strata = numpy.floor(column * 8).astype(int)
+            self.assertEqual(sorted(strata), range(8))
+
+    def test_TSRChain_sample_xyzrpy_DrawsOnePoint(self):
+        chain = TSRChain(TSRs=[self.tsr, self.tsr])
+        xyzrpy_list = chain.sample_xyzrpy(sampler=SobolSampler())
+
+        # The first Sobol point is 0.5 in every dimension.
+        expected = numpy.mean(self.Bw, axis=1)
+        for xyzrpy in xyzrpy_list:
+            numpy.testing.assert_allclose(xyzrpy, expected, atol=1e-12)
+
+    def test_CreateSampler_ByName(self):
+        self.assertIsInstance(CreateSampler('halton'), HaltonSampler)
+        sampler = SobolSampler()
+        self.assertIs(CreateSampler(sampler), sampler)
+        self.assertRaises(ValueError, CreateSampler, 'unknown')
@@ -1,6 +1,6 @@
 import numpy
 from numpy import pi
-from prpy.tsr import TSR
+from prpy.tsr import TSR, TSRChain
 from unittest import TestCase
 
 # Disabled this test because it currently fails.
@@ -35,3 +35,131 @@ class TsrTest(TestCase):
         self.assertTrue(numpy.all(s >= Bw[:, 0]))
         self.assertTrue(numpy.all(s <= Bw[:, 1]))
 """
+
+
+class TsrTransformTest(TestCase):
+    def setUp(self):
+        self.T0_w = TSR.xyzrpy_to_trans([0.1, 0.2, 0.3, 0.4, -0.5, 0.6])
+        self.Tw_e = TSR.xyzrpy_to_trans([-0.3, 0.0, 0.2, pi / 2, 0.1, -1.0])
+        self.Bw = numpy.array([[-0.1, 0.1],
+                               [-0.1, 0.1],
+                               [0.0, 0.2],
+                               [-1.0, 1.0],
+                               [-0.5, 0.5],
+                               [-pi, pi]])
+
+    def test_inverses_MatchLinalgInv(self):
+        tsr = TSR(T0_w=self.T0_w, Tw_e=self.Tw_e, Bw=self.Bw)
+
+        numpy.testing.assert_allclose(
+            tsr.T0_w_inv, numpy.linalg.inv(self.T0_w), atol=1e-12)
+        numpy.testing.assert_allclose(
+            tsr.Tw_e_inv, numpy.linalg.inv(self.Tw_e), atol=1e-12)
+
+    def test_T0_w_Assignment_InvalidatesInverse(self):
+        tsr = TSR(T0_w=self.T0_w, Tw_e=self.Tw_e, Bw=self.Bw)
+        tsr.T0_w_inv
+
+        tsr.T0_w = numpy.eye(4)
+
+        numpy.testing.assert_allclose(tsr.T0_w_inv, numpy.eye(4))
+
+    def test_T0_w_IsReadOnly(self):
+        tsr = TSR(T0_w=self.T0_w, Tw_e=self.Tw_e, Bw=self.Bw)
+
+        with self.assertRaises(ValueError):
+            tsr.T0_w[0, 3] = 1.
+
+    def test_to_xyzrpy_InvertsToTransform(self):
+        tsr = TSR(T0_w=self.T0_w, Tw_e=self.Tw_e, Bw=self.Bw)
+        xyzrpy = tsr.sample_xyzrpy()
+
+        numpy.testing.assert_allclose(
+            tsr.to_xyzrpy(tsr.to_transform(xyzrpy)), xyzrpy, atol=1e-9)
+
+    def test_to_transforms_MatchesToTransform(self):
+        tsr = TSR(T0_w=self.T0_w, Tw_e=self.Tw_e, Bw=self.Bw)
+        xyzrpys = numpy.array([tsr.sample_xyzrpy() for _ in xrange(10)])
+
+        expected = numpy.array([tsr.to_transform(x) for x in xyzrpys])
+        numpy.testing.assert_allclose(tsr.to_transforms(xyzrpys), expected)
+
+    def test_TSRChain_to_transform_DoesNotModifyTSRs(self):
+        tsr1 = TSR(T0_w=self.T0_w, Tw_e=self.Tw_e, Bw=self.Bw)
+        tsr2 = TSR(Tw_e=self.Tw_e, Bw=self.Bw)
+        chain = TSRChain(TSRs=[tsr1, tsr2])
+        xyzrpy_list = chain.sample_xyzrpy()
+
+        pose = chain.to_transform(xyzrpy_list)
+
+        numpy.testing.assert_allclose(tsr2.T0_w, numpy.eye(4))
+        expected = reduce(numpy.dot, [
+            self.T0_w, TSR.xyzrpy_to_trans(xyzrpy_list[0]), self.Tw_e,
+            TSR.xyzrpy_to_trans(xyzrpy_list[1]), self.Tw_e])
+        numpy.testing.assert_allclose(pose, expected)
+
+    def test_TSRChain_to_transforms_MatchesToTransform(self):
+        tsr1 = TSR(T0_w=self.T0_w, Tw_e=self.Tw_e, Bw=self.Bw)
+        tsr2 = TSR(Tw_e=self.Tw_e, Bw=self.Bw)
+        chain = TSRChain(TSRs=[tsr1, tsr2])
+        xyzrpy_lists = numpy.array(
+            [chain.sample_xyzrpy() for _ in xrange(10)])
+
+        expected = numpy.array([chain.to_transform(x) for x in xyzrpy_lists])
+        numpy.testing.assert_allclose(chain.to_transforms(xyzrpy_lists),
+                                      expected)
+
+
+class TsrSerializationTest(TestCase):
+    def setUp(self):
+        self.T0_w = TSR.xyzrpy_to_trans([0.1, 0.2, 0.3, 0.4, -0.5, 0.6])
+        self.Tw_e = TSR.xyzrpy_to_trans([-0.3, 0.0, 0.2, pi / 2, 0.1, -1.0])
+        self.Bw = numpy.array([[-0.1, 0.1],
+                               [0.0, 0.0],
+                               [0.0, 0.2],
+                               [-1.0, 1.0],
+                               [-0.5, 0.5],
+                               [-pi, pi]])
+        self.tsr = TSR(T0_w=self.T0_w, Tw_e=self.Tw_e, Bw=self.Bw, manip=2)
+
+    def test_serialize_MatchesElementwiseFormatting(self):
+        def format_values(a):
+            return ' '.join(['%.5f' % x for x in a.reshape(-1)])
+
+        expected = '2 NULL {:s} {:s} {:s}'.format(
+            format_values(self.T0_w[0:3, :].T),
+            format_values(self.Tw_e[0:3, :].T), format_values(self.Bw))
+        self.assertEqual(self.tsr.serialize(), expected)
+
+    def test_serialize_Compact_IsExact(self):
+        serialized = self.tsr.serialize(compact=True)
+        values = [float(x) for x in serialized.split()[2:]]
+
+        numpy.testing.assert_array_equal(values[0:12],
+                                         self.T0_w[0:3, :].T.reshape(-1))
+        numpy.testing.assert_array_equal(values[24:36], self.Bw.reshape(-1))
+
+    def test_serialize_IsCachedUntilModified(self):
+        first = self.tsr.serialize()
+        self.assertIs(self.tsr.serialize(), first)
+
+        self.tsr.Bw = numpy.zeros((6, 2))
+        self.assertNotEqual(self.tsr.serialize(), first)
+
+        self.tsr.manipindex = 0
+        self.assertTrue(self.tsr.serialize().startswith('0 NULL '))
+
+    def test_Bw_IsReadOnly(self):
+        with self.assertRaises(ValueError):
+            self.tsr.Bw[0, 0] = 1.
+
+    def test_TSRChain_serialize(self):
+        chain = TSRChain(sample_goal=True, TSRs=[self.tsr, self.tsr],
+                         mimicbodyname='hand', mimicbodyjoints=[0, 1])
+        tsr_string = self.tsr.serialize()
+
+        self.assertEqual(chain.serialize(),
+                         '0 1 0 2 {0:s} {0:s} hand 2 0 1'.format(tsr_string))
+
+        chain.constrain = True
+        self.assertTrue(chain.serialize().startswith('0 1 1 2 '))
@@ -0,0 +1,133 @@
+import numpy
+import os
+import shutil
+import tempfile
+from prpy.tsr.tsrlibrary import TSRChainTemplate, TSRLibrary
+from unittest import TestCase
+
+YAML_CHAINS = """
+- robot: tsrlibrary_test_robot
+  kinbody: mug
+  action: grasp
+  sample_goal: true
+  TSRs:
+    - Tw_e: [[1, 0, 0, 0], [0, 1, 0, 0], [0, 0, 1, -0.2], [0, 0, 0, 1]]
+      Bw: [[0, 0], [0, 0], [0, 0], [0, 0], [0, 0], [-3.14, 3.14]]
+- robot: tsrlibrary_test_robot
+  kinbody: mug
+  action: push
+  constrain: true
+  TSRs:
+    - Tw_e: [[1, 0, 0, 0.1], [0, 1, 0, 0], [0, 0, 1, 0], [0, 0, 0, 1]]
+      Bw: [[-0.1, 0.1], [0, 0], [0, 0], [0, 0], [0, 0], [0, 0]]
+"""
+
+
+class MockBody(object):
+    def __init__(self, name, filename, environment_id=1):
+        self.name = name
+        self.filename = filename
+        self.environment_id = environment_id
+        self.transform = numpy.eye(4)
+        self.num_filename_calls = 0
+
+    def GetName(self):
+        return self.name
+
+    def GetEnvironmentId(self):
+        return self.environment_id
+
+    def GetXMLFilename(self):
+        self.num_filename_calls += 1
+        return self.filename
+
+    def GetTransform(self):
+        return numpy.array(self.transform)
+
+    def GetActiveManipulatorIndex(self):
+        return 0
+
+
+class TSRLibraryTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # Factories are registered globally, so only load them once.
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'chains.yaml')
+            with open(path, 'w') as f:
+                f.write(YAML_CHAINS)
+
+            robot = MockBody('robot', '/robots/robot.xml')
+            TSRLibrary(robot, robot_name='tsrlibrary_test_robot').load_yaml(
+                path)
+        finally:
+            shutil.rmtree(directory)
+
+    def setUp(self):
+        self.robot = MockBody('robot', '/robots/robot.xml')
+        self.library = TSRLibrary(
+            self.robot, robot_name='tsrlibrary_test_robot')
+        self.mug = MockBody('mug1', '/objects/mug.kinbody.xml', 2)
+
+    def test_load_yaml_KeepsEachChain(self):
+        grasp, = self.library(self.mug, 'grasp')
+        push, = self.library(self.mug, 'push')
+
+        self.assertTrue(grasp.sample_goal)
+        self.assertFalse(grasp.constrain)
+        self.assertTrue(push.constrain)
+        numpy.testing.assert_allclose(push.TSRs[0].Bw[0], [-0.1, 0.1])
+
+    def test_call_InfersObjectTypeOnce(self):
+        self.library(self.mug, 'grasp')
+        self.library(self.mug, 'push')
+
+        self.assertEqual(self.mug.num_filename_calls, 1)
+
+    def test_call_SameTransform_IsCacheHit(self):
+        first, = self.library(self.mug, 'grasp')
+        second, = self.library(self.mug, 'grasp')
+
+        self.assertIsNot(first, second)
+        self.assertEqual(first.to_dict(), second.to_dict())
+        self.assertEqual(self.library.cache_hits, 1)
+        self.assertEqual(self.library.cache_misses, 1)
+
+    def test_call_ReturnedChainModified_CacheIsUnchanged(self):
+        first, = self.library(self.mug, 'grasp')
+        expected = first.to_dict()
+
+        first.sample_goal = False
+        first.constrain = True
+        first.TSRs[0].Bw = numpy.zeros((6, 2))
+        first.append(first.TSRs[0])
+
+        second, = self.library(self.mug, 'grasp')
+        second.sample_start = True
+        third, = self.library(self.mug, 'grasp')
+
+        self.assertEqual(self.library.cache_hits, 2)
+        self.assertEqual(third.to_dict(), expected)
+
+    def test_call_ObjectMoved_RegeneratesChains(self):
+        first, = self.library(self.mug, 'grasp')
+        self.mug.transform[0:3, 3] = [1., 2., 3.]
+        second, = self.library(self.mug, 'grasp')
+
+        self.assertIsNot(first, second)
+        numpy.testing.assert_allclose(second.TSRs[0].T0_w,
+                                      self.mug.transform)
+        self.assertEqual(self.library.cache_misses, 2)
+
+
+class TSRChainTemplateTest(TestCase):
+    def test_Arrays_AreReadOnly(self):
+        template = TSRChainTemplate([numpy.eye(4)], [numpy.zeros((6, 2))])
+
+        with self.assertRaises(ValueError):
+            template.Bws[0][0, 0] = 1.
+
+    def test_MismatchedLengths_Raises(self):
+        with self.assertRaises(ValueError):
+            TSRChainTemplate([numpy.eye(4)], [])